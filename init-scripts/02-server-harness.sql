@@ -0,0 +1,131 @@
+-- サーバー側のテストハーネス
+-- テストケースごとにセッションタイムゾーンを set_config(..., true)（SET LOCAL と同じ）で切り替え、
+-- セッション関数・文字列リテラル・Pythonのdatetime・now()の各テストが記録する値を
+-- 1回の呼び出しでまとめて返す。テーブルには書き込まないため読み取り専用のレプリカでも実行できる。
+--
+-- session_timezones の NULL は呼び出し時点のセッションタイムゾーン（デフォルト）を表す。
+-- 文字列リテラルの入力値は input_cases で session_timezones の添字（1始まり）に割り当てる。
+-- Pythonのdatetimeは全てのテストケースで共通で、naive な値は datetime_naive に、
+-- aware な値は datetime_aware に入れ、もう一方は NULL にする。
+CREATE OR REPLACE FUNCTION run_timezone_tests(
+    session_timezones TEXT[],
+    input_cases INTEGER[],
+    input_descriptions TEXT[],
+    ts_inputs TEXT[],
+    tstz_inputs TEXT[],
+    datetime_descriptions TEXT[],
+    datetime_naive TIMESTAMP[],
+    datetime_aware TIMESTAMPTZ[]
+) RETURNS TABLE (
+    case_index INTEGER,
+    result_type TEXT,
+    input_index INTEGER,
+    description TEXT,
+    ts TIMESTAMP,
+    ts_text TEXT,
+    tstz TIMESTAMPTZ,
+    tstz_text TEXT,
+    tstz_utc TIMESTAMP,
+    tstz_jst TIMESTAMP,
+    now_text TEXT,
+    current_timestamp_text TEXT,
+    now_timestamp_text TEXT,
+    current_timestamp_timestamp_text TEXT,
+    error TEXT
+) AS $$
+DECLARE
+    default_timezone TEXT := current_setting('timezone');
+    i INTEGER;
+    j INTEGER;
+BEGIN
+    FOR i IN 1 .. coalesce(array_length(session_timezones, 1), 0) LOOP
+        case_index := i;
+
+        -- テストケースのセッションタイムゾーンを設定（トランザクションの終わりまで有効）
+        BEGIN
+            PERFORM set_config('timezone', coalesce(session_timezones[i], default_timezone), true);
+        EXCEPTION WHEN OTHERS THEN
+            result_type := 'session_timezone';
+            input_index := NULL;
+            description := session_timezones[i];
+            ts := NULL; ts_text := NULL; tstz := NULL; tstz_text := NULL; tstz_utc := NULL; tstz_jst := NULL;
+            now_text := NULL; current_timestamp_text := NULL;
+            now_timestamp_text := NULL; current_timestamp_timestamp_text := NULL;
+            error := SQLERRM;
+            RETURN NEXT;
+            CONTINUE;
+        END;
+
+        -- 1. セッション関数
+        result_type := 'session_functions';
+        input_index := NULL;
+        description := NULL;
+        ts := NULL; ts_text := NULL; tstz := NULL; tstz_text := NULL; tstz_utc := NULL; tstz_jst := NULL;
+        now_text := now()::TEXT;
+        current_timestamp_text := CURRENT_TIMESTAMP::TEXT;
+        now_timestamp_text := now()::timestamp::TEXT;
+        current_timestamp_timestamp_text := CURRENT_TIMESTAMP::timestamp::TEXT;
+        error := NULL;
+        RETURN NEXT;
+        now_text := NULL; current_timestamp_text := NULL;
+        now_timestamp_text := NULL; current_timestamp_timestamp_text := NULL;
+
+        -- 2. 文字列リテラル（値ごとに例外を捕捉する）
+        result_type := 'timestamp';
+        FOR j IN 1 .. coalesce(array_length(input_cases, 1), 0) LOOP
+            CONTINUE WHEN input_cases[j] <> i;
+            input_index := j;
+            description := input_descriptions[j];
+            BEGIN
+                ts := ts_inputs[j]::TIMESTAMP;
+                ts_text := ts::TEXT;
+                tstz := tstz_inputs[j]::TIMESTAMPTZ;
+                tstz_text := tstz::TEXT;
+                tstz_utc := tstz AT TIME ZONE 'UTC';
+                tstz_jst := tstz AT TIME ZONE 'Asia/Tokyo';
+                error := NULL;
+            EXCEPTION WHEN OTHERS THEN
+                ts := NULL; ts_text := NULL; tstz := NULL; tstz_text := NULL; tstz_utc := NULL; tstz_jst := NULL;
+                error := SQLERRM;
+            END;
+            RETURN NEXT;
+        END LOOP;
+
+        -- 3. Pythonのdatetime（ts / tstz の両方の列に同じ値を入れた場合と同じ変換をする）
+        result_type := 'python_datetime';
+        FOR j IN 1 .. coalesce(array_length(datetime_descriptions, 1), 0) LOOP
+            input_index := j;
+            description := datetime_descriptions[j];
+            BEGIN
+                ts := coalesce(datetime_naive[j], datetime_aware[j]::TIMESTAMP);
+                ts_text := ts::TEXT;
+                tstz := coalesce(datetime_aware[j], datetime_naive[j]::TIMESTAMPTZ);
+                tstz_text := tstz::TEXT;
+                tstz_utc := tstz AT TIME ZONE 'UTC';
+                tstz_jst := tstz AT TIME ZONE 'Asia/Tokyo';
+                error := NULL;
+            EXCEPTION WHEN OTHERS THEN
+                ts := NULL; ts_text := NULL; tstz := NULL; tstz_text := NULL; tstz_utc := NULL; tstz_jst := NULL;
+                error := SQLERRM;
+            END;
+            RETURN NEXT;
+        END LOOP;
+
+        -- 4. now() を timestamp / timestamptz の列に入れた場合
+        result_type := 'now_insertion';
+        input_index := NULL;
+        tstz_utc := NULL; tstz_jst := NULL; error := NULL;
+
+        description := 'now() to ts';
+        ts := now(); ts_text := ts::TEXT; tstz := NULL; tstz_text := NULL;
+        RETURN NEXT;
+
+        description := 'now() to tstz';
+        ts := NULL; ts_text := NULL; tstz := now(); tstz_text := tstz::TEXT;
+        RETURN NEXT;
+    END LOOP;
+
+    -- 呼び出し元のトランザクションに設定を残さない
+    PERFORM set_config('timezone', default_timezone, true);
+END;
+$$ LANGUAGE plpgsql;
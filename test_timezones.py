@@ -1,13 +1,41 @@
 #!/usr/bin/env python3
 import psycopg2
-import csv
+import psycopg2.extras
+import argparse
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from tabulate import tabulate
 import pytz
 import os
+import sys
+import time
 
-# テスト結果を保存する配列
-test_results = []
+import tz_bench
+import tz_cache
+import tz_catalog
+import tz_copy
+import tz_diff
+import tz_epoch
+import tz_fuzz
+import tz_load
+import tz_matrix
+import tz_oracle
+import tz_partition
+import tz_profile
+import tz_scale
+import tz_server
+import tz_targets
+from tz_isolation import ISOLATION_MODES, IsolatedConnection, commit_test_writes, reset_test_table
+from tz_pool import DEFAULT_POOL_SIZE, TimezonePool, current_timezone, startup_options
+from tz_store import ResultStore
+
+# テスト結果の保存先（型付きのレコードとして保持し、指定があればファイルへ逐次書き出す）
+test_results = ResultStore()
+
+# 決定的なテスト結果のキャッシュ（--cache 指定時のみ使う）
+result_cache = None
 
 # PostgreSQLの接続設定
 DB_CONFIGS = [
@@ -62,35 +90,393 @@ TEST_CASES = [
     }
 ]
 
-def run_tests():
-    """すべてのデータベース設定に対してテストを実行"""
-    for db_config in DB_CONFIGS:
-        print(f"\n\n==== {db_config['name']} ({db_config['container_timezone']}) のテスト実行中 ====")
-        
+def positive_int(text):
+    """1以上の整数を受け付ける argparse の型"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"1以上の整数を指定してください: {text}")
+    return value
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析する"""
+    parser = argparse.ArgumentParser(description="PostgreSQLタイムゾーンテスト")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="同時にテストするDB数の上限（デフォルト: 1 = 逐次実行）")
+    parser.add_argument("--no-batch", dest="batch", action="store_false",
+                        help="テストケースの値を1件ずつ挿入・コミット・取得する（従来の逐次パス）")
+    parser.add_argument("--engine", choices=["storage", "expression", "server"], default="storage",
+                        help="文字列リテラルのテスト方式。storage: テーブルに保存して読み出す、"
+                             "expression: テーブルを使わず unnest() による1回のSELECTで変換する、"
+                             "server: サーバー側の関数 run_timezone_tests() で全テストケースを1回の呼び出しで実行する")
+    parser.add_argument("--isolation", choices=ISOLATION_MODES, default="truncate",
+                        help="共有テーブル timezone_test の使い方。truncate: TRUNCATEしてコミット、"
+                             "temp: コネクションごとの一時テーブル、savepoint: コミットせずセーブポイントまでロールバック")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, metavar="N",
+                        help="DBごとにセッションタイムゾーンを設定済みのまま保持するコネクションの上限"
+                             f"（デフォルト: {DEFAULT_POOL_SIZE}）")
+    parser.add_argument("--catalog", nargs="?", const=tz_catalog.DEFAULT_CATALOG_DIR, metavar="DIR",
+                        help="pg_timezone_names / pg_timezone_abbrevs をDBごとに1回だけ取得し、ゾーン・オフセット・"
+                             "DSTの切り替わりの索引をDIRに保存して使い回す"
+                             f"（DIR省略時: {tz_catalog.DEFAULT_CATALOG_DIR}）")
+    parser.add_argument("--refresh-catalog", action="store_true",
+                        help="--catalog の索引ファイルを使わずにカタログを取得し直す")
+    parser.add_argument("--matrix", action="store_true",
+                        help="固定のTEST_CASESに加えて、生成した組み合わせ行列（DST境界などを含む）を実行する")
+    parser.add_argument("--matrix-session-zones", metavar="ZONES",
+                        help="行列のセッションタイムゾーン（カンマ区切り、all でpg_timezone_namesの全ゾーン）")
+    parser.add_argument("--matrix-input-zones", metavar="ZONES",
+                        help="DSTの切り替わりを入力値に展開するタイムゾーン（カンマ区切り、all で全ゾーン）")
+    parser.add_argument("--matrix-years", default="2020-2030", metavar="START-END",
+                        help="DSTの切り替わりを展開する年の範囲（デフォルト: 2020-2030）")
+    parser.add_argument("--batch-size", type=positive_int, default=1000, metavar="N",
+                        help="行列を実行する際に1回にまとめて送る入力値の最大件数（デフォルト: 1000）")
+    parser.add_argument("--oracle", type=int, default=0, metavar="N",
+                        help="セッションタイムゾーンごとにN件の時刻をサーバーへ送り、Python側の予測との差分を検証する")
+    parser.add_argument("--oracle-zones", metavar="ZONES",
+                        help="差分検証のセッションタイムゾーン（カンマ区切り、all でpg_timezone_namesの全ゾーン）")
+    parser.add_argument("--oracle-seed", type=int, default=0, metavar="SEED",
+                        help="差分検証で生成する時刻の乱数シード（デフォルト: 0）")
+    parser.add_argument("--oracle-read", choices=["text", "binary"], default="text",
+                        help="差分検証の結果の読み出し方（text: 各列を文字列で取得して書式まで比較、"
+                             "binary: バイナリCOPYでマイクロ秒の整数の配列として取得して値を比較、デフォルト: text）")
+    parser.add_argument("--copy", type=int, default=0, metavar="N",
+                        help="N行を COPY FROM STDIN で取り込み COPY TO STDOUT で読み出して、スループットを計測する")
+    parser.add_argument("--copy-format", choices=["text", "binary", "both"], default="both",
+                        help="--copy で使うCOPYの形式（デフォルト: both）")
+    parser.add_argument("--scale", type=int, default=0, metavar="N",
+                        help="N行の timezone_scale テーブルで、インデックスの組とセッションタイムゾーンごとに"
+                             "範囲検索・日ごとの集計の実行計画と実行時間を調べる（デフォルト: 0 = 実行しない）")
+    parser.add_argument("--scale-zones", metavar="ZONES",
+                        help="--scale で使うセッションタイムゾーン（カンマ区切り、all で全ゾーン、"
+                             f"デフォルト: {','.join(tz_scale.DEFAULT_SCALE_TIMEZONES)}）")
+    parser.add_argument("--scale-indexes", metavar="SETS",
+                        help=f"--scale で試すインデックスの組（カンマ区切り、デフォルト: {','.join(tz_scale.INDEX_SET_NAMES)}）")
+    parser.add_argument("--scale-repeat", type=int, default=3, metavar="N",
+                        help="--scale の各クエリの計測回数（中央値を記録、デフォルト: 3）")
+    parser.add_argument("--scale-drop", action="store_true",
+                        help="--scale の終了後に timezone_scale テーブルを削除する（デフォルトは次回のために残す）")
+    parser.add_argument("--partition", type=int, default=0, metavar="N",
+                        help="ts / tstz をキーにした月ごとのパーティションテーブルにN行ずつ入れ、述語ごとの"
+                             "パーティションプルーニングと実行時間を調べる（デフォルト: 0 = 実行しない）")
+    parser.add_argument("--partition-zones", metavar="ZONES",
+                        help="--partition で使うセッションタイムゾーン（カンマ区切り、all で全ゾーン、"
+                             f"デフォルト: {','.join(tz_partition.DEFAULT_PARTITION_TIMEZONES)}）")
+    parser.add_argument("--partition-repeat", type=int, default=3, metavar="N",
+                        help="--partition の各クエリの計測回数（中央値を記録、デフォルト: 3）")
+    parser.add_argument("--load", type=int, default=0, metavar="N",
+                        help="セッションタイムゾーンの異なるN個の書き込み手で now() を同時に挿入し続ける負荷テストを行う"
+                             "（デフォルト: 0 = 実行しない）")
+    parser.add_argument("--load-duration", type=float, default=10.0, metavar="SECONDS",
+                        help="--load で書き込みを続ける秒数（デフォルト: 10）")
+    parser.add_argument("--load-zones", metavar="ZONES",
+                        help="--load の書き込み手に順番に割り当てるセッションタイムゾーン（カンマ区切り、"
+                             "デフォルト: --matrix と同じ既定リスト）")
+    parser.add_argument("--load-batch", type=int, default=1, metavar="N",
+                        help="--load の1トランザクションで挿入する行数（デフォルト: 1）")
+    parser.add_argument("--fuzz", type=int, default=0, metavar="N",
+                        help="乱数で生成したN件のケースで、タイムスタンプの往復の不変条件をプロセスプールで検証する"
+                             "（デフォルト: 0 = 実行しない）")
+    parser.add_argument("--fuzz-workers", type=positive_int, metavar="N",
+                        help="--fuzz のワーカープロセスの数（DBごと、デフォルト: CPUの数を並行に実行するDBの数で割った数）")
+    parser.add_argument("--fuzz-seed", type=int, default=0, metavar="SEED",
+                        help="--fuzz の乱数シード（デフォルト: 0）")
+    parser.add_argument("--fuzz-duration", type=float, metavar="SECONDS",
+                        help="--fuzz を件数ではなく時間で打ち切る（各ワーカーが指定した秒数のあいだ検証を続ける）")
+    parser.add_argument("--fuzz-zones", metavar="ZONES",
+                        help="--fuzz で使うタイムゾーン（カンマ区切り、デフォルト: all = pg_timezone_namesの全ゾーン）")
+    parser.add_argument("--bench", action="store_true",
+                        help="ts / tstz の挿入・取得・::TEXT・AT TIME ZONE のコストを計測する")
+    parser.add_argument("--bench-warmup", type=int, default=5, metavar="N",
+                        help="ベンチマークのウォームアップ回数（デフォルト: 5）")
+    parser.add_argument("--bench-repeat", type=positive_int, default=50, metavar="N",
+                        help="ベンチマークの計測回数（1以上、デフォルト: 50）")
+    parser.add_argument("--bench-rows", type=int, default=tz_bench.DEFAULT_BENCH_ROWS, metavar="N",
+                        help=f"取得系のベンチマークで読み出す行数（デフォルト: {tz_bench.DEFAULT_BENCH_ROWS}）")
+    parser.add_argument("--bench-json", default="BENCH.json", metavar="PATH",
+                        help="ベンチマーク結果を保存するJSONファイル（デフォルト: BENCH.json）")
+    parser.add_argument("--profile", nargs="?", const="PROFILE.json", metavar="PATH",
+                        help="問い合わせごとの所要時間・往復回数・コミット回数・送受信量をテスト種別ごとに集計し、"
+                             "RESULT.md のプロファイルの節とJSONファイルに保存する（PATH省略時: PROFILE.json）")
+    parser.add_argument("--profile-explain", metavar="REGEX",
+                        help="--profile 使用時に、正規表現に一致する文の EXPLAIN (ANALYZE, BUFFERS) を"
+                             "テスト種別ごとに1回ずつ取得する")
+    parser.add_argument("--cache", nargs="?", const=tz_cache.DEFAULT_CACHE_PATH, metavar="PATH",
+                        help="文字列リテラルとPython datetimeのテスト結果をキャッシュし、再実行時は変わったケースだけを"
+                             f"実行する（PATH省略時: {tz_cache.DEFAULT_CACHE_PATH}）")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="--cache のキャッシュを使わずに全てのケースを実行し、結果でキャッシュを更新する")
+    parser.add_argument("--results-file", metavar="PATH",
+                        help="テスト結果を届いた順にファイルへ追記する（.csv ならCSV、それ以外はNDJSON）")
+    parser.add_argument("--no-keep-results", dest="keep_results", action="store_false",
+                        help="--results-file 使用時に結果をメモリに保持せず、レポート作成時にファイルから読み直す")
+    parser.add_argument("--report-from", metavar="PATH",
+                        help="テストを実行せず、--results-file で書き出したファイルから RESULT.md を作り直す")
+    parser.add_argument("--compose", nargs="?", const=tz_targets.DEFAULT_COMPOSE_PATH, metavar="PATH",
+                        help="テスト対象のDBを DB_CONFIGS の代わりに docker-compose.yml のサービスから作る"
+                             f"（PATH省略時: {tz_targets.DEFAULT_COMPOSE_PATH}）")
+    parser.add_argument("--local-clusters", metavar="ZONES",
+                        help="Dockerの代わりに、コンテナのタイムゾーン（カンマ区切り、compose で docker-compose.yml と同じ構成）"
+                             "ごとに使い捨てのローカルのクラスタを起動してテストする")
+    parser.add_argument("--pg-bin", metavar="DIR",
+                        help="--local-clusters で使う initdb / pg_ctl のディレクトリ（デフォルト: PATH または pg_config から探す）")
+    parser.add_argument("--cluster-dir", default=tz_targets.DEFAULT_CLUSTER_DIR, metavar="DIR",
+                        help="--local-clusters のテンプレートとクラスタを置くディレクトリ"
+                             f"（デフォルト: {tz_targets.DEFAULT_CLUSTER_DIR}）")
+    parser.add_argument("--artifact", nargs="?", const=tz_diff.DEFAULT_ARTIFACT_PATH, metavar="PATH",
+                        help="実行のたびに変わらない結果を、グループごとのハッシュを持つ並べ替えた成果物に書き出す"
+                             f"（PATH省略時: {tz_diff.DEFAULT_ARTIFACT_PATH}）")
+    parser.add_argument("--artifact-check", action="store_true",
+                        help="--artifact の書き出し時に、結果をCSVとNDJSONに書き出して読み直しても"
+                             "同じフィンガープリントになるかを確かめる")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"),
+                        help="テストを実行せず、--artifact で書き出した2つの成果物の変わったセルだけを表示する")
+    return parser.parse_args(argv)
+
+def record_result(record):
+    """テスト結果を1件記録する（スレッドセーフ）"""
+    test_results.append(record)
+
+def lenient_typecaster(name, caster):
+    """Pythonのdatetimeで表せない値（紀元前や10000年以降）は文字列のまま返すタイプキャスタを作る"""
+    def cast(value, cur):
         try:
-            conn = psycopg2.connect(
-                host=db_config["host"],
-                port=db_config["port"],
-                user=db_config["user"],
-                password=db_config["password"],
-                database=db_config["database"]
-            )
-            
-            # 環境設定のチェック
-            check_environment(conn, db_config)
-            
-            # 各テストケースを実行
-            for test_case in TEST_CASES:
-                run_test_case(conn, db_config, test_case)
-                
-        except Exception as e:
-            print(f"エラー: {e}")
-        finally:
-            if 'conn' in locals() and conn is not None:
-                conn.close()
-                
+            return caster(value, cur)
+        except ValueError:
+            return value
+    return psycopg2.extensions.new_type(caster.values, name, cast)
+
+LENIENT_TIMESTAMP = lenient_typecaster("LENIENT_TIMESTAMP", psycopg2.extensions.PYDATETIME)
+LENIENT_TIMESTAMPTZ = lenient_typecaster("LENIENT_TIMESTAMPTZ", psycopg2.extensions.PYDATETIMETZ)
+
+def connect_db(db_config, startup_options=None, connection_factory=IsolatedConnection):
+    """DB設定からコネクションを作成する（startup_options は libpq の起動パラメータ）"""
+    conn = psycopg2.connect(
+        host=db_config["host"],
+        port=db_config["port"],
+        user=db_config["user"],
+        password=db_config["password"],
+        database=db_config["database"],
+        options=startup_options,
+        connection_factory=connection_factory
+    )
+    psycopg2.extensions.register_type(LENIENT_TIMESTAMP, conn)
+    psycopg2.extensions.register_type(LENIENT_TIMESTAMPTZ, conn)
+    return conn
+
+def run_target(db_config, options):
+    """1つのデータベース設定に対してテストを実行（ワーカーごとに専用コネクションを使用）"""
+    print(f"\n\n==== {db_config['name']} ({db_config['container_timezone']}) のテスト実行中 ====")
+    
+    # --profile 指定時は問い合わせを計測するコネクションを使う
+    connection_factory = tz_profile.ProfilingConnection if options.profile else IsolatedConnection
+    
+    def open_connection(startup_options):
+        conn = connect_db(db_config, startup_options, connection_factory)
+        conn.setup_isolation(options.isolation)
+        return conn
+    
+    # セッションタイムゾーンを設定済みのコネクションをテストケースや各フェーズで使い回す
+    pool = TimezonePool(open_connection, options.pool_size)
+    try:
+        with tz_profile.target(db_config["name"]):
+            run_target_phases(pool, db_config, options)
+    except Exception as e:
+        print(f"エラー ({db_config['name']}): {e}")
+    finally:
+        print(f"{db_config['name']}: コネクション {pool.opened} 本を作成, "
+              f"再利用 {pool.reused} 回, タイムゾーンの再設定 {pool.retargeted} 回")
+        pool.close()
+        if options.profile:
+            record_profile(db_config)
+
+def run_target_phases(pool, db_config, options):
+    """1つのデータベース設定に対して各フェーズを順に実行する（フェーズごとに計測のラベルを付ける）"""
+    # 環境設定のチェック
+    with tz_profile.label("環境設定"), pool.connection(None) as conn:
+        settings = check_environment(conn, db_config)
+        if result_cache is not None:
+            # サーバーのバージョンとコンテナのタイムゾーンが変わればキャッシュのキーも変わる
+            result_cache.register_target(
+                db_config["name"], conn.server_version, settings["current_setting('timezone')"])
+        
+        # タイムゾーンカタログの索引（行列の生成などで問い合わせの代わりに使う）
+        with tz_profile.label("タイムゾーンカタログ"):
+            catalog = load_timezone_catalog(conn, db_config, options) if options.catalog else None
+    
+    # 各テストケースを実行（server の場合は全テストケースを1回の呼び出しで実行）
+    # テストごとのラベルの外側の処理（プールによるタイムゾーンの設定など）は「セッション設定」に数える
+    with tz_profile.label("セッション設定"):
+        if options.engine == "server":
+            with tz_profile.label("サーバー側ハーネス"):
+                run_server_test_cases(pool, db_config, options)
+        else:
+            run_test_cases(pool, db_config, options)
+    
+    # 生成した組み合わせ行列を実行
+    if options.matrix:
+        with tz_profile.label("組み合わせ行列"):
+            run_matrix(pool, db_config, options, catalog)
+    
+    # オラクルとの差分検証
+    if options.oracle > 0:
+        with tz_profile.label("オラクル検証"):
+            run_oracle_checks(pool, db_config, options, catalog)
+    
+    # COPYによる一括取り込み・読み出しのスループット計測
+    if options.copy > 0:
+        with tz_profile.label("COPYスループット"):
+            run_copy_tests(pool, db_config, options)
+    
+    # 大量の行に対する範囲検索・集計とインデックスの効き方
+    if options.scale > 0:
+        with tz_profile.label("大規模クエリ"):
+            run_scale_tests(pool, db_config, options)
+    
+    # パーティションのキーの型と述語ごとのプルーニング
+    if options.partition > 0:
+        with tz_profile.label("パーティションプルーニング"):
+            run_partition_tests(pool, db_config, options)
+    
+    # 複数のセッションタイムゾーンからの now() の同時書き込み
+    if options.load > 0:
+        with tz_profile.label("負荷テスト"):
+            run_load_test(pool, db_config, options)
+    
+    # 乱数で生成したケースによる不変条件の検証
+    if options.fuzz > 0 or options.fuzz_duration:
+        with tz_profile.label("ファジング"):
+            run_fuzz_tests(pool, db_config, options, catalog)
+    
+    # ts / tstz の操作ごとのコストの計測
+    if options.bench:
+        with tz_profile.label("ベンチマーク"), pool.connection(None) as conn:
+            run_benchmarks(conn, db_config, options)
+
+def record_profile(db_config):
+    """対象DBの計測結果をラベルごとに記録する"""
+    db_name = db_config["name"]
+    for _, label, summary in tz_profile.profiler.items(db_name):
+        record_result({
+            "test_type": "プロファイル",
+            "db_name": db_name,
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": "デフォルト",
+            "label": label,
+            **{name: summary[name] for name in (
+                "round_trips", "commits", "rollbacks", "total_ms", "mean_ms", "p50_ms", "p99_ms",
+                "max_ms", "commit_ms", "bytes_sent", "bytes_received", "rows")}
+        })
+    for plan in tz_profile.profiler.plans:
+        if plan["target"] == db_name:
+            record_result({
+                "test_type": "実行計画",
+                "db_name": db_name,
+                "container_timezone": db_config["container_timezone"],
+                "session_timezone": "デフォルト",
+                "label": plan["label"],
+                "query": plan["query"],
+                "plan": plan["plan"]
+            })
+
+def configure_targets(options):
+    """--compose / --local-clusters の指定に合わせて DB_CONFIGS を置き換える
+
+    --local-clusters の場合は、ポートを割り当てた（まだ起動していない）LocalClusters を返す。
+    """
+    if options.local_clusters:
+        clusters = tz_targets.LocalClusters(tz_targets.parse_local_spec(options.local_clusters),
+                                            bin_dir=options.pg_bin, cluster_dir=options.cluster_dir)
+        DB_CONFIGS[:] = clusters.targets
+        return clusters
+    if options.compose:
+        DB_CONFIGS[:] = tz_targets.load_compose_targets(options.compose)
+        print(f"{options.compose} から {len(DB_CONFIGS)} 件のDBを対象にします: "
+              f"{', '.join(db_config['name'] for db_config in DB_CONFIGS)}")
+    return None
+
+def run_all_targets(options):
+    """DB_CONFIGS の全てのDBをテストする（--jobs で並行実行）"""
+    jobs = max(1, min(options.jobs, len(DB_CONFIGS)))
+    if jobs == 1:
+        for db_config in DB_CONFIGS:
+            run_target(db_config, options)
+    else:
+        # DBごとにワーカーを割り当てて並行実行する
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(run_target, db_config, options): db_config for db_config in DB_CONFIGS}
+            for future in as_completed(futures):
+                db_config = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    # 1つのDBの失敗が他のDBのテストに影響しないようにする
+                    print(f"エラー ({db_config['name']}): {e}")
+
+def run_tests(options=None):
+    """すべてのデータベース設定に対してテストを実行"""
+    if options is None:
+        options = parse_args([])
+    
+    # 2つの成果物を比べるだけで、テストは実行しない
+    if options.diff:
+        return tz_diff.print_diff(*options.diff)
+    
+    clusters = configure_targets(options)
+    
+    # 書き出し済みの結果ファイルからレポートだけを作り直す
+    if options.report_from:
+        test_results.load(options.report_from)
+        save_results()
+        if options.artifact:
+            save_artifact(options.artifact, options.artifact_check)
+        return
+    
+    if options.results_file:
+        test_results.open_stream(options.results_file, keep_in_memory=options.keep_results)
+    
+    if options.profile:
+        tz_profile.profiler.configure(options.profile_explain)
+    
+    global result_cache
+    if options.cache:
+        result_cache = tz_cache.ResultCache(options.cache, refresh=options.refresh_cache)
+    
+    if clusters is not None:
+        started = time.perf_counter()
+        clusters.start()
+        print(f"ローカルのクラスタ {len(DB_CONFIGS)} 個を {time.perf_counter() - started:.1f} 秒で起動しました")
+    
+    try:
+        run_all_targets(options)
+    finally:
+        if clusters is not None:
+            clusters.stop()
+    
+    if result_cache is not None:
+        print(f"\nキャッシュ: {result_cache.hits} 件をキャッシュから取得, {result_cache.stored} 件を実行して保存")
+        result_cache.close()
+        result_cache = None
+    
     # 結果をマークダウンファイルに保存
     save_results()
+    if options.artifact:
+        save_artifact(options.artifact, options.artifact_check)
+    if options.bench:
+        save_benchmarks(options)
+    if options.profile:
+        tz_profile.profiler.write_json(options.profile)
+        print(f"プロファイルを {options.profile} に保存しました")
+    test_results.close()
+
+def save_artifact(path, check=False):
+    """比較用の成果物を書き出し、フィンガープリントを表示する"""
+    manifest = tz_diff.write_artifact(test_results, path)
+    rows = sum(group["rows"] for group in manifest["groups"])
+    print(f"成果物を {path} に保存しました（グループ {len(manifest['groups'])} 件, {rows} 行, "
+          f"フィンガープリント {manifest['fingerprint'][:16]}）")
+    if check:
+        tz_diff.check_round_trip(test_results, os.path.dirname(os.path.abspath(path)))
+        print("CSV・NDJSONの結果ファイルから作り直しても同じフィンガープリントになることを確認しました")
 
 def check_environment(conn, db_config):
     """データベース環境設定の確認"""
@@ -101,7 +487,7 @@ def check_environment(conn, db_config):
         print(f"\n{db_config['name']} の環境設定:")
         for setting in settings:
             print(f"  {setting[0]}: {setting[1]}")
-            test_results.append({
+            record_result({
                 "test_type": "環境設定",
                 "db_name": db_config["name"],
                 "container_timezone": db_config["container_timezone"],
@@ -109,8 +495,107 @@ def check_environment(conn, db_config):
                 "parameter": setting[0],
                 "value": setting[1]
             })
+    
+    return dict(settings)
+
+def load_timezone_catalog(conn, db_config, options):
+    """対象DBのタイムゾーンカタログの索引を読み込み（無ければ取得して保存し）、概要を記録する"""
+    catalog, from_file = tz_catalog.load_catalog(
+        conn, db_config, options.catalog, refresh=options.refresh_catalog)
+    loaded_from = "索引ファイル" if from_file else "サーバー"
+    
+    print(f"タイムゾーンカタログ ({loaded_from}): tzdata {catalog.tzdata_version}, "
+          f"ゾーン {len(catalog.zones)} 件, 略称 {len(catalog.abbrevs)} 件")
+    if catalog.probe_mismatches:
+        print(f"  pytzとオフセットが異なるゾーン: {', '.join(catalog.probe_mismatches)}")
+    
+    record_result({
+        "test_type": "タイムゾーンカタログ",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": "デフォルト",
+        "server_version": catalog.server_version,
+        "tzdata_version": catalog.tzdata_version,
+        "zone_count": len(catalog.zones),
+        "abbrev_count": len(catalog.abbrevs),
+        "transition_zone_count": len(catalog.data["transitions"]),
+        "probe_mismatches": ", ".join(catalog.probe_mismatches),
+        "loaded_from": loaded_from
+    })
+    return catalog
+
+def run_test_cases(pool, db_config, options):
+    """各テストケースを、そのセッションタイムゾーンを設定済みのコネクションで実行する"""
+    for test_case in TEST_CASES:
+        with pool.connection(test_case["session_timezone"]) as conn:
+            run_test_case(conn, db_config, test_case, options)
+
+def run_server_test_cases(pool, db_config, options):
+    """サーバー側のテストハーネスで、全てのテストケースを1回の往復で実行する"""
+    dt_cases = python_datetime_cases()
+    # 関数の input_index は全テストケースの入力値を並べた配列の添字（1始まり）
+    values = [value for test_case in TEST_CASES for value in test_case["values"]]
+    with pool.connection(None) as conn:
+        try:
+            if tz_server.ensure_installed(conn):
+                print(f"{db_config['name']}: run_timezone_tests() を作成しました")
+            with conn.cursor() as cur:
+                rows = tz_server.run_server_tests(cur, TEST_CASES, dt_cases)
+            # 関数内の SET LOCAL をトランザクションごと破棄する
+            conn.rollback()
+        except Exception as e:
+            # 関数を作成できないDB（読み取り専用のレプリカなど）では式評価のパスで実行する
+            print(f"サーバー側のテストハーネスを使えないため、テストケースごとに実行します: {e}")
+            conn.rollback()
+            rows = None
+    
+    if rows is None:
+        run_test_cases(pool, db_config, argparse.Namespace(**dict(vars(options), engine="expression")))
+        return
+    
+    current_case = None
+    for row in rows:
+        case_index, result_type, input_index, result = row[0], row[1], row[2], row[3:]
+        test_case = TEST_CASES[case_index - 1]
+        session_timezone = test_case["session_timezone"]
+        session_desc = session_timezone if session_timezone else "デフォルト"
+        if case_index != current_case:
+            print(f"\n---- テストケース: {test_case['description']} ----")
+            current_case = case_index
+        
+        error = row[-1]
+        if result_type == "session_timezone":
+            record_test_error(db_config, session_desc, "セッションタイムゾーンの設定", error)
+        elif result_type == "session_functions":
+            # (now, now::TEXT, ...) の形に合わせる（サーバーからは文字列だけを受け取る）
+            texts = row[10:14]
+            report_session_functions_result(
+                db_config, session_desc, [text for text in texts for _ in range(2)])
+        elif result_type == "timestamp":
+            value = values[input_index - 1]
+            if error is not None:
+                print(f"エラー ({value['description']}): {error}")
+                record_result({
+                    "test_type": "エラー",
+                    "db_name": db_config["name"],
+                    "container_timezone": db_config["container_timezone"],
+                    "session_timezone": session_desc,
+                    "input_description": value["description"],
+                    "input_ts": value["ts_str"],
+                    "input_tstz": value["tstz_str"],
+                    "error": error
+                })
+            else:
+                report_timestamp_result(db_config, session_desc, value, result[:7])
+        elif result_type == "python_datetime":
+            if error is not None:
+                record_test_error(db_config, session_desc, f"Python datetime テスト ({result[0]})", error)
+            else:
+                report_python_datetime_result(db_config, session_desc, dt_cases[input_index - 1], result[:7])
+        elif result_type == "now_insertion":
+            report_now_insertion_result(db_config, session_desc, result[:5])
 
-def run_test_case(conn, db_config, test_case):
+def run_test_case(conn, db_config, test_case, options):
     """特定のテストケースを実行する"""
     session_timezone = test_case["session_timezone"]
     session_desc = session_timezone if session_timezone else "デフォルト"
@@ -118,180 +603,862 @@ def run_test_case(conn, db_config, test_case):
     print(f"\n---- テストケース: {test_case['description']} ----")
     
     with conn.cursor() as cur:
-        # セッションのタイムゾーンを設定（必要な場合）
+        # セッションのタイムゾーンはプールが設定済み（サーバーが通知した値で確認する）
         if session_timezone:
-            cur.execute(f"SET timezone TO '{session_timezone}'")
-            conn.commit()
-            
-            # 更新後のタイムゾーン設定を確認
-            cur.execute("SELECT current_setting('timezone')")
-            current_tz = cur.fetchone()[0]
+            current_tz = current_timezone(conn)
             print(f"セッションタイムゾーンを {session_timezone} に設定（実際の値: {current_tz}）")
         
         # 1. セッション関数のテスト
-        test_session_functions(conn, cur, db_config, session_desc)
+        with tz_profile.label("セッション関数"):
+            test_session_functions(conn, cur, db_config, session_desc)
         
         # 2. 文字列リテラルのテスト
-        for value in test_case["values"]:
-            test_timestamp(conn, cur, db_config, session_desc, value)
+        with tz_profile.label("タイムスタンプ変換"):
+            if options.engine == "expression":
+                test_timestamps_expression(conn, cur, db_config, session_desc, test_case["values"])
+            elif options.batch:
+                test_timestamps_batched(conn, cur, db_config, session_desc, test_case["values"])
+            else:
+                for value in test_case["values"]:
+                    test_timestamp(conn, cur, db_config, session_desc, value)
             
         # 3. Pythonのdatetimeオブジェクトのテスト
-        test_python_datetime(conn, cur, db_config, session_desc)
+        with tz_profile.label("Pythonデータタイプ変換"):
+            if options.batch:
+                test_python_datetime_batched(conn, cur, db_config, session_desc)
+            else:
+                test_python_datetime(conn, cur, db_config, session_desc)
         
         # 4. now()の結果を異なるカラムに挿入するテスト
-        test_now_insertion(conn, cur, db_config, session_desc)
+        with tz_profile.label("now()挿入テスト"):
+            test_now_insertion(conn, cur, db_config, session_desc)
 
-def test_timestamp(conn, cur, db_config, session_timezone, value):
-    """1つのタイムスタンプ値をテストする"""
-    try:
-        # テーブルをクリア
-        cur.execute("TRUNCATE timezone_test")
-        
-        # データを挿入
-        cur.execute(
-            "INSERT INTO timezone_test (description, ts, tstz) VALUES (%s, %s, %s) RETURNING id",
-            (value["description"], value["ts_str"], value["tstz_str"])
-        )
-        inserted_id = cur.fetchone()[0]
-        conn.commit()
-        
-        # データを取得
-        cur.execute("""
-            SELECT 
-                description,
-                ts,
-                ts::TEXT as ts_text,
-                tstz,
-                tstz::TEXT as tstz_text,
-                tstz AT TIME ZONE 'UTC' as tstz_utc,
-                tstz AT TIME ZONE 'Asia/Tokyo' as tstz_jst
-            FROM timezone_test
-            WHERE id = %s
-        """, (inserted_id,))
-        
-        result = cur.fetchone()
-        
-        # 結果を表示
+# 挿入値をまとめて1文で挿入し、同じ文の中で各種の表現を読み出すSQL
+# （execute_valuesが VALUES %s を複数行のVALUESに展開する）
+BATCH_INSERT_SELECT_SQL = """
+    WITH inserted AS (
+        INSERT INTO timezone_test (description, ts, tstz)
+        VALUES %s
+        RETURNING id, description, ts, tstz
+    )
+    SELECT 
+        description,
+        ts,
+        ts::TEXT as ts_text,
+        tstz,
+        tstz::TEXT as tstz_text,
+        tstz AT TIME ZONE 'UTC' as tstz_utc,
+        tstz AT TIME ZONE 'Asia/Tokyo' as tstz_jst
+    FROM inserted
+    ORDER BY id
+"""
+
+def insert_and_select_batch(cur, rows):
+    """(description, ts, tstz) の行をまとめて挿入し、挿入順に取得結果を返す"""
+    return psycopg2.extras.execute_values(
+        cur, BATCH_INSERT_SELECT_SQL, rows, page_size=max(1, len(rows)), fetch=True
+    )
+
+def report_timestamp_result(db_config, session_timezone, value, result, echo=True):
+    """タイムスタンプ値1件の取得結果を表示・記録する"""
+    # 結果を表示
+    if echo:
         print(f"\n[{value['description']}]")
         print(f"  入力値: ts={value['ts_str']}, tstz={value['tstz_str']}")
         print(f"  取得値 (timestamp): {result[1]} ({result[2]})")
         print(f"  取得値 (timestamptz): {result[3]} ({result[4]})")
         print(f"  timestamptz AT TIME ZONE 'UTC': {result[5]}")
         print(f"  timestamptz AT TIME ZONE 'Asia/Tokyo': {result[6]}")
+    
+    # 結果を記録
+    record = {
+        "test_type": "タイムスタンプ変換",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "input_description": value["description"],
+        "input_ts": value["ts_str"],
+        "input_tstz": value["tstz_str"],
+        "output_ts": str(result[2]),
+        "output_tstz": str(result[4]),
+        "tstz_at_utc": str(result[5]),
+        "tstz_at_jst": str(result[6])
+    }
+    record_result(record)
+    return record
+
+def timestamp_input(value):
+    """キャッシュのキーに使うタイムスタンプ値の入力"""
+    return [value["description"], value["ts_str"], value["tstz_str"]]
+
+def python_datetime_input(dt_case):
+    """キャッシュのキーに使うPythonのdatetimeの入力"""
+    dt = dt_case["dt"]
+    return [dt_case["description"], dt.isoformat(), str(dt.tzinfo) if dt.tzinfo else None]
+
+def cache_keys(db_config, session_timezone, query, inputs):
+    """入力ごとのキャッシュのキーを返す（キャッシュを使わない場合は None）"""
+    if result_cache is None:
+        return [None] * len(inputs)
+    return [result_cache.key(db_config["name"], session_timezone, query, item) for item in inputs]
+
+def cached_records(keys):
+    """キャッシュ済みの結果を {キー: 記録} で返す"""
+    if result_cache is None:
+        return {}
+    return result_cache.get_many([key for key in keys if key is not None])
+
+def store_cached_records(items):
+    """実行した結果を (キー, 記録) の組でキャッシュに保存する"""
+    if result_cache is not None:
+        result_cache.put_many([(key, record) for key, record in items if key is not None])
+
+def report_cached_result(db_config, session_timezone, cached, echo=True):
+    """キャッシュにあった結果を、現在のDB・セッションの結果として表示・記録する"""
+    record = dict(cached)
+    record.update({
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone
+    })
+    if record["test_type"] == "エラー":
+        print(f"エラー ({record['input_description']}): {record['error']} (キャッシュ)")
+    elif echo:
+        print(f"\n[{record['input_description']}] (キャッシュ)")
+        print(f"  取得値 (timestamp): {record['output_ts']}")
+        print(f"  取得値 (timestamptz): {record['output_tstz']}")
+    record_result(record)
+
+def run_matrix(pool, db_config, options, catalog=None):
+    """生成した組み合わせ行列をストリームとして受け取り、バッチ単位で実行する"""
+    start_year, end_year = tz_matrix.parse_year_range(options.matrix_years)
+    
+    with pool.connection(None) as conn, conn.cursor() as cur:
+        session_timezones = tz_matrix.resolve_timezones(
+            cur, options.matrix_session_zones, tz_matrix.DEFAULT_SESSION_TIMEZONES, catalog)
+        input_timezones = tz_matrix.resolve_timezones(
+            cur, options.matrix_input_zones, tz_matrix.DEFAULT_INPUT_TIMEZONES, catalog)
+    
+    print(f"\n---- 組み合わせ行列: セッションタイムゾーン {len(session_timezones)} 件, "
+          f"入力タイムゾーン {len(input_timezones)} 件, {start_year}-{end_year}年 ----")
+    
+    stream = tz_matrix.iter_matrix(session_timezones, input_timezones, start_year, end_year, catalog)
+    executed = 0
+    for batch in tz_matrix.iter_batches(stream, options.batch_size):
+        for session_timezone, values in tz_matrix.iter_session_groups(batch):
+            # プールからそのセッションタイムゾーンを設定済みのコネクションを借りる
+            batched, per_value = tz_matrix.split_per_value(values)
+            with pool.connection(session_timezone) as conn, conn.cursor() as cur:
+                # 範囲外になりうる時刻は、エラーでバッチを巻き込まないよう1件ずつ実行する
+                if options.engine == "expression":
+                    test_timestamps_expression(conn, cur, db_config, session_timezone, batched, echo=False)
+                    for value in per_value:
+                        test_expression(conn, cur, db_config, session_timezone, value, False)
+                else:
+                    test_timestamps_batched(conn, cur, db_config, session_timezone, batched, echo=False)
+                    for value in per_value:
+                        test_timestamp(conn, cur, db_config, session_timezone, value, False, BATCH_INSERT_SELECT_SQL)
         
-        # 結果を記録
-        test_results.append({
-            "test_type": "タイムスタンプ変換",
+        executed += len(batch)
+        print(f"  {db_config['name']}: {executed} 件実行済み")
+
+def run_oracle_checks(pool, db_config, options, catalog=None):
+    """大量の時刻をまとめてサーバーへ送り、オラクルの予測と異なる結果だけを記録する"""
+    with pool.connection(None) as conn, conn.cursor() as cur:
+        session_timezones = tz_matrix.resolve_timezones(
+            cur, options.oracle_zones, tz_matrix.DEFAULT_SESSION_TIMEZONES, catalog)
+    
+    print(f"\n---- オラクル差分検証: セッションタイムゾーン {len(session_timezones)} 件 × {options.oracle} 件 "
+          f"({options.oracle_read}) ----")
+    
+    # binary は文字列を作らず、整数の配列のまま予測と比較する
+    check = tz_epoch.run_differential_check if options.oracle_read == "binary" else tz_oracle.run_differential_check
+    
+    for session_timezone in session_timezones:
+        try:
+            with pool.connection(session_timezone) as conn, conn.cursor() as cur:
+                instants = tz_oracle.generate_instants(
+                    options.oracle, seed=options.oracle_seed, boundary_timezones=[session_timezone])
+                started = time.perf_counter()
+                checked, mismatches = check(cur, session_timezone, instants)
+                seconds = time.perf_counter() - started
+                conn.commit()
+        except Exception as e:
+            # 終わっていないトランザクションはプールがコネクションを返す時にロールバックする
+            print(f"エラー (オラクル差分検証 {session_timezone}): {e}")
+            record_result({
+                "test_type": "エラー",
+                "db_name": db_config["name"],
+                "container_timezone": db_config["container_timezone"],
+                "session_timezone": session_timezone,
+                "input_description": "オラクル差分検証",
+                "error": str(e)
+            })
+            continue
+        
+        print(f"  {session_timezone}: {checked} 件中 {len(mismatches)} 件が予測と不一致 ({seconds:.2f} 秒)")
+        
+        # 件数の要約と不一致だけを記録する
+        record_result({
+            "test_type": "オラクル検証",
             "db_name": db_config["name"],
             "container_timezone": db_config["container_timezone"],
             "session_timezone": session_timezone,
-            "input_description": value["description"],
-            "input_ts": value["ts_str"],
-            "input_tstz": value["tstz_str"],
-            "output_ts": str(result[2]),
-            "output_tstz": str(result[4]),
-            "tstz_at_utc": str(result[5]),
-            "tstz_at_jst": str(result[6])
+            "checked_count": checked,
+            "mismatch_count": len(mismatches),
+            "read_mode": options.oracle_read,
+            "seconds": seconds
         })
+        for mismatch in mismatches:
+            record_result({
+                "test_type": "オラクル差分",
+                "db_name": db_config["name"],
+                "container_timezone": db_config["container_timezone"],
+                "session_timezone": session_timezone,
+                "input_instant": tz_oracle.format_instant(mismatch["instant_us"]),
+                "column": mismatch["column"],
+                "expected": mismatch["expected"],
+                "actual": mismatch["actual"]
+            })
+
+def run_copy_tests(pool, db_config, options):
+    """COPYによる一括取り込み・読み出しを、セッションタイムゾーンと形式ごとに計測する"""
+    copy_formats = tz_copy.COPY_FORMATS if options.copy_format == "both" else (options.copy_format,)
+    instants = tz_copy.synthetic_instants(options.copy)
+    
+    print(f"\n---- COPYスループット: {options.copy} 行 ----")
+    
+    for test_case in TEST_CASES:
+        session_timezone = test_case["session_timezone"]
+        session_desc = session_timezone if session_timezone else "デフォルト"
         
+        for copy_format in copy_formats:
+            try:
+                with pool.connection(session_timezone) as conn:
+                    metrics = tz_copy.run_copy_roundtrip(conn, instants, copy_format)
+            except Exception as e:
+                print(f"エラー (COPYスループット {session_desc} {copy_format}): {e}")
+                record_result({
+                    "test_type": "エラー",
+                    "db_name": db_config["name"],
+                    "container_timezone": db_config["container_timezone"],
+                    "session_timezone": session_desc,
+                    "input_description": f"COPYスループット ({copy_format})",
+                    "error": str(e)
+                })
+                continue
+            
+            print(f"  {session_desc} ({copy_format}): 取り込み {metrics['load_rows_per_sec']:.0f} 行/秒, "
+                  f"読み出し {metrics['readback_rows_per_sec']:.0f} 行/秒")
+            
+            record = {
+                "test_type": "COPYスループット",
+                "db_name": db_config["name"],
+                "container_timezone": db_config["container_timezone"],
+                "session_timezone": session_desc,
+            }
+            record.update(metrics)
+            record_result(record)
+
+def run_scale_tests(pool, db_config, options):
+    """インデックスの組ごとに、各セッションタイムゾーンで範囲検索・日ごとの集計を実行して記録する"""
+    index_sets = tz_scale.parse_index_sets(options.scale_indexes)
+    with pool.connection(None) as conn, conn.cursor() as cur:
+        session_timezones = tz_matrix.resolve_timezones(
+            cur, options.scale_zones, tz_scale.DEFAULT_SCALE_TIMEZONES)
+    
+    print(f"\n---- 大規模クエリ: {options.scale} 行, インデックスの組 {len(index_sets)} 件 × "
+          f"セッションタイムゾーン {len(session_timezones)} 件 ----")
+    
+    def record_setup(index_set, object_name, seconds, size, reused=False):
+        record_result({
+            "test_type": "大規模データ準備",
+            "db_name": db_config["name"],
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": "デフォルト",
+            "index_set": index_set,
+            "object_name": object_name,
+            "build_ms": seconds * 1000.0,
+            "size_bytes": size,
+            "reused": reused
+        })
+    
+    def record_error(session_timezone, description, e):
+        print(f"エラー ({description}): {e}")
+        record_result({
+            "test_type": "エラー",
+            "db_name": db_config["name"],
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": session_timezone,
+            "input_description": description,
+            "error": str(e)
+        })
+    
+    try:
+        with pool.connection(None) as conn:
+            seconds, size, reused = tz_scale.prepare_table(conn, options.scale)
     except Exception as e:
-        print(f"エラー ({value['description']}): {e}")
-        
-        # エラーを記録
-        test_results.append({
+        record_error("デフォルト", "大規模クエリ (テーブルの作成)", e)
+        return
+    print(f"  {tz_scale.SCALE_TABLE}: {'既存のテーブルを再利用' if reused else f'{seconds:.1f} 秒で作成'}, "
+          f"{size / 1024 / 1024:.1f} MiB")
+    record_setup("-", tz_scale.SCALE_TABLE, seconds, size, reused)
+    
+    try:
+        for index_set in index_sets:
+            try:
+                with pool.connection(None) as conn:
+                    built = tz_scale.build_index_set(conn, index_set)
+            except Exception as e:
+                record_error("デフォルト", f"大規模クエリ (インデックス {index_set})", e)
+                continue
+            for index_name, seconds, size in built:
+                print(f"  {index_name}: {seconds * 1000.0:.0f} ms で作成, {size / 1024:.0f} KiB")
+                record_setup(index_set, index_name, seconds, size)
+            
+            for session_timezone in session_timezones:
+                try:
+                    with pool.connection(session_timezone) as conn:
+                        results = list(tz_scale.run_queries(conn, options.scale_repeat))
+                except Exception as e:
+                    record_error(session_timezone, f"大規模クエリ ({index_set})", e)
+                    continue
+                
+                for result in results:
+                    print(f"  [{index_set}] {session_timezone} {result['query']}: "
+                          f"{result['execution_ms']:.2f} ms, {result['plan_shape']}")
+                    record = {
+                        "test_type": "大規模クエリ",
+                        "db_name": db_config["name"],
+                        "container_timezone": db_config["container_timezone"],
+                        "session_timezone": session_timezone,
+                        "index_set": index_set,
+                    }
+                    record.update(result)
+                    record_result(record)
+    finally:
+        # 次の組や他のテストに影響しないよう、作ったインデックスは残さない
+        with pool.connection(None) as conn:
+            with conn.cursor() as cur:
+                tz_scale.drop_scale_indexes(cur)
+            conn.commit()
+            if options.scale_drop:
+                tz_scale.drop_table(conn)
+
+def run_partition_tests(pool, db_config, options):
+    """ts / tstz をキーにしたパーティションテーブルで、述語ごとのプルーニングをセッションタイムゾーンごとに記録する"""
+    with pool.connection(None) as conn, conn.cursor() as cur:
+        session_timezones = tz_matrix.resolve_timezones(
+            cur, options.partition_zones, tz_partition.DEFAULT_PARTITION_TIMEZONES)
+    
+    print(f"\n---- パーティションプルーニング: {options.partition} 行, "
+          f"セッションタイムゾーン {len(session_timezones)} 件 ----")
+    
+    def record_error(session_timezone, description, e):
+        print(f"エラー ({description}): {e}")
+        record_result({
             "test_type": "エラー",
             "db_name": db_config["name"],
             "container_timezone": db_config["container_timezone"],
             "session_timezone": session_timezone,
-            "input_description": value["description"],
-            "input_ts": value["ts_str"],
-            "input_tstz": value["tstz_str"],
+            "input_description": description,
+            "error": str(e)
+        })
+    
+    try:
+        with pool.connection(None) as conn:
+            partition_counts = dict(tz_partition.create_tables(conn, options.partition))
+    except Exception as e:
+        record_error("デフォルト", "パーティションプルーニング (テーブルの作成)", e)
+        return
+    
+    try:
+        for session_timezone in session_timezones:
+            try:
+                with pool.connection(session_timezone) as conn:
+                    results = list(tz_partition.run_predicates(conn, partition_counts, options.partition_repeat))
+            except Exception as e:
+                record_error(session_timezone, "パーティションプルーニング", e)
+                continue
+            
+            for result in results:
+                print(f"  {session_timezone} {result['key_column']} {result['predicate']}: "
+                      f"{result['scanned']}/{result['partitions']} パーティションを走査 ({result['pruning']}), "
+                      f"{result['execution_ms']:.2f} ms")
+                record = {
+                    "test_type": "パーティションプルーニング",
+                    "db_name": db_config["name"],
+                    "container_timezone": db_config["container_timezone"],
+                    "session_timezone": session_timezone,
+                }
+                record.update(result)
+                record_result(record)
+    finally:
+        with pool.connection(None) as conn:
+            tz_partition.drop_tables(conn)
+
+def run_load_test(pool, db_config, options):
+    """セッションタイムゾーンを固定した書き込み手で now() を同時に挿入し、書き込み手ごとに記録する"""
+    with pool.connection(None) as conn, conn.cursor() as cur:
+        zones = tz_matrix.resolve_timezones(cur, options.load_zones, tz_matrix.DEFAULT_SESSION_TIMEZONES)
+    
+    print(f"\n---- 負荷テスト: 書き込み手 {options.load} 個, {options.load_duration:g} 秒, "
+          f"1トランザクション {options.load_batch} 行 ----")
+    
+    def connect_writer(session_timezone):
+        # 書き込み手はプールを使わず、それぞれ専用のコネクションを持つ
+        return connect_db(db_config, startup_options(session_timezone))
+    
+    try:
+        with pool.connection(None) as conn:
+            results = tz_load.run_load(conn, connect_writer, zones, options.load,
+                                       options.load_duration, options.load_batch)
+    except Exception as e:
+        print(f"エラー (負荷テスト): {e}")
+        record_result({
+            "test_type": "エラー",
+            "db_name": db_config["name"],
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": "デフォルト",
+            "input_description": "負荷テスト",
+            "error": str(e)
+        })
+        return
+    
+    for result in results:
+        print(f"  #{result['writer']} {result['writer_timezone']}: {result['rows_per_sec']:.0f} 行/秒, "
+              f"p99 {result['p99_ms']:.2f} ms, オフセット不一致 {result['offset_mismatches']} 件, "
+              f"順序の逆転 {result['order_inversions']} 件")
+        if result["last_error"]:
+            print(f"    エラー {result['errors']} 件: {result['last_error']}")
+        record = {
+            "test_type": "負荷テスト",
+            "db_name": db_config["name"],
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": result["writer_timezone"],
+        }
+        record.update(result)
+        record_result(record)
+    print(f"  合計: {sum(r['rows_per_sec'] for r in results):.0f} 行/秒")
+
+def fuzz_workers(options):
+    """DBごとのファジングのワーカー数（指定が無ければCPUを並行に実行するDBで分け合う）"""
+    if options.fuzz_workers:
+        return options.fuzz_workers
+    jobs = max(1, min(options.jobs, len(DB_CONFIGS)))
+    return max(1, (os.cpu_count() or 1) // jobs)
+
+def run_fuzz_tests(pool, db_config, options, catalog=None):
+    """ケースをプロセスプールのワーカーに分けて不変条件を検証し、要約と縮小した失敗ケースを記録する"""
+    with pool.connection(None) as conn, conn.cursor() as cur:
+        zones = tz_matrix.resolve_timezones(cur, options.fuzz_zones or "all", [], catalog)
+    
+    workers = fuzz_workers(options)
+    limit = f"{options.fuzz_duration:g} 秒" if options.fuzz_duration else f"{options.fuzz} 件"
+    print(f"\n---- ファジング: {limit}, ワーカー {workers} 個, "
+          f"タイムゾーン {len(zones)} 件, シード {options.fuzz_seed} ----")
+    
+    try:
+        results = tz_fuzz.run_fuzz(db_config, zones, options.fuzz, workers,
+                                   seed=options.fuzz_seed, duration=options.fuzz_duration)
+    except Exception as e:
+        results = []
+        record_test_error(db_config, "デフォルト", "ファジング", e)
+    
+    for result in results:
+        if result["error"]:
+            record_test_error(db_config, "デフォルト", f"ファジング (シャード {result['shard']})", result["error"])
+        for error in result["chunk_errors"]:
+            record_test_error(db_config, "デフォルト", f"ファジング (シャード {result['shard']} のチャンク)", error)
+    if not results:
+        return
+    
+    checked = sum(r["checked"] for r in results)
+    seconds = max(r["seconds"] for r in results)
+    failures = tz_fuzz.merge_failures(results)
+    print(f"  {checked} 件を {seconds:.1f} 秒で検証 ({checked / seconds if seconds else 0:.0f} 件/秒), "
+          f"失敗 {sum(r['failed'] for r in results)} 件 ({len(failures)} 種類), "
+          f"問い合わせのエラーで飛ばした {sum(r['errored'] for r in results)} 件")
+    record_result({
+        "test_type": "ファジング",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": "デフォルト",
+        "seed": options.fuzz_seed,
+        "workers": len(results),
+        "checked": checked,
+        "excluded": sum(r["excluded"] for r in results),
+        "unverified": sum(r["unverified"] for r in results),
+        "failures": sum(r["failed"] for r in results),
+        "failure_classes": len(failures),
+        "seconds": seconds,
+        "cases_per_sec": checked / seconds if seconds else 0.0
+    })
+    for failure in failures:
+        print(f"  {failure['invariant']} ({failure['session_timezone']}, {failure['at_zone']}): {failure['detail']}")
+        record_result({
+            "test_type": "ファジング失敗",
+            "db_name": db_config["name"],
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": failure["session_timezone"],
+            "invariant": failure["invariant"],
+            "instant": tz_oracle.format_instant(failure["instant_us"]),
+            "at_zone": failure["at_zone"],
+            "detail": failure["detail"],
+            "original": f"{tz_oracle.format_instant(failure['original_instant_us'])} "
+                        f"({failure['original_session_timezone']})"
+        })
+
+def run_benchmarks(conn, db_config, options):
+    """ts / tstz の挿入・取得・キャスト・AT TIME ZONE のコストを計測して記録する"""
+    print(f"\n---- ベンチマーク: ウォームアップ {options.bench_warmup} 回, 計測 {options.bench_repeat} 回 ----")
+    
+    try:
+        for result in tz_bench.run_benchmarks(conn, options.bench_warmup, options.bench_repeat, options.bench_rows):
+            print(f"  {result['operation']} {result['column']} ({result['param_style']}): "
+                  f"中央値 {result['median_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms")
+            record = {
+                "test_type": "ベンチマーク",
+                "db_name": db_config["name"],
+                "container_timezone": db_config["container_timezone"],
+                "session_timezone": "デフォルト",
+            }
+            record.update(result)
+            record_result(record)
+    except Exception as e:
+        print(f"エラー (ベンチマーク): {e}")
+        conn.rollback()
+        record_result({
+            "test_type": "エラー",
+            "db_name": db_config["name"],
+            "container_timezone": db_config["container_timezone"],
+            "session_timezone": "デフォルト",
+            "input_description": "ベンチマーク",
             "error": str(e)
         })
 
+def save_benchmarks(options):
+    """ベンチマーク結果をJSONファイルに保存"""
+    results = [r.to_dict() for r in test_results if r["test_type"] == "ベンチマーク"]
+    settings = {
+        "warmup": options.bench_warmup,
+        "repeat": options.bench_repeat,
+        "rows": options.bench_rows,
+    }
+    tz_bench.write_json(options.bench_json, results, settings)
+    print(f"ベンチマーク結果を {options.bench_json} に保存しました")
+
+# 1件ずつのパスで値を挿入するSQLと、挿入した行の各種の表現を取得するSQL
+INSERT_ONE_SQL = "INSERT INTO timezone_test (description, ts, tstz) VALUES (%s, %s, %s) RETURNING id"
+SELECT_ONE_SQL = """
+    SELECT 
+        description,
+        ts,
+        ts::TEXT as ts_text,
+        tstz,
+        tstz::TEXT as tstz_text,
+        tstz AT TIME ZONE 'UTC' as tstz_utc,
+        tstz AT TIME ZONE 'Asia/Tokyo' as tstz_jst
+    FROM timezone_test
+    WHERE id = %s
+"""
+
+def test_timestamp(conn, cur, db_config, session_timezone, value, echo=True, cache_query=None, check_cache=True):
+    """1つのタイムスタンプ値をテストする
+
+    cache_query は結果をキャッシュする際のキーに使うSQL（一括のパスから再実行する場合はそのパスのSQL）。
+    check_cache が偽の場合は、呼び出し側で引いたキャッシュに無かった値として引き直さずに実行する。
+    """
+    query = cache_query or INSERT_ONE_SQL + SELECT_ONE_SQL
+    key, = cache_keys(db_config, session_timezone, query, [timestamp_input(value)])
+    cached = cached_records([key]).get(key) if check_cache else None
+    if cached is not None:
+        report_cached_result(db_config, session_timezone, cached, echo)
+        return
+    
+    try:
+        # テーブルをクリア
+        reset_test_table(conn, cur)
+        
+        # データを挿入
+        cur.execute(INSERT_ONE_SQL, (value["description"], value["ts_str"], value["tstz_str"]))
+        inserted_id = cur.fetchone()[0]
+        commit_test_writes(conn)
+        
+        # データを取得
+        cur.execute(SELECT_ONE_SQL, (inserted_id,))
+        
+        result = cur.fetchone()
+        
+        record = report_timestamp_result(db_config, session_timezone, value, result, echo)
+        store_cached_records([(key, record)])
+        
+    except Exception as e:
+        record_timestamp_error(conn, db_config, session_timezone, value, key, e)
+
+def record_timestamp_error(conn, db_config, session_timezone, value, key, e):
+    """タイムスタンプ値1件のエラーを表示・記録する"""
+    print(f"エラー ({value['description']}): {e}")
+    # 失敗したトランザクションを破棄して次の値のテストに影響しないようにする
+    conn.rollback()
+    
+    # エラーを記録
+    record = {
+        "test_type": "エラー",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "input_description": value["description"],
+        "input_ts": value["ts_str"],
+        "input_tstz": value["tstz_str"],
+        "error": str(e)
+    }
+    record_result(record)
+    
+    # 入力値そのものが原因のエラー（SQLSTATE クラス 22: データ例外）は入力が同じなら再現するのでキャッシュする
+    if (getattr(e, "pgcode", None) or "").startswith("22"):
+        store_cached_records([(key, record)])
+
+def test_timestamps_batched(conn, cur, db_config, session_timezone, values, echo=True):
+    """テストケースのタイムスタンプ値をまとめて1文で挿入・取得してテストする"""
+    if not values:
+        return
+    
+    keys = cache_keys(db_config, session_timezone, BATCH_INSERT_SELECT_SQL, [timestamp_input(v) for v in values])
+    cached = cached_records(keys)
+    pending = [value for value, key in zip(values, keys) if key not in cached]
+    
+    try:
+        # テーブルをクリアし、キャッシュに無い値を1文で挿入・取得して1回だけコミット
+        results = []
+        if pending:
+            reset_test_table(conn, cur)
+            results = insert_and_select_batch(
+                cur, [(value["description"], value["ts_str"], value["tstz_str"]) for value in pending]
+            )
+            commit_test_writes(conn)
+    except Exception as e:
+        # どの値で失敗したかを特定できるよう、1件ずつのパスで再実行する
+        print(f"一括テストに失敗したため1件ずつ再実行します: {e}")
+        conn.rollback()
+        rerun_one_by_one(conn, cur, db_config, session_timezone, values, keys, cached, echo,
+                         functools.partial(test_timestamp, cache_query=BATCH_INSERT_SELECT_SQL))
+        return
+    
+    report_timestamp_results(db_config, session_timezone, values, keys, cached, results, echo)
+
+def rerun_one_by_one(conn, cur, db_config, session_timezone, values, keys, cached, echo, test_one):
+    """一括のパスが失敗した値を、test_one（そのエンジンの1件ずつのテスト）で再実行する
+
+    キャッシュは一括のパスで引いてヒット数も数えてあるため、ヒットした値はその結果を記録し、
+    それ以外の値だけをキャッシュを引き直さずに実行する。
+    """
+    for value, key in zip(values, keys):
+        if key in cached:
+            report_cached_result(db_config, session_timezone, cached[key], echo)
+        else:
+            test_one(conn, cur, db_config, session_timezone, value, echo, check_cache=False)
+
+def report_timestamp_results(db_config, session_timezone, values, keys, cached, results, echo=True):
+    """キャッシュの結果と実行した結果を入力順に記録し、実行した結果をキャッシュに保存する"""
+    executed = iter(results)
+    stored = []
+    for value, key in zip(values, keys):
+        if key in cached:
+            report_cached_result(db_config, session_timezone, cached[key], echo)
+        else:
+            stored.append((key, report_timestamp_result(db_config, session_timezone, value, next(executed), echo)))
+    store_cached_records(stored)
+
+# テーブルを使わずに入力文字列を配列で受け取り、キャストとAT TIME ZONEだけを評価するSQL
+# （列の並びは BATCH_INSERT_SELECT_SQL と同じにして記録処理を共通化する）
+EXPRESSION_SELECT_SQL = """
+    SELECT 
+        input.description,
+        input.ts_str::timestamp as ts,
+        input.ts_str::timestamp::TEXT as ts_text,
+        input.tstz_str::timestamptz as tstz,
+        input.tstz_str::timestamptz::TEXT as tstz_text,
+        input.tstz_str::timestamptz AT TIME ZONE 'UTC' as tstz_utc,
+        input.tstz_str::timestamptz AT TIME ZONE 'Asia/Tokyo' as tstz_jst
+    FROM unnest(%s::TEXT[], %s::TEXT[], %s::TEXT[])
+        WITH ORDINALITY AS input(description, ts_str, tstz_str, ord)
+    ORDER BY input.ord
+"""
+
+def select_expressions(cur, values):
+    """入力値を配列で送り、1回の読み取り専用クエリで全ての変換結果を入力順に返す"""
+    cur.execute(EXPRESSION_SELECT_SQL, (
+        [value["description"] for value in values],
+        [value["ts_str"] for value in values],
+        [value["tstz_str"] for value in values],
+    ))
+    return cur.fetchall()
+
+def test_expression(conn, cur, db_config, session_timezone, value, echo=True, check_cache=True):
+    """テーブルを使わず、1つのタイムスタンプ値の変換を1行のSELECTでテストする
+
+    式評価のエンジンの1件ずつのパスで、結果は式評価のSQLのキーでキャッシュする。
+    """
+    key, = cache_keys(db_config, session_timezone, EXPRESSION_SELECT_SQL, [timestamp_input(value)])
+    cached = cached_records([key]).get(key) if check_cache else None
+    if cached is not None:
+        report_cached_result(db_config, session_timezone, cached, echo)
+        return
+    
+    try:
+        result, = select_expressions(cur, [value])
+        conn.commit()
+        record = report_timestamp_result(db_config, session_timezone, value, result, echo)
+        store_cached_records([(key, record)])
+    except Exception as e:
+        record_timestamp_error(conn, db_config, session_timezone, value, key, e)
+
+def test_timestamps_expression(conn, cur, db_config, session_timezone, values, echo=True):
+    """テーブルを使わず、1回のSELECTでタイムスタンプ値の変換をテストする"""
+    if not values:
+        return
+    
+    keys = cache_keys(db_config, session_timezone, EXPRESSION_SELECT_SQL, [timestamp_input(v) for v in values])
+    cached = cached_records(keys)
+    pending = [value for value, key in zip(values, keys) if key not in cached]
+    
+    try:
+        results = []
+        if pending:
+            results = select_expressions(cur, pending)
+            # 書き込みはないのでコミットによるWALやfsyncは発生しない
+            conn.commit()
+    except Exception as e:
+        # どの値で失敗したかを特定できるよう、1件ずつのパスで再実行する
+        print(f"式評価によるテストに失敗したため1件ずつ再実行します: {e}")
+        conn.rollback()
+        rerun_one_by_one(conn, cur, db_config, session_timezone, values, keys, cached, echo, test_expression)
+        return
+    
+    report_timestamp_results(db_config, session_timezone, values, keys, cached, results, echo)
+
+def python_datetime_cases():
+    """Pythonのdatetimeオブジェクトのテストケースを作成する"""
+    naive_dt = datetime(2023, 1, 1, 12, 0, 0)  # タイムゾーン情報なし（naive）
+    utc_dt = pytz.UTC.localize(datetime(2023, 1, 1, 12, 0, 0))  # UTC（aware）
+    jst_dt = pytz.timezone('Asia/Tokyo').localize(datetime(2023, 1, 1, 12, 0, 0))  # JST（aware）
+    
+    return [
+        {"description": "Python naive datetime", "dt": naive_dt},
+        {"description": "Python aware datetime (UTC)", "dt": utc_dt},
+        {"description": "Python aware datetime (JST)", "dt": jst_dt}
+    ]
+
+def report_python_datetime_result(db_config, session_timezone, dt_case, result):
+    """Pythonのdatetimeオブジェクト1件の取得結果を表示・記録する"""
+    dt = dt_case["dt"]
+    description = dt_case["description"]
+    
+    # 結果を表示
+    dt_str = str(dt)
+    dt_tz_info = str(dt.tzinfo) if dt.tzinfo else "None"
+    print(f"\n[{description}]")
+    print(f"  入力値: {dt_str} (tzinfo={dt_tz_info})")
+    print(f"  取得値 (timestamp): {result[1]} ({result[2]})")
+    print(f"  取得値 (timestamptz): {result[3]} ({result[4]})")
+    print(f"  timestamptz AT TIME ZONE 'UTC': {result[5]}")
+    print(f"  timestamptz AT TIME ZONE 'Asia/Tokyo': {result[6]}")
+    
+    # 結果を記録
+    record = {
+        "test_type": "Pythonデータタイプ変換",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "input_description": description,
+        "input_dt": dt_str,
+        "input_dt_tzinfo": dt_tz_info,
+        "output_ts": str(result[2]),
+        "output_tstz": str(result[4]),
+        "tstz_at_utc": str(result[5]),
+        "tstz_at_jst": str(result[6])
+    }
+    record_result(record)
+    return record
+
+def record_python_datetime_error(conn, db_config, session_timezone, e):
+    """Pythonのdatetimeテストのエラーを表示・記録する"""
+    print(f"エラー (Python datetime テスト): {e}")
+    conn.rollback()
+    
+    # エラーを記録
+    record_result({
+        "test_type": "エラー",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "input_description": "Python datetime テスト",
+        "error": str(e)
+    })
+
 def test_python_datetime(conn, cur, db_config, session_timezone):
     """Pythonのdatetimeオブジェクト（naive/aware）の挙動をテストする"""
     try:
         # テーブルをクリア
-        cur.execute("TRUNCATE timezone_test")
-        
-        # テスト用のdatetimeオブジェクトを作成
-        naive_dt = datetime(2023, 1, 1, 12, 0, 0)  # タイムゾーン情報なし（naive）
-        utc_dt = pytz.UTC.localize(datetime(2023, 1, 1, 12, 0, 0))  # UTC（aware）
-        jst_dt = pytz.timezone('Asia/Tokyo').localize(datetime(2023, 1, 1, 12, 0, 0))  # JST（aware）
-        
-        # テストケース
-        dt_test_cases = [
-            {"description": "Python naive datetime", "dt": naive_dt},
-            {"description": "Python aware datetime (UTC)", "dt": utc_dt},
-            {"description": "Python aware datetime (JST)", "dt": jst_dt}
-        ]
+        reset_test_table(conn, cur)
         
-        for dt_case in dt_test_cases:
+        dt_cases = python_datetime_cases()
+        keys = cache_keys(db_config, session_timezone, INSERT_ONE_SQL + SELECT_ONE_SQL,
+                          [python_datetime_input(dt_case) for dt_case in dt_cases])
+        cached = cached_records(keys)
+        for dt_case, key in zip(dt_cases, keys):
+            if key in cached:
+                report_cached_result(db_config, session_timezone, cached[key])
+                continue
+            
             dt = dt_case["dt"]
             description = dt_case["description"]
             
             # データを挿入（psycopg2のプレースホルダ使用）
-            cur.execute(
-                "INSERT INTO timezone_test (description, ts, tstz) VALUES (%s, %s, %s) RETURNING id",
-                (description, dt, dt)
-            )
+            cur.execute(INSERT_ONE_SQL, (description, dt, dt))
             inserted_id = cur.fetchone()[0]
-            conn.commit()
+            commit_test_writes(conn)
             
             # データを取得
-            cur.execute("""
-                SELECT 
-                    description,
-                    ts,
-                    ts::TEXT as ts_text,
-                    tstz,
-                    tstz::TEXT as tstz_text,
-                    tstz AT TIME ZONE 'UTC' as tstz_utc,
-                    tstz AT TIME ZONE 'Asia/Tokyo' as tstz_jst
-                FROM timezone_test
-                WHERE id = %s
-            """, (inserted_id,))
+            cur.execute(SELECT_ONE_SQL, (inserted_id,))
             
             result = cur.fetchone()
             
-            # 結果を表示
-            dt_str = str(dt)
-            dt_tz_info = str(dt.tzinfo) if dt.tzinfo else "None"
-            print(f"\n[{description}]")
-            print(f"  入力値: {dt_str} (tzinfo={dt_tz_info})")
-            print(f"  取得値 (timestamp): {result[1]} ({result[2]})")
-            print(f"  取得値 (timestamptz): {result[3]} ({result[4]})")
-            print(f"  timestamptz AT TIME ZONE 'UTC': {result[5]}")
-            print(f"  timestamptz AT TIME ZONE 'Asia/Tokyo': {result[6]}")
-            
-            # 結果を記録
-            test_results.append({
-                "test_type": "Pythonデータタイプ変換",
-                "db_name": db_config["name"],
-                "container_timezone": db_config["container_timezone"],
-                "session_timezone": session_timezone,
-                "input_description": description,
-                "input_dt": dt_str,
-                "input_dt_tzinfo": dt_tz_info,
-                "output_ts": str(result[2]),
-                "output_tstz": str(result[4]),
-                "tstz_at_utc": str(result[5]),
-                "tstz_at_jst": str(result[6])
-            })
+            record = report_python_datetime_result(db_config, session_timezone, dt_case, result)
+            store_cached_records([(key, record)])
     
     except Exception as e:
-        print(f"エラー (Python datetime テスト): {e}")
+        record_python_datetime_error(conn, db_config, session_timezone, e)
+
+def test_python_datetime_batched(conn, cur, db_config, session_timezone):
+    """Pythonのdatetimeオブジェクトをまとめて1文で挿入・取得してテストする"""
+    dt_cases = python_datetime_cases()
+    keys = cache_keys(db_config, session_timezone, BATCH_INSERT_SELECT_SQL,
+                      [python_datetime_input(dt_case) for dt_case in dt_cases])
+    cached = cached_records(keys)
+    pending = [dt_case for dt_case, key in zip(dt_cases, keys) if key not in cached]
+    try:
+        # テーブルをクリアし、キャッシュに無いdatetimeを1文で挿入・取得して1回だけコミット
+        results = []
+        if pending:
+            reset_test_table(conn, cur)
+            results = insert_and_select_batch(
+                cur, [(dt_case["description"], dt_case["dt"], dt_case["dt"]) for dt_case in pending]
+            )
+            commit_test_writes(conn)
         
-        # エラーを記録
-        test_results.append({
-            "test_type": "エラー",
-            "db_name": db_config["name"],
-            "container_timezone": db_config["container_timezone"],
-            "session_timezone": session_timezone,
-            "input_description": "Python datetime テスト",
-            "error": str(e)
-        })
+        executed = iter(results)
+        stored = []
+        for dt_case, key in zip(dt_cases, keys):
+            if key in cached:
+                report_cached_result(db_config, session_timezone, cached[key])
+            else:
+                stored.append((key, report_python_datetime_result(db_config, session_timezone, dt_case, next(executed))))
+        store_cached_records(stored)
+    
+    except Exception as e:
+        record_python_datetime_error(conn, db_config, session_timezone, e)
 
 def test_session_functions(conn, cur, db_config, session_timezone):
     """セッション関数 (now(), CURRENT_TIMESTAMP) の挙動をテスト"""
@@ -311,43 +1478,51 @@ def test_session_functions(conn, cur, db_config, session_timezone):
         
         result = cur.fetchone()
         
-        # 結果を表示
-        print(f"\n[セッション関数テスト]")
-        print(f"  now(): {result[0]} ({result[1]})")
-        print(f"  CURRENT_TIMESTAMP: {result[2]} ({result[3]})")
-        print(f"  now()::timestamp: {result[4]} ({result[5]})")
-        print(f"  CURRENT_TIMESTAMP::timestamp: {result[6]} ({result[7]})")
-        
-        # 結果を記録
-        test_results.append({
-            "test_type": "セッション関数",
-            "db_name": db_config["name"],
-            "container_timezone": db_config["container_timezone"],
-            "session_timezone": session_timezone,
-            "now": str(result[1]),
-            "current_timestamp": str(result[3]),
-            "now_timestamp": str(result[5]),
-            "current_timestamp_timestamp": str(result[7])
-        })
+        report_session_functions_result(db_config, session_timezone, result)
         
     except Exception as e:
-        print(f"エラー (セッション関数テスト): {e}")
-        
-        # エラーを記録
-        test_results.append({
-            "test_type": "エラー",
-            "db_name": db_config["name"],
-            "container_timezone": db_config["container_timezone"],
-            "session_timezone": session_timezone,
-            "input_description": "セッション関数テスト",
-            "error": str(e)
-        })
+        record_test_error(db_config, session_timezone, "セッション関数テスト", e)
+
+def report_session_functions_result(db_config, session_timezone, result):
+    """セッション関数の取得結果を表示・記録する"""
+    # 結果を表示
+    print(f"\n[セッション関数テスト]")
+    print(f"  now(): {result[0]} ({result[1]})")
+    print(f"  CURRENT_TIMESTAMP: {result[2]} ({result[3]})")
+    print(f"  now()::timestamp: {result[4]} ({result[5]})")
+    print(f"  CURRENT_TIMESTAMP::timestamp: {result[6]} ({result[7]})")
+    
+    # 結果を記録
+    record_result({
+        "test_type": "セッション関数",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "now": str(result[1]),
+        "current_timestamp": str(result[3]),
+        "now_timestamp": str(result[5]),
+        "current_timestamp_timestamp": str(result[7])
+    })
+
+def record_test_error(db_config, session_timezone, input_description, e):
+    """テスト単位のエラーを表示・記録する"""
+    print(f"エラー ({input_description}): {e}")
+    
+    # エラーを記録
+    record_result({
+        "test_type": "エラー",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "input_description": input_description,
+        "error": str(e)
+    })
 
 def test_now_insertion(conn, cur, db_config, session_timezone):
     """now()の結果を異なるカラムに挿入した際の挙動をテスト"""
     try:
         # テーブルをクリア
-        cur.execute("TRUNCATE timezone_test")
+        reset_test_table(conn, cur)
         
         # now()の結果をタイムスタンプ型とタイムスタンプw/TZ型の両方に挿入
         cur.execute("""
@@ -359,7 +1534,7 @@ def test_now_insertion(conn, cur, db_config, session_timezone):
         """)
         
         inserted_rows = cur.fetchall()
-        conn.commit()
+        commit_test_writes(conn)
         
         for row in inserted_rows:
             inserted_id = row[0]
@@ -379,39 +1554,80 @@ def test_now_insertion(conn, cur, db_config, session_timezone):
             
             result = cur.fetchone()
             
-            # 結果を表示
-            print(f"\n[{description}]")
-            if result[1] is not None:  # tsに挿入した場合
-                print(f"  取得値 (timestamp): {result[1]} ({result[2]})")
-            if result[3] is not None:  # tstzに挿入した場合
-                print(f"  取得値 (timestamptz): {result[3]} ({result[4]})")
-            
-            # 結果を記録
-            test_results.append({
-                "test_type": "now()挿入テスト",
-                "db_name": db_config["name"],
-                "container_timezone": db_config["container_timezone"],
-                "session_timezone": session_timezone,
-                "input_description": description,
-                "output_ts": str(result[2]) if result[1] is not None else "NULL",
-                "output_tstz": str(result[4]) if result[3] is not None else "NULL"
-            })
+            report_now_insertion_result(db_config, session_timezone, result)
             
     except Exception as e:
-        print(f"エラー (now()挿入テスト): {e}")
+        record_test_error(db_config, session_timezone, "now()挿入テスト", e)
+
+def report_now_insertion_result(db_config, session_timezone, result):
+    """now()を挿入した行1件の取得結果を表示・記録する"""
+    description = result[0]
+    
+    # 結果を表示
+    print(f"\n[{description}]")
+    if result[1] is not None:  # tsに挿入した場合
+        print(f"  取得値 (timestamp): {result[1]} ({result[2]})")
+    if result[3] is not None:  # tstzに挿入した場合
+        print(f"  取得値 (timestamptz): {result[3]} ({result[4]})")
+    
+    # 結果を記録
+    record_result({
+        "test_type": "now()挿入テスト",
+        "db_name": db_config["name"],
+        "container_timezone": db_config["container_timezone"],
+        "session_timezone": session_timezone,
+        "input_description": description,
+        "output_ts": str(result[2]) if result[1] is not None else "NULL",
+        "output_tstz": str(result[4]) if result[3] is not None else "NULL"
+    })
+
+class ResultIndex:
+    """テスト結果を1回だけ走査して、レポートの各節で引ける索引にまとめる"""
+    
+    def __init__(self, records):
+        self.by_type = defaultdict(list)     # test_type -> 結果
+        self.by_db = defaultdict(list)       # (test_type, db_name) -> 結果
+        self.by_session = defaultdict(list)  # (test_type, db_name, session_timezone) -> 結果
+        for r in records:
+            test_type = r["test_type"]
+            db_key = (test_type, r["db_name"])
+            self.by_type[test_type].append(r)
+            self.by_db[db_key].append(r)
+            self.by_session[db_key + (r["session_timezone"],)].append(r)
         
-        # エラーを記録
-        test_results.append({
-            "test_type": "エラー",
-            "db_name": db_config["name"],
-            "container_timezone": db_config["container_timezone"],
-            "session_timezone": session_timezone,
-            "input_description": "now()挿入テスト",
-            "error": str(e)
-        })
+        # (test_type, db_name) ごとのセッションタイムゾーンの一覧（出力順にソート済み）
+        sessions = defaultdict(set)
+        for test_type, db_name, session_timezone in self.by_session:
+            sessions[(test_type, db_name)].add(session_timezone)
+        self.sessions = {key: sorted(values) for key, values in sessions.items()}
+
+def write_db_heading(md_file, db_config):
+    md_file.write(f"### {db_config['name']} (コンテナTZ: {db_config['container_timezone']})\n\n")
+
+def write_session_tables(md_file, index, test_type, headers, make_rows):
+    """DBごと・セッションタイムゾーンごとに、索引から1つずつ表を書き出す"""
+    for db_config in DB_CONFIGS:
+        write_db_heading(md_file, db_config)
+        
+        for session_tz in index.sessions.get((test_type, db_config["name"]), []):
+            md_file.write(f"#### セッションタイムゾーン: {session_tz}\n\n")
+            
+            results = index.by_session[(test_type, db_config["name"], session_tz)]
+            if results:
+                md_file.write(tabulate(make_rows(results), headers, tablefmt="pipe") + "\n\n")
+
+def session_function_rows(results):
+    rows = []
+    for r in results:
+        rows.append(["now()", r["now"], r["now_timestamp"]])
+        rows.append(["CURRENT_TIMESTAMP", r["current_timestamp"], r["current_timestamp_timestamp"]])
+    return rows
 
 def save_results():
     """テスト結果をマークダウンファイルに保存"""
+    # 結果の走査はここでの1回だけにし、各節は索引から書き出す
+    index = ResultIndex(test_results)
+    
     with open('RESULT.md', 'w', encoding='utf-8') as md_file:
         md_file.write("# PostgreSQLタイムゾーンテスト結果\n\n")
         
@@ -419,109 +1635,247 @@ def save_results():
         md_file.write("## 環境設定\n\n")
         
         for db_config in DB_CONFIGS:
-            md_file.write(f"### {db_config['name']} (コンテナTZ: {db_config['container_timezone']})\n\n")
-            
-            # この設定に関する環境情報を抽出
-            env_results = [r for r in test_results if r["test_type"] == "環境設定" and r["db_name"] == db_config["name"]]
+            write_db_heading(md_file, db_config)
             
+            env_results = index.by_db[("環境設定", db_config["name"])]
             if env_results:
                 headers = ["パラメータ", "値"]
                 rows = [[r["parameter"], r["value"]] for r in env_results]
                 md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
         
+        # タイムゾーンカタログの概要（--catalog 指定時のみ）
+        if index.by_type["タイムゾーンカタログ"]:
+            md_file.write("## タイムゾーンカタログ\n\n")
+            
+            headers = ["DB", "サーバーバージョン", "tzdata", "ゾーン数", "略称数",
+                       "切り替わりのあるゾーン数", "pytzとオフセットが異なるゾーン", "取得元"]
+            rows = [[r["db_name"], r["server_version"], r["tzdata_version"], r["zone_count"], r["abbrev_count"],
+                     r["transition_zone_count"], r["probe_mismatches"] or "なし", r["loaded_from"]]
+                    for db_config in DB_CONFIGS
+                    for r in index.by_db[("タイムゾーンカタログ", db_config["name"])]]
+            md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+        
         # タイムスタンプテストの結果
         md_file.write("## タイムスタンプテスト結果\n\n")
+        write_session_tables(
+            md_file, index, "タイムスタンプ変換",
+            ["入力値の説明", "入力 timestamp", "入力 timestamptz", 
+             "出力 timestamp", "出力 timestamptz", 
+             "timestamptz at UTC", "timestamptz at JST"],
+            lambda results: [[r["input_description"], r["input_ts"], r["input_tstz"], 
+                              r["output_ts"], r["output_tstz"], 
+                              r["tstz_at_utc"], r["tstz_at_jst"]] for r in results])
         
-        for db_config in DB_CONFIGS:
-            md_file.write(f"### {db_config['name']} (コンテナTZ: {db_config['container_timezone']})\n\n")
-            
-            # セッションタイムゾーン別の結果
-            session_timezones = sorted(set([r["session_timezone"] for r in test_results if r["db_name"] == db_config["name"] and r["test_type"] == "タイムスタンプ変換"]))
+        # Pythonのdatetimeオブジェクトテスト結果
+        md_file.write("## Pythonデータタイプテスト結果\n\n")
+        write_session_tables(
+            md_file, index, "Pythonデータタイプ変換",
+            ["入力値の説明", "入力 datetime", "tzinfo", 
+             "出力 timestamp", "出力 timestamptz", 
+             "timestamptz at UTC", "timestamptz at JST"],
+            lambda results: [[r["input_description"], r["input_dt"], r["input_dt_tzinfo"], 
+                              r["output_ts"], r["output_tstz"], 
+                              r["tstz_at_utc"], r["tstz_at_jst"]] for r in results])
+        
+        # セッション関数テスト結果
+        md_file.write("## セッション関数テスト結果\n\n")
+        write_session_tables(
+            md_file, index, "セッション関数",
+            ["関数", "値", "timestampへの変換結果"],
+            session_function_rows)
+        
+        # now()挿入テスト結果
+        md_file.write("## now()挿入テスト結果\n\n")
+        write_session_tables(
+            md_file, index, "now()挿入テスト",
+            ["テスト内容", "取得値 (timestamp)", "取得値 (timestamptz)"],
+            lambda results: [[r["input_description"], r["output_ts"], r["output_tstz"]] for r in results])
+        
+        # オラクルとの差分検証の結果（実行した場合のみ）
+        if index.by_type["オラクル検証"]:
+            md_file.write("## オラクル差分検証結果\n\n")
             
-            for session_tz in session_timezones:
-                md_file.write(f"#### セッションタイムゾーン: {session_tz}\n\n")
+            for db_config in DB_CONFIGS:
+                summary = index.by_db[("オラクル検証", db_config["name"])]
+                if not summary:
+                    continue
+                write_db_heading(md_file, db_config)
                 
-                # この設定・セッションに関するタイムスタンプテストの結果を抽出
-                ts_results = [r for r in test_results if r["test_type"] == "タイムスタンプ変換" and r["db_name"] == db_config["name"] and r["session_timezone"] == session_tz]
+                headers = ["セッションタイムゾーン", "読み出し", "検証件数", "不一致件数", "所要時間 (秒)"]
+                rows = [[r["session_timezone"], r.get("read_mode", "text"), r["checked_count"], r["mismatch_count"],
+                         f"{r['seconds']:.2f}" if r.get("seconds") is not None else ""] for r in summary]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
                 
-                if ts_results:
-                    headers = ["入力値の説明", "入力 timestamp", "入力 timestamptz", 
-                              "出力 timestamp", "出力 timestamptz", 
-                              "timestamptz at UTC", "timestamptz at JST"]
-                    rows = [[r["input_description"], r["input_ts"], r["input_tstz"], 
-                           r["output_ts"], r["output_tstz"], 
-                           r["tstz_at_utc"], r["tstz_at_jst"]] for r in ts_results]
+                # 予測と異なった結果だけを出力
+                diff_results = index.by_db[("オラクル差分", db_config["name"])]
+                if diff_results:
+                    headers = ["セッションタイムゾーン", "入力時刻", "列", "予測値", "実際の値"]
+                    rows = [[r["session_timezone"], r["input_instant"], r["column"], r["expected"], r["actual"]] for r in diff_results]
                     md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
         
-        # Pythonのdatetimeオブジェクトテスト結果
-        md_file.write("## Pythonデータタイプテスト結果\n\n")
-        
-        for db_config in DB_CONFIGS:
-            md_file.write(f"### {db_config['name']} (コンテナTZ: {db_config['container_timezone']})\n\n")
+        # COPYスループットの計測結果（実行した場合のみ）
+        if index.by_type["COPYスループット"]:
+            md_file.write("## COPYスループット結果\n\n")
             
-            # セッションタイムゾーン別の結果
-            session_timezones = sorted(set([r["session_timezone"] for r in test_results if r["db_name"] == db_config["name"] and r["test_type"] == "Pythonデータタイプ変換"]))
+            for db_config in DB_CONFIGS:
+                copy_results = index.by_db[("COPYスループット", db_config["name"])]
+                if not copy_results:
+                    continue
+                write_db_heading(md_file, db_config)
+                
+                headers = ["セッションタイムゾーン", "形式", "行数", "取り込み (行/秒)", "読み出し (行/秒)",
+                           "送信バイト数", "受信バイト数"]
+                rows = [[r["session_timezone"], r["copy_format"], r["rows"],
+                         f"{r['load_rows_per_sec']:.0f}", f"{r['readback_rows_per_sec']:.0f}",
+                         r["bytes_in"], r["bytes_out"]] for r in copy_results]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+        
+        # 大規模クエリの実行計画と実行時間（実行した場合のみ）
+        if index.by_type["大規模クエリ"]:
+            md_file.write("## 大規模クエリ結果\n\n")
             
-            for session_tz in session_timezones:
-                md_file.write(f"#### セッションタイムゾーン: {session_tz}\n\n")
+            for db_config in DB_CONFIGS:
+                scale_results = index.by_db[("大規模クエリ", db_config["name"])]
+                if not scale_results:
+                    continue
+                write_db_heading(md_file, db_config)
                 
-                # この設定・セッションに関するPythonデータタイプテストの結果を抽出
-                dt_results = [r for r in test_results if r["test_type"] == "Pythonデータタイプ変換" and r["db_name"] == db_config["name"] and r["session_timezone"] == session_tz]
+                headers = ["インデックスの組", "対象", "作成 (ms)", "サイズ (KiB)"]
+                rows = [[r["index_set"], r["object_name"],
+                         "再利用" if r["reused"] else f"{r['build_ms']:.0f}",
+                         f"{r['size_bytes'] / 1024:.0f}"]
+                        for r in index.by_db[("大規模データ準備", db_config["name"])]]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
                 
-                if dt_results:
-                    headers = ["入力値の説明", "入力 datetime", "tzinfo", 
-                              "出力 timestamp", "出力 timestamptz", 
-                              "timestamptz at UTC", "timestamptz at JST"]
-                    rows = [[r["input_description"], r["input_dt"], r["input_dt_tzinfo"], 
-                           r["output_ts"], r["output_tstz"], 
-                           r["tstz_at_utc"], r["tstz_at_jst"]] for r in dt_results]
-                    md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+                headers = ["インデックスの組", "セッションタイムゾーン", "クエリ", "行数", "実行 (ms)", "計画 (ms)", "実行計画"]
+                rows = [[r["index_set"], r["session_timezone"], r["query"], r["rows"],
+                         f"{r['execution_ms']:.2f}", f"{r['planning_ms']:.2f}", r["plan_shape"]]
+                        for r in scale_results]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
         
-        # セッション関数テスト結果
-        md_file.write("## セッション関数テスト結果\n\n")
+        # パーティションプルーニングの結果（実行した場合のみ）
+        if index.by_type["パーティションプルーニング"]:
+            md_file.write("## パーティションプルーニング結果\n\n")
+            md_file.write("計画: 計画時のプルーニング後に実行計画に残ったパーティション数、"
+                          "開始時除外: 実行開始時に除外された数（Subplans Removed）、走査: 実際に走査した数。\n\n")
+            
+            for db_config in DB_CONFIGS:
+                partition_results = index.by_db[("パーティションプルーニング", db_config["name"])]
+                if not partition_results:
+                    continue
+                write_db_heading(md_file, db_config)
+                
+                headers = ["キー", "述語", "セッションタイムゾーン", "全体", "計画", "開始時除外", "走査",
+                           "プルーニング", "行数", "実行 (ms)"]
+                # キーと述語ごとにセッションタイムゾーンを並べて比較しやすくする（述語は定義の順）
+                predicate_order = {name: i for i, (name, _) in enumerate(tz_partition.PREDICATES)}
+                predicate_order[tz_partition.PREPARED_PREDICATE[0]] = len(predicate_order)
+                rows = [[r["key_column"], r["predicate"], r["session_timezone"], r["partitions"], r["planned"],
+                         r["removed_at_startup"], r["scanned"], r["pruning"], r["rows"],
+                         f"{r['execution_ms']:.2f}"]
+                        for r in sorted(partition_results,
+                                        key=lambda r: (r["key_column"], predicate_order.get(r["predicate"], 0)))]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
         
-        for db_config in DB_CONFIGS:
-            md_file.write(f"### {db_config['name']} (コンテナTZ: {db_config['container_timezone']})\n\n")
+        # 負荷テストの結果（実行した場合のみ）
+        if index.by_type["負荷テスト"]:
+            md_file.write("## 負荷テスト結果\n\n")
+            md_file.write("オフセット不一致: ts が tstz をその書き込み手のタイムゾーンで表した値と異なる行数、"
+                          "順序の逆転: 同じ書き込み手の中で挿入順に tstz が減った行数。\n\n")
             
-            # セッションタイムゾーン別の結果
-            session_timezones = sorted(set([r["session_timezone"] for r in test_results if r["db_name"] == db_config["name"] and r["test_type"] == "セッション関数"]))
+            for db_config in DB_CONFIGS:
+                load_results = index.by_db[("負荷テスト", db_config["name"])]
+                if not load_results:
+                    continue
+                write_db_heading(md_file, db_config)
+                
+                headers = ["書き込み手", "セッションタイムゾーン", "行数", "行/秒", "p50 (ms)", "p95 (ms)", "p99 (ms)",
+                           "最大 (ms)", "エラー", "オフセット不一致", "順序の逆転", "ts - UTC"]
+                rows = [[r["writer"], r["session_timezone"], r["rows"], f"{r['rows_per_sec']:.0f}",
+                         f"{r['p50_ms']:.2f}", f"{r['p95_ms']:.2f}", f"{r['p99_ms']:.2f}",
+                         f"{r['max_ms']:.2f}", r["errors"], r["offset_mismatches"], r["order_inversions"],
+                         r["offsets"]] for r in load_results]
+                rows.append(["合計", "", sum(r["rows"] for r in load_results),
+                             f"{sum(r['rows_per_sec'] for r in load_results):.0f}",
+                             "", "", "", "", sum(r["errors"] for r in load_results),
+                             sum(r["offset_mismatches"] for r in load_results),
+                             sum(r["order_inversions"] for r in load_results), ""])
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+        
+        # ファジングの結果（実行した場合のみ）
+        if index.by_type["ファジング"]:
+            md_file.write("## ファジング結果\n\n")
+            md_file.write("除外: DSTのギャップ・重複にあたるため不変条件が成り立たなくてよいケース、"
+                          "未検証: zoneinfo に無くギャップ・重複を判定できなかったケース。"
+                          "失敗の種類は不変条件とゾーンごとのまとまりの数で、下の表はまとまりごとに"
+                          "再現する範囲で最小に縮めたケース。\n\n")
             
-            for session_tz in session_timezones:
-                md_file.write(f"#### セッションタイムゾーン: {session_tz}\n\n")
+            for db_config in DB_CONFIGS:
+                fuzz_results = index.by_db[("ファジング", db_config["name"])]
+                if not fuzz_results:
+                    continue
+                write_db_heading(md_file, db_config)
                 
-                # この設定・セッションに関するセッション関数テストの結果を抽出
-                func_results = [r for r in test_results if r["test_type"] == "セッション関数" and r["db_name"] == db_config["name"] and r["session_timezone"] == session_tz]
+                headers = ["シード", "ワーカー", "検証件数", "除外", "未検証", "失敗", "失敗の種類", "所要時間 (秒)", "件/秒"]
+                rows = [[r["seed"], r["workers"], r["checked"], r["excluded"], r["unverified"], r["failures"],
+                         r["failure_classes"],
+                         f"{r['seconds']:.1f}", f"{r['cases_per_sec']:.0f}"] for r in fuzz_results]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
                 
-                if func_results:
-                    headers = ["関数", "値", "timestampへの変換結果"]
-                    rows = []
-                    for r in func_results:
-                        rows.append(["now()", r["now"], r["now_timestamp"]])
-                        rows.append(["CURRENT_TIMESTAMP", r["current_timestamp"], r["current_timestamp_timestamp"]])
+                failure_results = index.by_db[("ファジング失敗", db_config["name"])]
+                if failure_results:
+                    headers = ["不変条件", "セッションタイムゾーン", "時刻", "AT TIME ZONE", "途中の値", "元のケース"]
+                    rows = [[tz_fuzz.INVARIANT_DESCRIPTIONS.get(r["invariant"], r["invariant"]), r["session_timezone"],
+                             r["instant"], r["at_zone"], r["detail"], r["original"]] for r in failure_results]
                     md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
         
-        # now()挿入テスト結果
-        md_file.write("## now()挿入テスト結果\n\n")
-        
-        for db_config in DB_CONFIGS:
-            md_file.write(f"### {db_config['name']} (コンテナTZ: {db_config['container_timezone']})\n\n")
+        # ベンチマークの要約（実行した場合のみ）
+        if index.by_type["ベンチマーク"]:
+            md_file.write("## ベンチマーク結果\n\n")
             
-            # セッションタイムゾーン別の結果
-            session_timezones = sorted(set([r["session_timezone"] for r in test_results if r["db_name"] == db_config["name"] and r["test_type"] == "now()挿入テスト"]))
+            for db_config in DB_CONFIGS:
+                bench_results = index.by_db[("ベンチマーク", db_config["name"])]
+                if not bench_results:
+                    continue
+                write_db_heading(md_file, db_config)
+                
+                headers = ["操作", "列", "パラメータ", "中央値 (ms)", "p90 (ms)", "p99 (ms)"]
+                rows = [[r["operation"], r["column"], r["param_style"],
+                         f"{r['median_ms']:.3f}", f"{r['p90_ms']:.3f}", f"{r['p99_ms']:.3f}"]
+                        for r in bench_results]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+        
+        # 問い合わせのプロファイル（--profile 指定時のみ）
+        if index.by_type["プロファイル"]:
+            md_file.write("## プロファイル\n\n")
             
-            for session_tz in session_timezones:
-                md_file.write(f"#### セッションタイムゾーン: {session_tz}\n\n")
+            for db_config in DB_CONFIGS:
+                profile_results = index.by_db[("プロファイル", db_config["name"])]
+                if not profile_results:
+                    continue
+                write_db_heading(md_file, db_config)
                 
-                # この設定・セッションに関するnow()挿入テストの結果を抽出
-                now_results = [r for r in test_results if r["test_type"] == "now()挿入テスト" and r["db_name"] == db_config["name"] and r["session_timezone"] == session_tz]
+                headers = ["処理", "往復回数", "コミット", "ロールバック", "合計 (ms)", "平均 (ms)",
+                           "p50 (ms)", "p99 (ms)", "最大 (ms)", "コミット (ms)", "送信バイト数", "受信バイト数", "行数"]
+                rows = [[r["label"], r["round_trips"], r["commits"], r["rollbacks"],
+                         f"{r['total_ms']:.1f}", f"{r['mean_ms']:.3f}",
+                         f"{r['p50_ms']:.3f}", f"{r['p99_ms']:.3f}", f"{r['max_ms']:.3f}",
+                         f"{r['commit_ms']:.1f}", r["bytes_sent"], r["bytes_received"], r["rows"]]
+                        for r in profile_results]
+                md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+                md_file.write("p50 / p99 はマイクロ秒の2のべき乗ごとのヒストグラムのバケットの上限。"
+                              "受信バイト数は取得した値のテキスト表現の長さからの概算。\n\n")
                 
-                if now_results:
-                    headers = ["テスト内容", "取得値 (timestamp)", "取得値 (timestamptz)"]
-                    rows = [[r["input_description"], r["output_ts"], r["output_tstz"]] for r in now_results]
-                    md_file.write(tabulate(rows, headers, tablefmt="pipe") + "\n\n")
+                for r in index.by_db[("実行計画", db_config["name"])]:
+                    md_file.write(f"#### 実行計画 ({r['label']})\n\n")
+                    md_file.write(f"```sql\n{r['query']}\n```\n\n")
+                    md_file.write(f"```\n{r['plan']}\n```\n\n")
         
         # エラーがあれば記録
-        error_results = [r for r in test_results if r["test_type"] == "エラー"]
+        # 並行実行時の完了順に依存しないよう、DB_CONFIGSの順序で並べ直す（DB内の順序は維持）
+        db_order = {db_config["name"]: i for i, db_config in enumerate(DB_CONFIGS)}
+        error_results = sorted(index.by_type["エラー"],
+                               key=lambda r: db_order.get(r["db_name"], len(db_order)))
         if error_results:
             md_file.write("## エラー\n\n")
             
@@ -565,4 +1919,4 @@ def save_results():
     print(f"\nテスト結果を RESULT.md に保存しました")
 
 if __name__ == "__main__":
-    run_tests() 
\ No newline at end of file
+    sys.exit(run_tests(parse_args()))
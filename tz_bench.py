@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""timestamp / timestamptz の入出力・キャスト・AT TIME ZONE のコストを計測するベンチマーク
+
+各操作をウォームアップしてから繰り返し実行し、1回ごとの所要時間の中央値と
+パーセンタイルを求める。挿入は文字列リテラルとpsycopg2が変換するdatetime
+パラメータを、取得は ts 列と tstz 列を比較する。挿入はコミットまでを1回として計測する。
+"""
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from tz_isolation import commit_test_writes, reset_test_table
+
+# 取得系の操作で読み出すテーブルの行数
+DEFAULT_BENCH_ROWS = 10000
+
+# 挿入系の操作: (操作名, 列, パラメータの渡し方, SQL, パラメータ)
+NAIVE_DATETIME = datetime(2023, 1, 1, 12, 0, 0)
+AWARE_DATETIME = pytz.timezone("Asia/Tokyo").localize(datetime(2023, 1, 1, 12, 0, 0))
+INSERT_OPERATIONS = [
+    ("insert", "ts", "literal",
+     "INSERT INTO timezone_test (description, ts) VALUES ('bench', '2023-01-01 12:00:00')", None),
+    ("insert", "tstz", "literal",
+     "INSERT INTO timezone_test (description, tstz) VALUES ('bench', '2023-01-01 12:00:00+09')", None),
+    ("insert", "ts", "datetime",
+     "INSERT INTO timezone_test (description, ts) VALUES ('bench', %s)", (NAIVE_DATETIME,)),
+    ("insert", "tstz", "datetime",
+     "INSERT INTO timezone_test (description, tstz) VALUES ('bench', %s)", (AWARE_DATETIME,)),
+]
+
+# 取得系の操作: (操作名, SQLの式)。{col} を ts / tstz に置き換える。
+# "_server" の付く操作は count() で集約し、クライアントへの転送と型変換を除いたサーバー側のコストを見る
+SELECT_OPERATIONS = [
+    ("select", "SELECT {col} FROM timezone_test"),
+    ("cast_text", "SELECT {col}::TEXT FROM timezone_test"),
+    ("at_time_zone", "SELECT {col} AT TIME ZONE 'Asia/Tokyo' FROM timezone_test"),
+    ("cast_text_server", "SELECT count({col}::TEXT) FROM timezone_test"),
+    ("at_time_zone_server", "SELECT count({col} AT TIME ZONE 'Asia/Tokyo') FROM timezone_test"),
+]
+
+# 取得系の操作のために ts / tstz の両方に値を入れた行を作るSQL
+FILL_SQL = """
+    INSERT INTO timezone_test (description, ts, tstz)
+    SELECT 'bench', t, t
+    FROM generate_series(timestamp '2023-01-01', timestamp '2023-01-01' + (%s - 1) * interval '1 minute',
+                         interval '1 minute') AS t
+"""
+
+# 挿入系の操作でコミットした行を消すSQL
+DELETE_BENCH_ROWS_SQL = "DELETE FROM timezone_test WHERE description = 'bench'"
+
+
+def time_operation(run, warmup, repeat):
+    """操作をウォームアップしてから repeat 回実行し、1回ごとの所要時間（秒）を返す"""
+    for _ in range(warmup):
+        run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples):
+    """所要時間の配列から中央値・パーセンタイルなど（ミリ秒）を求める"""
+    values = np.asarray(samples) * 1000.0
+    return {
+        "samples": len(values),
+        "min_ms": float(values.min()),
+        "median_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def run_insert_benchmarks(conn, warmup, repeat):
+    """挿入系の操作を計測する
+
+    1回ごとにコミットし、WALのフラッシュとfsyncまでを計測に含める（savepoint モードでは
+    コミットしない）。計測でコミットした行は最後に削除する。
+    """
+    with conn.cursor() as cur:
+        try:
+            for operation, column, param_style, sql, params in INSERT_OPERATIONS:
+
+                def run():
+                    cur.execute(sql, params)
+                    commit_test_writes(conn)
+
+                samples = time_operation(run, warmup, repeat)
+                result = {"operation": operation, "column": column, "param_style": param_style}
+                result.update(summarize(samples))
+                yield result
+        finally:
+            conn.rollback()
+            cur.execute(DELETE_BENCH_ROWS_SQL)
+            conn.commit()
+
+
+def run_select_benchmarks(conn, warmup, repeat, rows=DEFAULT_BENCH_ROWS):
+    """取得系の操作を計測する（計測用の行は同じトランザクション内で作り、最後にロールバックする）"""
+    with conn.cursor() as cur:
+        reset_test_table(conn, cur)
+        # truncate モードの TRUNCATE のロックを計測するトランザクションに持ち込まないよう先に確定する
+        commit_test_writes(conn)
+        cur.execute(FILL_SQL, (rows,))
+        try:
+            for operation, template in SELECT_OPERATIONS:
+                for column in ("ts", "tstz"):
+                    sql = template.format(col=column)
+
+                    def run():
+                        cur.execute(sql)
+                        cur.fetchall()
+
+                    samples = time_operation(run, warmup, repeat)
+                    result = {"operation": operation, "column": column, "param_style": "-", "rows": rows}
+                    result.update(summarize(samples))
+                    yield result
+        finally:
+            conn.rollback()
+
+
+def run_benchmarks(conn, warmup=5, repeat=50, rows=DEFAULT_BENCH_ROWS):
+    """全ての操作を計測し、操作ごとの結果を返す"""
+    yield from run_insert_benchmarks(conn, warmup, repeat)
+    yield from run_select_benchmarks(conn, warmup, repeat, rows)
+
+
+def write_json(path, results, settings):
+    """計測結果を機械可読なJSONとして保存する"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "results": results}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""決定的なテスト結果をディスクにキャッシュし、再実行時に変わっていないケースを省略する
+
+キーは (サーバーのバージョン, コンテナのタイムゾーン, セッションタイムゾーン,
+実行するSQL, 入力値) のフィンガープリントで、いずれかが変われば別のキーになる。
+now() やセッション関数のように実行のたびに変わる結果はキャッシュしない。
+保存先は標準ライブラリの sqlite3 を使う。
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+
+DEFAULT_CACHE_PATH = ".timezone_cache.sqlite3"
+
+# キャッシュには入れず、ヒットした時に現在のDB・セッションから埋めるフィールド
+CONTEXT_FIELDS = ("db_name", "container_timezone", "session_timezone")
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS results (
+        key TEXT PRIMARY KEY,
+        record TEXT NOT NULL
+    )
+"""
+
+
+def normalize_query(query):
+    """空白の違いでキーが変わらないよう、SQLの空白を1つにまとめる"""
+    return " ".join(query.split())
+
+
+class ResultCache:
+    """テスト結果のキャッシュ（スレッドセーフ）
+
+    refresh=True の場合は既存の内容を読まず、実行した結果で上書きする。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, refresh=False):
+        self.path = path
+        self.refresh = refresh
+        self.hits = 0
+        self.stored = 0
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA_SQL)
+        self._db.commit()
+
+    def register_target(self, db_name, server_version, container_timezone):
+        """対象DBのサーバーのバージョンとコンテナのタイムゾーンを登録する"""
+        with self._lock:
+            self._targets[db_name] = (server_version, container_timezone)
+
+    def key(self, db_name, session_timezone, query, input_value):
+        """結果1件のキーを作る（input_value はJSONにできる値）"""
+        server_version, container_timezone = self._targets[db_name]
+        material = json.dumps(
+            [server_version, container_timezone, session_timezone, normalize_query(query), input_value],
+            ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """キーに対応するキャッシュ済みの結果を {キー: 記録の辞書} で返す"""
+        found = {}
+        if not self.refresh and keys:
+            with self._lock:
+                # SQLiteのパラメータ数の上限を超えないよう分けて引く
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._db.execute(
+                        f"SELECT key, record FROM results WHERE key IN ({placeholders})", chunk)
+                    for key, record in rows:
+                        found[key] = json.loads(record)
+        with self._lock:
+            self.hits += len(found)
+        return found
+
+    def put_many(self, items):
+        """(キー, 記録の辞書) の組をまとめて保存する"""
+        rows = []
+        for key, record in items:
+            data = {name: value for name, value in record.items() if name not in CONTEXT_FIELDS}
+            rows.append((key, json.dumps(data, ensure_ascii=False)))
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO results (key, record) VALUES (?, ?)", rows)
+            self._db.commit()
+            self.stored += len(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""サーバーのタイムゾーンカタログと、ゾーンごとのオフセット・DST切り替わりの索引
+
+pg_timezone_names / pg_timezone_abbrevs は呼び出すたびにtzdataのファイルを走査するため、
+対象DBごとに1回だけ取得し、ゾーン・略称・オフセット・切り替わりをまとめた索引を
+JSONファイルに保存する。次回以降はサーバーのバージョンとtzdataのバージョンが
+同じであればファイルから読み込み、カタログへの問い合わせを行わない。
+
+tzdataのバージョンは、サーバーが --with-system-tzdata でビルドされていれば
+そのディレクトリの tzdata.zi から読む。読めない場合（PostgreSQL同梱のtzdataや
+ファイルを読む権限が無い場合）は、ゾーン名と固定の時刻でのオフセットから作った
+フィンガープリントで代用する。その場合は索引ファイルを読む前にフィンガープリントを
+作り直して比べる（ゾーンの一覧とオフセットを1回問い合わせるが、略称の取得と
+pytzの切り替わりの展開は省ける）。
+
+DSTの切り替わりは組み合わせ行列と同じくpytzの遷移表から作り、固定の時刻での
+オフセットをサーバーの値と突き合わせて、食い違うゾーンを記録する。
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+import pytz
+
+# 索引ファイルの形式のバージョン（形式を変えたら上げて古いファイルを読み直させる）
+CATALOG_FORMAT = 1
+
+DEFAULT_CATALOG_DIR = ".timezone_catalog"
+
+# サーバーとpytzのオフセットを突き合わせる固定の時刻（UTC）
+PROBE_INSTANTS = [
+    "1970-01-01 00:00:00",
+    "2000-01-15 00:00:00",
+    "2000-07-15 00:00:00",
+    "2025-01-15 00:00:00",
+    "2025-07-15 00:00:00",
+    "2037-01-15 00:00:00",
+    "2037-07-15 00:00:00",
+]
+
+ZONES_SQL = """
+    SELECT
+        z.name,
+        z.abbrev,
+        extract(epoch FROM z.utc_offset)::INTEGER,
+        z.is_dst,
+        array_agg(extract(epoch FROM (p AT TIME ZONE z.name) - (p AT TIME ZONE 'UTC'))::INTEGER
+                  ORDER BY p)
+    FROM pg_timezone_names z
+    CROSS JOIN unnest(%s::TIMESTAMPTZ[]) AS p
+    GROUP BY z.name, z.abbrev, z.utc_offset, z.is_dst
+    ORDER BY z.name
+"""
+
+# フィンガープリントの再計算用（ZONES_SQL と同じゾーン名とオフセットだけを取る）
+PROBES_SQL = """
+    SELECT
+        z.name,
+        array_agg(extract(epoch FROM (p AT TIME ZONE z.name) - (p AT TIME ZONE 'UTC'))::INTEGER
+                  ORDER BY p)
+    FROM pg_timezone_names z
+    CROSS JOIN unnest(%s::TIMESTAMPTZ[]) AS p
+    GROUP BY z.name
+    ORDER BY z.name
+"""
+
+ABBREVS_SQL = """
+    SELECT abbrev, extract(epoch FROM utc_offset)::INTEGER, is_dst
+    FROM pg_timezone_abbrevs
+    ORDER BY abbrev
+"""
+
+CONFIGURE_SQL = "SELECT setting FROM pg_config WHERE name = 'CONFIGURE'"
+
+TZDATA_VERSION_PATTERN = re.compile(r"^# version (\S+)")
+
+
+def fetch_tzdata_version(conn):
+    """サーバーが使うtzdataのバージョンを (バージョン, 読んだファイル) で返す（読めなければ (None, None)）"""
+    with conn.cursor() as cur:
+        try:
+            cur.execute(CONFIGURE_SQL)
+            configure = cur.fetchone()[0] or ""
+            match = re.search(r"--with-system-tzdata=([^'\s]+)", configure)
+            if not match:
+                # PostgreSQL同梱のtzdata（tzdata.zi はインストールされない）
+                conn.rollback()
+                return None, None
+            path = os.path.join(match.group(1), "tzdata.zi")
+            cur.execute("SELECT pg_read_file(%s, 0, 64)", (path,))
+            head = cur.fetchone()[0]
+        except Exception:
+            # pg_config / pg_read_file の権限が無い場合など
+            conn.rollback()
+            return None, None
+    conn.rollback()
+    match = TZDATA_VERSION_PATTERN.match(head)
+    return (match.group(1), path) if match else (None, None)
+
+
+def iter_pytz_transitions(zone_name):
+    """pytzの遷移表から (UTCエポック秒, 切替前オフセット秒, 切替後オフセット秒) を返す"""
+    try:
+        tz = pytz.timezone(zone_name)
+    except pytz.UnknownTimeZoneError:
+        return
+    transition_times = getattr(tz, "_utc_transition_times", None)
+    transition_info = getattr(tz, "_transition_info", None)
+    if not transition_times or not transition_info:
+        return
+    for i in range(1, len(transition_times)):
+        before = int(transition_info[i - 1][0].total_seconds())
+        after = int(transition_info[i][0].total_seconds())
+        if before != after:
+            epoch = int((transition_times[i] - datetime(1970, 1, 1)).total_seconds())
+            yield epoch, before, after
+
+
+def pytz_offset(zone_name, instant):
+    """pytzでのある時刻（UTC）のオフセット秒を返す（pytzが知らないゾーンは None）"""
+    try:
+        tz = pytz.timezone(zone_name)
+    except pytz.UnknownTimeZoneError:
+        return None
+    return int(pytz.UTC.localize(instant).astimezone(tz).utcoffset().total_seconds())
+
+
+class TimezoneCatalog:
+    """タイムゾーンカタログの索引"""
+
+    def __init__(self, data):
+        self.data = data
+        self.zones = data["zones"]
+        self.abbrevs = data["abbrevs"]
+        self.zone_names = sorted(self.zones)
+
+    @property
+    def server_version(self):
+        return self.data["server_version"]
+
+    @property
+    def tzdata_version(self):
+        """tzdataのバージョン（読めなかった場合はフィンガープリント）"""
+        return self.data["tzdata_version"] or f"fingerprint:{self.data['fingerprint'][:12]}"
+
+    @property
+    def probe_mismatches(self):
+        """固定の時刻でのオフセットがサーバーとpytzで食い違うゾーン"""
+        return self.data["probe_mismatches"]
+
+    def has_zone(self, name):
+        return name in self.zones
+
+    def zone_info(self, name):
+        """ゾーンの (略称, 現在のオフセット秒, DST中か) を返す（無いゾーンは None）"""
+        info = self.zones.get(name)
+        return None if info is None else tuple(info[:3])
+
+    def transitions(self, zone_name, start_year, end_year):
+        """ゾーンの切り替わりを (UTC時刻, 切替前オフセット, 切替後オフセット) で返す（tz_matrix と同じ形）"""
+        epoch = datetime(1970, 1, 1)
+        for utc_epoch, before, after in self.data["transitions"].get(zone_name, ()):
+            utc_time = epoch + timedelta(seconds=utc_epoch)
+            if utc_time.year < start_year:
+                continue
+            if utc_time.year > end_year:
+                break
+            yield utc_time, timedelta(seconds=before), timedelta(seconds=after)
+
+    def to_json(self):
+        return json.dumps(self.data, ensure_ascii=False, separators=(",", ":"))
+
+
+def probe_parameters():
+    """固定の時刻を ZONES_SQL・PROBES_SQL のパラメータにする"""
+    return ([f"{instant}+00" for instant in PROBE_INSTANTS],)
+
+
+def zone_fingerprint(zone_probes):
+    """(ゾーン名, 固定の時刻でのオフセット) の並びからフィンガープリントを作る"""
+    fingerprint = hashlib.sha256()
+    for name, probes in zone_probes:
+        fingerprint.update(f"{name}:{','.join(map(str, probes))}\n".encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def fetch_fingerprint(conn):
+    """サーバーのゾーンから、索引と同じ方法でフィンガープリントを作り直す"""
+    with conn.cursor() as cur:
+        cur.execute(PROBES_SQL, probe_parameters())
+        rows = cur.fetchall()
+    conn.rollback()
+    return zone_fingerprint(rows)
+
+
+def build_catalog(conn, tzdata_version=None, tzdata_path=None):
+    """サーバーのカタログを1回ずつ取得して索引を作る"""
+    with conn.cursor() as cur:
+        cur.execute(ZONES_SQL, probe_parameters())
+        zone_rows = cur.fetchall()
+        cur.execute(ABBREVS_SQL)
+        abbrev_rows = cur.fetchall()
+    conn.rollback()
+
+    zones = {}
+    transitions = {}
+    probe_mismatches = []
+    probe_times = [datetime.strptime(instant, "%Y-%m-%d %H:%M:%S") for instant in PROBE_INSTANTS]
+    for name, abbrev, utc_offset, is_dst, probes in zone_rows:
+        zones[name] = [abbrev, utc_offset, is_dst, probes]
+        zone_transitions = [list(t) for t in iter_pytz_transitions(name)]
+        if zone_transitions:
+            transitions[name] = zone_transitions
+        expected = [pytz_offset(name, instant) for instant in probe_times]
+        if expected[0] is not None and expected != probes:
+            probe_mismatches.append(name)
+
+    return TimezoneCatalog({
+        "format": CATALOG_FORMAT,
+        "server_version": conn.server_version,
+        "tzdata_version": tzdata_version,
+        "tzdata_path": tzdata_path,
+        "fingerprint": zone_fingerprint((name, probes) for name, _, _, _, probes in zone_rows),
+        "transitions_source": f"pytz {pytz.OLSON_VERSION}",
+        "zones": zones,
+        "abbrevs": {abbrev: [utc_offset, is_dst] for abbrev, utc_offset, is_dst in abbrev_rows},
+        "transitions": transitions,
+        "probe_mismatches": probe_mismatches,
+    })
+
+
+def catalog_path(directory, db_config):
+    """対象DBの索引ファイルのパス"""
+    return os.path.join(directory, f"{db_config['host']}_{db_config['port']}.json")
+
+
+def load_catalog(conn, db_config, directory=DEFAULT_CATALOG_DIR, refresh=False):
+    """対象DBの索引を返す（有効な索引ファイルが無ければカタログを取得して保存する）
+
+    (索引, ファイルから読んだか) を返す。
+    """
+    path = catalog_path(directory, db_config)
+    tzdata_version, tzdata_path = fetch_tzdata_version(conn)
+    if not refresh and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if (data.get("format") == CATALOG_FORMAT
+                and data.get("server_version") == conn.server_version
+                and data.get("tzdata_version") == tzdata_version
+                and data.get("transitions_source") == f"pytz {pytz.OLSON_VERSION}"
+                # tzdataのバージョンが読めない場合は、フィンガープリントを作り直して確かめる
+                and (tzdata_version is not None or data.get("fingerprint") == fetch_fingerprint(conn))):
+            return TimezoneCatalog(data), True
+
+    catalog = build_catalog(conn, tzdata_version, tzdata_path)
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(catalog.to_json())
+    return catalog, False
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""COPY FROM STDIN / COPY TO STDOUT による timezone_test への一括取り込みと読み出し
+
+行ごとのタプルやINSERT文を作らず、NumPyで組み立てたバッファをチャンク単位で
+サーバーへ流し込む。テキスト形式では timestamp / timestamptz の文字列をサーバー側で
+解析する（timestamptz はセッションタイムゾーンで解釈される）。バイナリ形式では
+2000-01-01 からのマイクロ秒をそのまま送るため、文字列の解析が発生しない。
+"""
+import struct
+import time
+
+import numpy as np
+
+import tz_oracle
+from tz_isolation import commit_test_writes, discard_test_writes, reset_test_table
+
+# Unixエポック（1970-01-01）とPostgreSQLのエポック（2000-01-01）の差（マイクロ秒）
+PG_EPOCH_OFFSET_US = 946684800 * tz_oracle.US_PER_SECOND
+
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+BINARY_TRAILER = struct.pack(">h", -1)
+
+# 取り込む行の description
+COPY_DESCRIPTION = b"copy"
+
+# バイナリ形式の1行（description, ts, tstz の3列）のレイアウト
+BINARY_ROW = np.dtype([
+    ("field_count", ">i2"),
+    ("description_length", ">i4"),
+    ("description", f"S{len(COPY_DESCRIPTION)}"),
+    ("ts_length", ">i4"),
+    ("ts", ">i8"),
+    ("tstz_length", ">i4"),
+    ("tstz", ">i8"),
+])
+
+COPY_IN_SQL = {
+    "text": "COPY timezone_test (description, ts, tstz) FROM STDIN",
+    "binary": "COPY timezone_test (description, ts, tstz) FROM STDIN (FORMAT binary)",
+}
+
+COPY_OUT_SQL = {
+    "text": """
+        COPY (
+            SELECT
+                description,
+                ts::TEXT,
+                tstz::TEXT,
+                tstz AT TIME ZONE 'UTC',
+                tstz AT TIME ZONE 'Asia/Tokyo'
+            FROM timezone_test
+            ORDER BY id
+        ) TO STDOUT
+    """,
+    "binary": """
+        COPY (
+            SELECT
+                description,
+                ts,
+                tstz,
+                tstz AT TIME ZONE 'UTC',
+                tstz AT TIME ZONE 'Asia/Tokyo'
+            FROM timezone_test
+            ORDER BY id
+        ) TO STDOUT (FORMAT binary)
+    """,
+}
+
+COPY_FORMATS = ("text", "binary")
+
+# copy_expert が1回に読み書きするバッファの大きさ
+COPY_BUFFER_SIZE = 1 << 16
+
+
+class ChunkReader:
+    """bytes のチャンクを返すイテレータを、copy_expert が読めるファイル風のオブジェクトにする"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size < 0 or len(self._buffer) <= size:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.bytes_read += len(data)
+        return data
+
+
+class CountingWriter:
+    """COPY TO STDOUT の出力を保持せず、バイト数だけを数える"""
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.sink is not None:
+            self.sink.write(data)
+        return len(data)
+
+
+def synthetic_instants(count, start="2023-01-01T00:00:00", step_us=1000003):
+    """取り込み用の時刻（エポックからのマイクロ秒）を等間隔に生成する"""
+    first = np.datetime64(start, "us").astype(np.int64)
+    return first + np.arange(count, dtype=np.int64) * step_us
+
+
+def iter_text_chunks(instants, chunk_rows=10000):
+    """時刻の配列から、COPYのテキスト形式のチャンクを作る
+
+    ts と tstz には同じタイムゾーンなしの文字列を送るので、tstz はセッションタイムゾーンで解釈される。
+    """
+    prefix = COPY_DESCRIPTION.decode("ascii") + "\t"
+    for start in range(0, len(instants), chunk_rows):
+        text = tz_oracle.format_timestamp(instants[start:start + chunk_rows])
+        lines = np.char.add(np.char.add(np.char.add(prefix, text), "\t"), text)
+        yield ("\n".join(lines.tolist()) + "\n").encode("ascii")
+
+
+def iter_binary_chunks(instants, chunk_rows=10000):
+    """時刻の配列から、COPYのバイナリ形式のチャンクを作る
+
+    ts には時刻の数値をそのまま壁時計の時刻として、tstz にはUTCの時刻として送る。
+    """
+    yield BINARY_HEADER
+    for start in range(0, len(instants), chunk_rows):
+        chunk = instants[start:start + chunk_rows] - PG_EPOCH_OFFSET_US
+        rows = np.empty(len(chunk), dtype=BINARY_ROW)
+        rows["field_count"] = 3
+        rows["description_length"] = len(COPY_DESCRIPTION)
+        rows["description"] = COPY_DESCRIPTION
+        rows["ts_length"] = 8
+        rows["ts"] = chunk
+        rows["tstz_length"] = 8
+        rows["tstz"] = chunk
+        yield rows.tobytes()
+    yield BINARY_TRAILER
+
+
+def copy_in(cur, instants, copy_format="text", chunk_rows=10000):
+    """時刻の配列を COPY FROM STDIN で timezone_test に取り込み、(秒, 送信バイト数) を返す"""
+    if copy_format == "binary":
+        chunks = iter_binary_chunks(instants, chunk_rows)
+    else:
+        chunks = iter_text_chunks(instants, chunk_rows)
+    reader = ChunkReader(chunks)
+    started = time.perf_counter()
+    cur.copy_expert(COPY_IN_SQL[copy_format], reader, size=COPY_BUFFER_SIZE)
+    return time.perf_counter() - started, reader.bytes_read
+
+
+def copy_out(cur, copy_format="text", sink=None):
+    """timezone_test の各種の表現を COPY TO STDOUT で読み出し、(秒, 受信バイト数) を返す"""
+    writer = CountingWriter(sink)
+    started = time.perf_counter()
+    cur.copy_expert(COPY_OUT_SQL[copy_format], writer, size=COPY_BUFFER_SIZE)
+    return time.perf_counter() - started, writer.bytes_written
+
+
+def run_copy_roundtrip(conn, instants, copy_format="text", chunk_rows=10000):
+    """timezone_test を空にしてから取り込み・コミット・読み出しを行い、計測結果を返す"""
+    with conn.cursor() as cur:
+        reset_test_table(conn, cur)
+        commit_test_writes(conn)
+
+        load_seconds, bytes_in = copy_in(cur, instants, copy_format, chunk_rows)
+        started = time.perf_counter()
+        commit_test_writes(conn)
+        load_seconds += time.perf_counter() - started
+
+        readback_seconds, bytes_out = copy_out(cur, copy_format)
+
+        # 大量の行を共有テーブルに残さない
+        reset_test_table(conn, cur)
+        commit_test_writes(conn)
+        discard_test_writes(conn)
+
+    rows = len(instants)
+    return {
+        "copy_format": copy_format,
+        "rows": rows,
+        "load_seconds": load_seconds,
+        "load_rows_per_sec": rows / load_seconds if load_seconds > 0 else 0.0,
+        "readback_seconds": readback_seconds,
+        "readback_rows_per_sec": rows / readback_seconds if readback_seconds > 0 else 0.0,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+    }
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""テスト結果をハッシュ付きの並べ替えた成果物に書き出し、2回の実行の差分を取る
+
+PostgreSQL のバージョンやコンテナのタイムゾーンを変えた前後で、どの挙動が変わったかを
+調べるためのモジュール。結果を (DB, テスト種別, セッションタイムゾーン) のグループに分け、
+グループの中は行のキーで並べ替えて1行ずつ JSON で書き出す。ファイルの先頭行は
+マニフェストで、グループごとの行数・ハッシュ・本体の中の位置（バイト単位）を持つ。
+
+差分はまずマニフェストだけを読んでグループのハッシュを比べ、一致したグループは
+本体を読まずに飛ばす（グループ数に比例する時間で済む）。ハッシュが異なるグループだけ
+本体の該当範囲をシークして読み、変わったセル・増えた行・減った行だけを返す。
+
+比べるのは実行のたびに変わらない値だけで、時刻の計測値・現在時刻・スループットなどは
+成果物に含めない（COMPARED_FIELDS に無いテスト種別は書き出さない）。値は全て文字列に
+（空文字列は None に）正規化するため、メモリ上の結果からでも --results-file のCSV・NDJSONからでも同じ
+成果物になる。
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import defaultdict
+
+ARTIFACT_FORMAT = 1
+
+DEFAULT_ARTIFACT_PATH = "RESULT.artifact"
+
+# テスト種別ごとの (行のキーにするフィールド, 比べる値のフィールド)
+COMPARED_FIELDS = {
+    "環境設定": (("parameter",), ("value",)),
+    "タイムゾーンカタログ": ((), ("server_version", "tzdata_version", "zone_count", "abbrev_count",
+                                 "transition_zone_count", "probe_mismatches")),
+    "タイムスタンプ変換": (("input_description", "input_ts", "input_tstz"),
+                           ("output_ts", "output_tstz", "tstz_at_utc", "tstz_at_jst")),
+    "Pythonデータタイプ変換": (("input_description", "input_dt", "input_dt_tzinfo"),
+                              ("output_ts", "output_tstz", "tstz_at_utc", "tstz_at_jst")),
+    "エラー": (("input_description", "input_ts", "input_tstz"), ("error",)),
+    "オラクル検証": (("read_mode",), ("checked_count", "mismatch_count")),
+    "オラクル差分": (("input_instant", "column"), ("expected", "actual")),
+    "大規模クエリ": (("index_set", "query"), ("plan_shape", "indexes", "rows")),
+    # now() を使う述語は行数が実行日で変わるため、パーティションの数だけを比べる
+    "パーティションプルーニング": (("key_column", "predicate"),
+                                 ("partitions", "planned", "removed_at_startup", "scanned", "pruning")),
+    "負荷テスト": (("writer",), ("writer_timezone", "offset_mismatches", "order_inversions", "offsets")),
+    "ファジング失敗": (("invariant", "at_zone"), ("instant", "detail")),
+}
+
+# 値が現在時刻になるため比べない行（テスト種別ごとの行のキー）
+SKIPPED_KEYS = {
+    "環境設定": {("now()",), ("CURRENT_TIMESTAMP",), ("CURRENT_TIMESTAMP::timestamp",),
+                 ("CURRENT_TIMESTAMP::timestamptz",)},
+}
+
+
+def normalize(value):
+    """値を比べられる形（文字列か None）にする
+
+    CSVの結果ファイルでは空文字列と None の区別が無くなるため、空文字列も None にする。
+    """
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def sort_key(values):
+    # None を含むキーも並べられるようにする
+    return tuple((value is not None, "" if value is None else value) for value in values)
+
+
+def collect_groups(records):
+    """結果（tz_store のレコード）をグループごとの [(行のキーのJSON, 値のJSON), ...] にまとめる"""
+    groups = defaultdict(list)
+    for record in records:
+        fields = COMPARED_FIELDS.get(record.test_type)
+        if fields is None:
+            continue
+        # レコードのフィールドは属性なので、get() を通さずに直接読む
+        key_fields, value_fields = fields
+        key = [normalize(getattr(record, name)) for name in key_fields]
+        if tuple(key) in SKIPPED_KEYS.get(record.test_type, ()):
+            continue
+        group = (record.db_name, record.test_type, normalize(record.session_timezone))
+        values = [normalize(getattr(record, name)) for name in value_fields]
+        groups[group].append((dumps(key), dumps(values)))
+    return groups
+
+
+def dumps(values):
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+
+
+def group_lines(rows):
+    """グループの行を並べ替え、1行ずつのバイト列を返す
+
+    行はキーと値のJSONの文字列のまま並べる（順序はどちらの成果物でも同じになればよい）。
+    同じキーの行が複数ある場合は、値で並べた順の番号をキーの末尾に付けて区別する。
+    """
+    rows.sort()
+    lines = []
+    previous, occurrence = None, 0
+    for key, values in rows:
+        occurrence = occurrence + 1 if key == previous else 0
+        previous = key
+        separator = "," if key != "[]" else ""
+        lines.append(f"[{key[:-1]}{separator}{occurrence}],{values}]\n".encode("utf-8"))
+    return lines
+
+
+def write_artifact(records, path):
+    """結果を成果物に書き出し、マニフェストを返す
+
+    本体を一時ファイルに書きながらグループの位置とハッシュを求め、最後に先頭行の
+    マニフェストと本体をつなげて path に置き換える。
+    """
+    groups = collect_groups(records)
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "fields": {test_type: {"key": list(key_fields), "values": list(value_fields)}
+                   for test_type, (key_fields, value_fields) in COMPARED_FIELDS.items()},
+        "groups": [],
+    }
+    fingerprint = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryFile(dir=directory) as body:
+        offset = 0
+        for group in sorted(groups, key=sort_key):
+            digest = hashlib.sha256()
+            length = 0
+            lines = group_lines(groups[group])
+            for line in lines:
+                digest.update(line)
+                body.write(line)
+                length += len(line)
+            manifest["groups"].append({"group": list(group), "hash": digest.hexdigest(),
+                                       "offset": offset, "length": length, "rows": len(lines)})
+            fingerprint.update(json.dumps(list(group), ensure_ascii=False).encode("utf-8"))
+            fingerprint.update(digest.digest())
+            offset += length
+        manifest["fingerprint"] = fingerprint.hexdigest()
+
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(json.dumps(manifest, ensure_ascii=False).encode("utf-8") + b"\n")
+            body.seek(0)
+            while True:
+                chunk = body.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(chunk)
+        os.replace(temporary, path)
+    return manifest
+
+
+def check_round_trip(records, directory=None):
+    """結果をCSVとNDJSONに書き出して読み直し、メモリ上の結果と同じ成果物になるかを確かめる
+
+    フィンガープリントが全て一致すれば (メモリ, CSV, NDJSON) のフィンガープリントを返し、
+    一致しなければ ValueError を送出する。
+    """
+    from tz_store import ResultStore, load_records
+
+    records = list(records)
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        fingerprints = {"メモリ": write_artifact(records, os.path.join(workdir, "memory.artifact"))["fingerprint"]}
+        for label, name in (("CSV", "results.csv"), ("NDJSON", "results.ndjson")):
+            path = os.path.join(workdir, name)
+            store = ResultStore()
+            store.open_stream(path, keep_in_memory=False)
+            for record in records:
+                store.append(record)
+            store.close()
+            artifact_path = os.path.join(workdir, f"{name}.artifact")
+            fingerprints[label] = write_artifact(load_records(path), artifact_path)["fingerprint"]
+    if len(set(fingerprints.values())) != 1:
+        details = ", ".join(f"{label}: {fingerprint[:16]}" for label, fingerprint in fingerprints.items())
+        raise ValueError(f"結果ファイルを経由すると成果物が変わります（{details}）")
+    return fingerprints
+
+
+class Artifact:
+    """成果物のマニフェストを読み、グループの本体を必要になった時だけ読む"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        first_line = self._file.readline()
+        self.manifest = json.loads(first_line)
+        if self.manifest.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"成果物の形式が違います: {path} (format={self.manifest.get('format')})")
+        self.body_start = len(first_line)
+        self.groups = {tuple(entry["group"]): entry for entry in self.manifest["groups"]}
+
+    @property
+    def fingerprint(self):
+        return self.manifest["fingerprint"]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def value_fields(self, test_type):
+        return self.manifest["fields"].get(test_type, {}).get("values", [])
+
+    def read_group(self, group):
+        """グループの行を {行のキー: {フィールド: 値}} で返す"""
+        entry = self.groups.get(group)
+        if entry is None:
+            return {}
+        self._file.seek(self.body_start + entry["offset"])
+        data = self._file.read(entry["length"])
+        names = self.value_fields(group[1])
+        rows = {}
+        for line in data.splitlines():
+            key, values = json.loads(line)
+            rows[tuple(key)] = dict(zip(names, values))
+        return rows
+
+
+def diff_artifacts(old_path, new_path):
+    """2つの成果物の差分を、グループごとに (グループ, 変更のリスト) で順に返す
+
+    変更は ("changed", 行のキー, フィールド, 旧, 新)・("added", 行のキー, 値)・
+    ("removed", 行のキー, 値) のタプル。ハッシュが一致するグループは読まない。
+    """
+    with Artifact(old_path) as old, Artifact(new_path) as new:
+        if old.fingerprint == new.fingerprint:
+            return
+        for group in sorted(set(old.groups) | set(new.groups), key=sort_key):
+            old_entry, new_entry = old.groups.get(group), new.groups.get(group)
+            if old_entry and new_entry and old_entry["hash"] == new_entry["hash"]:
+                continue
+            old_rows, new_rows = old.read_group(group), new.read_group(group)
+            changes = []
+            for key in sorted(set(old_rows) | set(new_rows), key=sort_key):
+                if key not in new_rows:
+                    changes.append(("removed", key, old_rows[key]))
+                elif key not in old_rows:
+                    changes.append(("added", key, new_rows[key]))
+                else:
+                    before, after = old_rows[key], new_rows[key]
+                    for name in list(before) + [name for name in after if name not in before]:
+                        if before.get(name) != after.get(name):
+                            changes.append(("changed", key, name, before.get(name), after.get(name)))
+            yield group, changes
+
+
+def format_key(key):
+    """行のキーを表示用の文字列にする（重複の番号は2件目以降だけ表示する）"""
+    *values, occurrence = key
+    text = " / ".join("" if value is None else value for value in values) or "-"
+    return f"{text} #{occurrence + 1}" if occurrence else text
+
+
+def format_values(values):
+    return ", ".join(f"{name}={value}" for name, value in values.items())
+
+
+def print_diff(old_path, new_path):
+    """2つの成果物の差分を表示し、差分があれば1、無ければ0を返す"""
+    changed_groups = changed_cells = added_rows = removed_rows = 0
+    for (db_name, test_type, session_timezone), changes in diff_artifacts(old_path, new_path):
+        changed_groups += 1
+        print(f"\n## {db_name} / {test_type} / {session_timezone}")
+        for change in changes:
+            kind, key = change[0], format_key(change[1])
+            if kind == "changed":
+                changed_cells += 1
+                print(f"  ~ {key}: {change[2]}: {change[3]} → {change[4]}")
+            elif kind == "added":
+                added_rows += 1
+                print(f"  + {key}: {format_values(change[2])}")
+            else:
+                removed_rows += 1
+                print(f"  - {key}: {format_values(change[2])}")
+    if not changed_groups:
+        print("差分はありません")
+        return 0
+    print(f"\n変わったグループ {changed_groups} 件, 変わったセル {changed_cells} 件, "
+          f"増えた行 {added_rows} 件, 減った行 {removed_rows} 件")
+    return 1
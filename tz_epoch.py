@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""オラクル差分検証の結果を、文字列ではなくマイクロ秒の整数としてまとめて読み出す
+
+テキストの経路（tz_oracle.fetch_server_results）は、値ごとに文字列のPythonオブジェクトを
+作って予測の文字列と比較する。こちらの経路は同じ入力から各列を timestamp / timestamptz /
+integer のまま `COPY (...) TO STDOUT (FORMAT binary)` で受け取り、固定長の行として
+np.frombuffer で int64 の配列にする。値ごとのPythonオブジェクトも文字列の整形も作らず、
+オラクルの遷移表から求めた整数の予測と配列のまま比較する。
+
+バイナリ形式の timestamp / timestamptz は 2000-01-01 からのマイクロ秒で、timestamptz は
+UTCの時刻になる。セッションタイムゾーンに依存する表現は、サーバー側で
+`tstz::TIMESTAMP`（壁時計の時刻）と `extract(timezone FROM tstz)`（オフセット秒）に
+変換してから受け取る。文字列の書式そのものは検証しないため、書式まで確かめる場合は
+テキストの経路を使う。
+"""
+import io
+
+import numpy as np
+
+import tz_oracle
+from tz_copy import BINARY_HEADER, COPY_BUFFER_SIZE, PG_EPOCH_OFFSET_US
+
+# バイナリで受け取る列: (名前, SQLの式, 型の大きさ)。AT TIME ZONE の列は後ろに追加する
+BASE_COLUMNS = [
+    ("ts", "ts", 8),
+    ("tstz_local", "tstz::TIMESTAMP", 8),
+    ("tstz_offset", "extract(timezone FROM tstz)::INTEGER", 4),
+    ("ts_as_tstz", "ts::TIMESTAMPTZ", 8),
+]
+
+# 時刻ではなくオフセット秒の列（Unix エポックへの補正をしない）
+OFFSET_COLUMNS = ("tstz_offset",)
+
+BINARY_SQL = """
+    COPY (
+        WITH input AS (
+            SELECT
+                t.ord,
+                'epoch'::timestamp + t.u * interval '1 microsecond' AS ts,
+                'epoch'::timestamptz + t.u * interval '1 microsecond' AS tstz
+            FROM unnest({instants}::BIGINT[]) WITH ORDINALITY AS t(u, ord)
+        )
+        SELECT {columns}
+        FROM input
+        ORDER BY ord
+    ) TO STDOUT (FORMAT binary)
+"""
+
+
+def column_specs(at_timezones):
+    """受け取る列の (名前, SQLの式, 型の大きさ) のリストを返す"""
+    return BASE_COLUMNS + [(f"at:{zone}", None, 8) for zone in at_timezones]
+
+
+def row_dtype(specs):
+    """バイナリ形式の1行のレイアウト（NULLを含まない固定長の行）"""
+    fields = [("field_count", ">i2")]
+    for i, (_, _, size) in enumerate(specs):
+        fields.append((f"length{i}", ">i4"))
+        fields.append((f"value{i}", ">i8" if size == 8 else ">i4"))
+    return np.dtype(fields)
+
+
+def build_sql(cur, instants, at_timezones):
+    """入力の時刻と AT TIME ZONE のゾーンを埋め込んだ COPY 文を作る（COPY はパラメータを取れない）"""
+    expressions = [expression for _, expression, _ in BASE_COLUMNS]
+    expressions += [cur.mogrify("tstz AT TIME ZONE %s", (zone,)).decode("utf-8") for zone in at_timezones]
+    instants_literal = cur.mogrify("%s", (tz_oracle.format_array_literal(instants),)).decode("ascii")
+    return BINARY_SQL.format(instants=instants_literal, columns=",\n               ".join(expressions))
+
+
+def parse_binary(data, specs):
+    """COPY のバイナリ出力を、列の名前から int64 の配列を引く辞書にする"""
+    if not data.startswith(BINARY_HEADER):
+        raise ValueError("COPY のバイナリ形式のヘッダーではありません")
+    dtype = row_dtype(specs)
+    body = data[len(BINARY_HEADER):-2]
+    if len(body) % dtype.itemsize:
+        # NULLや可変長の値があると行が固定長にならない
+        raise ValueError("COPY のバイナリ出力の行が固定長ではありません（NULLを含む可能性があります）")
+    rows = np.frombuffer(body, dtype=dtype)
+    for i, (_, _, size) in enumerate(specs):
+        if np.any(rows[f"length{i}"] != size):
+            raise ValueError("COPY のバイナリ出力にNULLまたは想定外の長さの値があります")
+    columns = {}
+    for i, (name, _, _) in enumerate(specs):
+        values = rows[f"value{i}"].astype(np.int64)
+        columns[name] = values if name in OFFSET_COLUMNS else values + PG_EPOCH_OFFSET_US
+    return columns
+
+
+def fetch_server_values(cur, instants, at_timezones):
+    """時刻をまとめてサーバーへ送り、各列を int64 の配列で返す"""
+    specs = column_specs(at_timezones)
+    buffer = io.BytesIO()
+    cur.copy_expert(build_sql(cur, instants, at_timezones), buffer, size=COPY_BUFFER_SIZE)
+    return parse_binary(buffer.getvalue(), specs)
+
+
+def predict_values(instants, session_timezone, at_timezones):
+    """fetch_server_values の各列の値を、オラクルの遷移表から整数のまま予測する"""
+    session = tz_oracle.get_table(session_timezone)
+    local, offsets = session.utc_to_local(instants)
+    predicted = {
+        "ts": instants,
+        "tstz_local": local,
+        "tstz_offset": offsets,
+        "ts_as_tstz": session.local_to_utc(instants),
+    }
+    for zone in at_timezones:
+        predicted[f"at:{zone}"], _ = tz_oracle.get_table(zone).utc_to_local(instants)
+    return predicted
+
+
+def format_value(column, value):
+    """不一致の表示用に、列の値を文字列にする"""
+    if column in OFFSET_COLUMNS:
+        return tz_oracle.format_offset(value)
+    return str(tz_oracle.format_timestamp(np.array([value]))[0])
+
+
+def compare_values(instants, predicted, actual):
+    """予測とサーバーの値を列ごとに比較し、不一致だけを辞書のリストで返す（tz_oracle.compare と同じ形）"""
+    mismatches = []
+    for column, expected in predicted.items():
+        got = actual[column]
+        for i in np.flatnonzero(got != expected):
+            mismatches.append({
+                "instant_us": int(instants[i]),
+                "column": column,
+                "expected": format_value(column, expected[i]),
+                "actual": format_value(column, got[i]),
+            })
+    return mismatches
+
+
+def run_differential_check(cur, session_timezone, instants, at_timezones=("UTC", "Asia/Tokyo"),
+                           chunk_size=tz_oracle.DEFAULT_CHUNK_SIZE):
+    """tz_oracle.run_differential_check と同じ検証を、整数の配列で行う
+
+    戻り値は (検証した件数, 不一致のリスト)。
+    """
+    instants = np.asarray(instants, dtype=np.int64)
+    mismatches = []
+    for start in range(0, len(instants), chunk_size):
+        chunk = instants[start:start + chunk_size]
+        predicted = predict_values(chunk, session_timezone, at_timezones)
+        actual = fetch_server_values(cur, chunk, at_timezones)
+        mismatches.extend(compare_values(chunk, predicted, actual))
+    return len(instants), mismatches
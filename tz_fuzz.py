@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""乱数で生成した時刻・ゾーン・オフセットで、タイムスタンプの往復の不変条件を調べるファジング
+
+シードから作った乱数で (時刻, AT TIME ZONE のゾーンまたはオフセット) を生成し、
+プロセスプールのワーカー（シャード）に分けて実行する。各ワーカーは対象DBへの
+専用のコネクションを持ち、チャンクごとにセッションタイムゾーンを乱数で選んで
+次の不変条件をまとめて1回の問い合わせで確かめる。
+
+- tstz::TEXT を timestamptz に戻すと元の値になる
+- ts::TEXT を timestamp に戻すと元の値になる
+- ts を AT TIME ZONE で2回変換すると元の値になる（ts がそのゾーンのDSTギャップにある場合を除く）
+- tstz を AT TIME ZONE で2回変換すると元の値になる（壁時計の時刻がDSTの重複にある場合を除く）
+- tstz::TIMESTAMP は tstz AT TIME ZONE <セッションタイムゾーン> と等しい
+
+ギャップ・重複の判定は tz_oracle の遷移表で行う（zoneinfo に無いゾーンはその不変条件を
+検証せずに数える）。不変条件を満たさないケースは、セッションタイムゾーンを UTC に、
+時刻を秒・分・時・日の単位に切り捨てて、失敗が再現する範囲で最小のケースに縮める。
+失敗は不変条件とゾーン（AT TIME ZONE の不変条件はそのゾーン、それ以外はセッション
+タイムゾーン）ごとにまとめ、まとまりごとに最初の1件だけを縮めて報告する。
+
+ワーカーはシャードの番号とシードから独立に乱数を作るため、同じシードとワーカー数なら
+同じケースを生成し、ワーカーの数に比例して検証できる件数が増える。
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import psycopg2
+
+import tz_oracle
+
+# 1回の問い合わせで検証するケースの数（チャンクごとにセッションタイムゾーンを選び直す）
+DEFAULT_CHUNK_SIZE = 5000
+
+# 時刻を生成する範囲（大部分は1900〜2100年、一部は西暦1〜9999年の全体から選ぶ）
+COMMON_YEARS = (1900, 2100)
+WIDE_YEARS = (1, 9999)
+WIDE_RATIO = 0.1
+
+# シャードの結果に残すチャンクのエラーの数（件数はすべて数える）
+MAX_CHUNK_ERRORS = 10
+
+# AT TIME ZONE にゾーン名の代わりにオフセットの文字列を渡す割合
+OFFSET_RATIO = 0.2
+
+# 不変条件: (名前, 説明, 成り立つ場合に真になる式, 失敗時に表示する式)
+INVARIANTS = [
+    ("tstz_text", "tstz::TEXT を timestamptz に戻すと元の値",
+     "(tstz::TEXT)::TIMESTAMPTZ = tstz",
+     ["tstz::TEXT", "(tstz::TEXT)::TIMESTAMPTZ::TEXT"]),
+    ("ts_text", "ts::TEXT を timestamp に戻すと元の値",
+     "(ts::TEXT)::TIMESTAMP = ts",
+     ["ts::TEXT", "(ts::TEXT)::TIMESTAMP::TEXT"]),
+    ("ts_at_time_zone", "ts を AT TIME ZONE で2回変換すると元の値（DSTギャップを除く）",
+     "(ts AT TIME ZONE zone) AT TIME ZONE zone = ts",
+     ["ts::TEXT", "(ts AT TIME ZONE zone)::TEXT", "((ts AT TIME ZONE zone) AT TIME ZONE zone)::TEXT"]),
+    ("tstz_at_time_zone", "tstz を AT TIME ZONE で2回変換すると元の値（DSTの重複を除く）",
+     "(tstz AT TIME ZONE zone) AT TIME ZONE zone = tstz",
+     ["tstz::TEXT", "(tstz AT TIME ZONE zone)::TEXT", "((tstz AT TIME ZONE zone) AT TIME ZONE zone)::TEXT"]),
+    ("session_cast", "tstz::TIMESTAMP と tstz AT TIME ZONE <セッションタイムゾーン> が等しい",
+     "tstz::TIMESTAMP = tstz AT TIME ZONE current_setting('TimeZone')",
+     ["tstz::TIMESTAMP::TEXT", "(tstz AT TIME ZONE current_setting('TimeZone'))::TEXT"]),
+]
+
+INVARIANT_NAMES = [name for name, _, _, _ in INVARIANTS]
+INVARIANT_DESCRIPTIONS = {name: description for name, description, _, _ in INVARIANTS}
+
+# AT TIME ZONE のゾーンに依存する不変条件（それ以外はセッションタイムゾーンに依存する）
+AT_ZONE_INVARIANTS = ("ts_at_time_zone", "tstz_at_time_zone")
+
+INPUT_SQL = """
+    WITH input AS (
+        SELECT
+            t.ord,
+            t.zone,
+            'epoch'::timestamp + t.u * interval '1 microsecond' AS ts,
+            'epoch'::timestamptz + t.u * interval '1 microsecond' AS tstz
+        FROM unnest(%s::BIGINT[], %s::TEXT[]) WITH ORDINALITY AS t(u, zone, ord)
+    )
+"""
+
+# 不変条件のどれかが成り立たない行だけを返す
+CHECK_SQL = INPUT_SQL + """
+    SELECT ord, {checks}
+    FROM input
+    WHERE NOT ({all_checks})
+""".format(checks=", ".join(check for _, _, check, _ in INVARIANTS),
+           all_checks=" AND ".join(f"coalesce({check}, false)" for _, _, check, _ in INVARIANTS))
+
+US_PER_DAY = 86400 * tz_oracle.US_PER_SECOND
+
+# 縮小で時刻を切り捨てる単位（粗い順）
+SHRINK_UNITS = [US_PER_DAY, 3600 * tz_oracle.US_PER_SECOND, 60 * tz_oracle.US_PER_SECOND,
+                tz_oracle.US_PER_SECOND, 1000]
+
+
+def year_to_us(year):
+    return int((np.datetime64(f"{year:04d}-01-01", "us") - np.datetime64("1970-01-01", "us")).astype(np.int64))
+
+
+# ギャップ・重複をオラクルで判定できる時刻の上限
+ORACLE_LIMIT_US = year_to_us(tz_oracle.EXTEND_TO_YEAR + 1)
+
+
+def connect(db_config):
+    """ワーカー専用のコネクションを作る（セッションタイムゾーンはチャンクごとに設定する）"""
+    conn = psycopg2.connect(host=db_config["host"], port=db_config["port"], user=db_config["user"],
+                            password=db_config["password"], database=db_config["database"])
+    conn.autocommit = True
+    return conn
+
+
+def generate_cases(rng, count, zones):
+    """(時刻のマイクロ秒の配列, AT TIME ZONE のゾーンの配列) を生成する"""
+    wide = rng.random(count) < WIDE_RATIO
+    low = np.where(wide, year_to_us(WIDE_YEARS[0]), year_to_us(COMMON_YEARS[0]))
+    high = np.where(wide, year_to_us(WIDE_YEARS[1] + 1), year_to_us(COMMON_YEARS[1] + 1))
+    # 西暦1〜9999年の幅はマイクロ秒で 2**53 を超えるため、浮動小数点を通さずに整数で選ぶ
+    instants = rng.integers(low, high)
+
+    # オフセットは15分単位の ±14時間（POSIX形式のため符号はISOと逆に解釈される）
+    quarters = rng.integers(-56, 57, size=count)
+    offsets = np.array([f"{'-' if q < 0 else '+'}{abs(q) // 4:02d}:{abs(q) % 4 * 15:02d}" for q in quarters])
+    names = np.asarray(zones, dtype=object)[rng.integers(0, len(zones), size=count)]
+    at_zones = np.where(rng.random(count) < OFFSET_RATIO, offsets, names).astype(object)
+    return instants, at_zones
+
+
+def oracle_table(zone):
+    """オラクルの遷移表を返す（オフセットの文字列や zoneinfo に無いゾーンは None）"""
+    if zone[:1] in "+-":
+        return None
+    try:
+        return tz_oracle.get_table(zone)
+    except Exception:
+        return None
+
+
+def excluded(invariant, instant, zone):
+    """不変条件が成り立たなくてよいケースかを返す（判定できない場合は None）"""
+    if invariant not in ("ts_at_time_zone", "tstz_at_time_zone"):
+        return False
+    if zone[:1] in "+-":
+        # 固定のオフセットにはギャップも重複も無い
+        return False
+    table = oracle_table(zone)
+    if table is None or instant >= ORACLE_LIMIT_US:
+        # オラクルの遷移表はDST規則による遷移を EXTEND_TO_YEAR までしか持たない
+        return None
+    instant = np.array([instant], dtype=np.int64)
+    if invariant == "ts_at_time_zone":
+        return bool(table.in_gap(instant)[0])
+    local, _ = table.utc_to_local(instant)
+    return bool(table.local_to_utc(local)[0] != instant[0])
+
+
+def set_session_timezone(cur, session_timezone):
+    cur.execute("SELECT set_config('timezone', %s, false)", (session_timezone,))
+
+
+def check_cases(cur, session_timezone, instants, at_zones):
+    """ケースをまとめて検証し、(添字, 成り立たなかった不変条件の名前) のリストを返す"""
+    set_session_timezone(cur, session_timezone)
+    cur.execute(CHECK_SQL, (tz_oracle.format_array_literal(instants), list(at_zones)))
+    failed = []
+    for row in cur.fetchall():
+        index = row[0] - 1
+        for name, holds in zip(INVARIANT_NAMES, row[1:]):
+            if not holds:
+                failed.append((index, name))
+    return failed
+
+
+def fails(cur, session_timezone, instant, zone, invariant):
+    """1件のケースで、不変条件が除外されずに成り立たないかを返す"""
+    names = {name for _, name in check_cases(cur, session_timezone, [instant], [zone])}
+    return invariant in names and excluded(invariant, instant, zone) is False
+
+
+def shrink(cur, session_timezone, instant, zone, invariant):
+    """失敗が再現する範囲でケースを縮め、(セッションタイムゾーン, 時刻, ゾーン) を返す"""
+    if session_timezone != "UTC" and fails(cur, "UTC", instant, zone, invariant):
+        session_timezone = "UTC"
+    for unit in SHRINK_UNITS:
+        candidate = instant - instant % unit
+        if candidate != instant and fails(cur, session_timezone, candidate, zone, invariant):
+            instant = candidate
+    return session_timezone, instant, zone
+
+
+def describe(cur, session_timezone, instant, zone, invariant):
+    """失敗したケースの途中の値を文字列で返す"""
+    expressions = dict((name, details) for name, _, _, details in INVARIANTS)[invariant]
+    set_session_timezone(cur, session_timezone)
+    cur.execute(INPUT_SQL + "SELECT " + ", ".join(expressions) + " FROM input",
+                (tz_oracle.format_array_literal([instant]), [zone]))
+    values = cur.fetchone()
+    return " → ".join(str(value) for value in values)
+
+
+def failure_class(invariant, session_timezone, zone):
+    """同じ原因とみなす失敗のまとまり（AT TIME ZONE の不変条件はゾーン、それ以外はセッションタイムゾーン）"""
+    if invariant in AT_ZONE_INVARIANTS:
+        return invariant, zone
+    return invariant, session_timezone
+
+
+def run_shard(db_config, shard, seed, cases, zones, chunk_size=DEFAULT_CHUNK_SIZE, duration=None):
+    """1つのシードのシャードを実行する（プロセスプールのワーカーで呼ばれる）
+
+    cases 件を検証する。duration（秒）を指定した場合は件数の代わりに時間で打ち切る。
+    問い合わせが失敗したチャンクはエラーを記録して飛ばし、次のチャンクに進む。
+    """
+    rng = np.random.default_rng([seed, shard])
+    started = time.perf_counter()
+    result = {"shard": shard, "checked": 0, "excluded": 0, "unverified": 0, "failed": 0, "failures": [],
+              "errored": 0, "chunk_errors": [], "error": None}
+    seen = set()
+    generated = 0
+    conn = None
+    try:
+        conn = connect(db_config)
+        with conn.cursor() as cur:
+            while True:
+                if duration is not None:
+                    if time.perf_counter() - started >= duration:
+                        break
+                    count = chunk_size
+                else:
+                    count = min(chunk_size, cases - generated)
+                    if count <= 0:
+                        break
+                generated += count
+                session_timezone = zones[rng.integers(0, len(zones))]
+                instants, at_zones = generate_cases(rng, count, zones)
+                try:
+                    chunk = run_chunk(cur, seen, session_timezone, instants, at_zones)
+                except psycopg2.Error as e:
+                    if conn.closed:
+                        raise
+                    result["errored"] += count
+                    if len(result["chunk_errors"]) < MAX_CHUNK_ERRORS:
+                        result["chunk_errors"].append(f"{session_timezone}: {e}".strip())
+                    continue
+                # チャンクが最後まで成功した場合だけシャードの集計に加える
+                for name in ("excluded", "unverified", "failed"):
+                    result[name] += chunk[name]
+                result["failures"].extend(chunk["failures"])
+                seen.update(chunk["classes"])
+                result["checked"] += count
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        if conn is not None:
+            conn.close()
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_chunk(cur, seen, session_timezone, instants, at_zones):
+    """1つのチャンクを検証し、そのチャンクの集計を返す
+
+    seen はシャードでこれまでに報告した失敗のまとまりで、このチャンクで新しく報告した
+    まとまりは戻り値の classes に入れる（シャードの集計への反映は呼び出し側で行う）。
+    """
+    chunk = {"excluded": 0, "unverified": 0, "failed": 0, "failures": [], "classes": set()}
+    for index, invariant in check_cases(cur, session_timezone, instants, at_zones):
+        instant, zone = int(instants[index]), str(at_zones[index])
+        exclusion = excluded(invariant, instant, zone)
+        if exclusion:
+            chunk["excluded"] += 1
+            continue
+        if exclusion is None:
+            chunk["unverified"] += 1
+            continue
+        chunk["failed"] += 1
+        key = failure_class(invariant, session_timezone, zone)
+        if key in seen or key in chunk["classes"]:
+            continue
+        chunk["classes"].add(key)
+        minimal = shrink(cur, session_timezone, instant, zone, invariant)
+        chunk["failures"].append({
+            "invariant": invariant,
+            "session_timezone": minimal[0],
+            "instant_us": minimal[1],
+            "at_zone": minimal[2],
+            "original_session_timezone": session_timezone,
+            "original_instant_us": instant,
+            "detail": describe(cur, *minimal, invariant),
+        })
+    return chunk
+
+
+def run_fuzz(db_config, zones, cases, workers, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, duration=None):
+    """シャードをプロセスプールで並行に実行し、シャードごとの結果を返す
+
+    cases は全体の件数で、ワーカーに均等に分ける（duration を指定した場合は使わない）。
+    """
+    workers = max(1, workers)
+    per_shard = [cases // workers + (1 if shard < cases % workers else 0) for shard in range(workers)]
+    # 呼び出し元のスレッド（--jobs のワーカー）をforkで複製しないよう spawn で起動する
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+        futures = [executor.submit(run_shard, db_config, shard, seed, per_shard[shard], list(zones),
+                                   chunk_size, duration)
+                   for shard in range(workers)]
+        return [future.result() for future in futures]
+
+
+def merge_failures(results):
+    """シャードをまたいで同じまとまりの失敗を1つにまとめる（シャードの番号が小さいものを残す）"""
+    merged = {}
+    for result in results:
+        for failure in result["failures"]:
+            key = failure_class(failure["invariant"], failure["original_session_timezone"], failure["at_zone"])
+            merged.setdefault(key, failure)
+    return list(merged.values())
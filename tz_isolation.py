@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""共有の timezone_test テーブルを使うテストの分離モード
+
+- truncate: 従来どおり共有テーブルを TRUNCATE し、書き込みをコミットする
+- temp: コネクションごとに `CREATE TEMP TABLE ... (LIKE timezone_test)` で同名の一時テーブルを作り、
+  以降の timezone_test への参照を一時テーブルに向ける（ACCESS EXCLUSIVEロックが他の実行と競合しない）
+- savepoint: 共有テーブルに書き込むがコミットせず、テストケースごとにセーブポイントまで
+  ロールバックして破棄する（TRUNCATEのロックもコミットのfsyncも発生しない）
+"""
+import psycopg2.extensions
+
+ISOLATION_MODES = ("truncate", "temp", "savepoint")
+
+SAVEPOINT_NAME = "timezone_test_case"
+
+CREATE_TEMP_TABLE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS timezone_test
+        (LIKE public.timezone_test INCLUDING DEFAULTS)
+"""
+
+
+class IsolatedConnection(psycopg2.extensions.connection):
+    """分離モードと、現在のトランザクションにセーブポイントがあるかを覚えておくコネクション"""
+
+    isolation = "truncate"
+    savepoint_open = False
+
+    def commit(self):
+        # トランザクションが終わるとセーブポイントも無くなる
+        self.savepoint_open = False
+        super().commit()
+
+    def rollback(self):
+        self.savepoint_open = False
+        super().rollback()
+
+    def setup_isolation(self, mode):
+        """分離モードを設定する（temp の場合は一時テーブルを作る）"""
+        if mode not in ISOLATION_MODES:
+            raise ValueError(f"未知の分離モードです: {mode}")
+        self.isolation = mode
+        if mode == "temp":
+            with self.cursor() as cur:
+                cur.execute(CREATE_TEMP_TABLE_SQL)
+            self.commit()
+
+
+def isolation_of(conn):
+    """コネクションの分離モードを返す（IsolatedConnection でなければ truncate）"""
+    return getattr(conn, "isolation", "truncate")
+
+
+def reset_test_table(conn, cur):
+    """テスト用テーブルを空の状態にする"""
+    if isolation_of(conn) != "savepoint":
+        cur.execute("TRUNCATE timezone_test")
+        return
+
+    in_transaction = conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    if conn.savepoint_open and in_transaction:
+        # 前のテストケースの書き込みを破棄する（エラーで中断したトランザクションも回復する）
+        cur.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT_NAME}")
+    else:
+        cur.execute(f"SAVEPOINT {SAVEPOINT_NAME}")
+        conn.savepoint_open = True
+
+
+def commit_test_writes(conn):
+    """テスト用テーブルへの書き込みを確定する（savepoint モードでは確定しない）"""
+    if isolation_of(conn) != "savepoint":
+        conn.commit()
+
+
+def discard_test_writes(conn):
+    """savepoint モードで、まだ破棄していないテストの書き込みをトランザクションごとロールバックする
+
+    SET timezone などをコミットする前に呼び、テストの行が一緒にコミットされないようにする。
+    """
+    if isolation_of(conn) != "savepoint" or not conn.savepoint_open:
+        return
+    conn.rollback()
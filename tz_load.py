@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""セッションタイムゾーンの異なる複数の書き込み手で now() を同時に挿入する負荷テスト
+
+書き込み手ごとに専用のコネクションを、起動パラメータで割り当てたセッションタイムゾーンに
+固定して開き、指定した時間のあいだ `now()` を ts 列と tstz 列に挿入してコミットし続ける。
+書き込み手は同時に開始し、トランザクションごとの所要時間を記録する。
+
+終了後に、書き込み手ごとに次の一貫性を確認する:
+- ts が tstz をその書き込み手のタイムゾーンで表した壁時計の値と一致するか
+  （ts - (tstz AT TIME ZONE 'UTC') がそのゾーンのオフセットになっているか）
+- 挿入した順（id の順）に tstz が減っていないか（now() はトランザクションの開始時刻のため、
+  同じ書き込み手の中では単調に増えるはず）
+
+psycopg2 は通信中にGILを解放するため、書き込み手はスレッドで実行する。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+LOAD_TABLE = "timezone_load"
+
+CREATE_SQL = f"""
+    CREATE TABLE {LOAD_TABLE} (
+        id BIGSERIAL PRIMARY KEY,
+        writer INTEGER NOT NULL,
+        writer_timezone TEXT NOT NULL,
+        ts TIMESTAMP,
+        tstz TIMESTAMPTZ
+    )
+"""
+
+INSERT_SQL = f"""
+    INSERT INTO {LOAD_TABLE} (writer, writer_timezone, ts, tstz)
+    SELECT %s, %s, now(), now() FROM generate_series(1, %s)
+"""
+
+CONSISTENCY_SQL = f"""
+    WITH ordered AS (
+        SELECT
+            writer,
+            writer_timezone,
+            ts,
+            tstz,
+            lag(tstz) OVER (PARTITION BY writer ORDER BY id) AS previous_tstz
+        FROM {LOAD_TABLE}
+    )
+    SELECT
+        writer,
+        count(*),
+        count(*) FILTER (WHERE ts IS DISTINCT FROM tstz AT TIME ZONE writer_timezone),
+        count(*) FILTER (WHERE tstz < previous_tstz),
+        string_agg(DISTINCT (ts - (tstz AT TIME ZONE 'UTC'))::TEXT, ', ')
+    FROM ordered
+    GROUP BY writer
+    ORDER BY writer
+"""
+
+
+def assign_timezones(writers, zones):
+    """書き込み手に順番にタイムゾーンを割り当てる"""
+    return [zones[i % len(zones)] for i in range(writers)]
+
+
+def create_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {LOAD_TABLE}")
+        cur.execute(CREATE_SQL)
+    conn.commit()
+
+
+def drop_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {LOAD_TABLE}")
+    conn.commit()
+
+
+def run_writer(connect, writer, session_timezone, duration, batch, barrier):
+    """1つの書き込み手を実行し、トランザクションごとの所要時間（秒）などを返す
+
+    connect はセッションタイムゾーンを受け取ってコネクションを開く関数。
+    """
+    result = {"writer": writer, "writer_timezone": session_timezone,
+              "latencies": [], "rows": 0, "errors": 0, "error": None, "elapsed": 0.0}
+    conn = None
+    try:
+        conn = connect(session_timezone)
+    except Exception as e:
+        result["errors"] = 1
+        result["error"] = str(e)
+    finally:
+        # 接続に失敗した書き込み手も待ち合わせには参加し、他の書き込み手を止めない
+        barrier.wait()
+    if conn is None:
+        return result
+
+    try:
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            deadline = started + duration
+            while time.perf_counter() < deadline:
+                began = time.perf_counter()
+                try:
+                    cur.execute(INSERT_SQL, (writer, session_timezone, batch))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    result["errors"] += 1
+                    result["error"] = str(e)
+                    continue
+                result["latencies"].append(time.perf_counter() - began)
+                result["rows"] += batch
+            result["elapsed"] = time.perf_counter() - started
+    finally:
+        conn.close()
+    return result
+
+
+def check_consistency(conn):
+    """書き込み手ごとの (行数, オフセットの不一致, 順序の逆転, 観測したオフセット) を返す"""
+    with conn.cursor() as cur:
+        cur.execute(CONSISTENCY_SQL)
+        rows = cur.fetchall()
+    conn.rollback()
+    return {writer: (count, mismatches, inversions, offsets)
+            for writer, count, mismatches, inversions, offsets in rows}
+
+
+def summarize_writer(result, consistency):
+    """書き込み手1つ分の結果を、スループットとパーセンタイル（ミリ秒）にまとめる"""
+    latencies = np.asarray(result["latencies"]) * 1000.0
+    count, mismatches, inversions, offsets = consistency.get(result["writer"], (0, 0, 0, ""))
+    elapsed = result["elapsed"]
+    return {
+        "writer": result["writer"],
+        "writer_timezone": result["writer_timezone"],
+        "transactions": len(latencies),
+        "rows": result["rows"],
+        "errors": result["errors"],
+        "rows_per_sec": result["rows"] / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        "max_ms": float(latencies.max()) if len(latencies) else 0.0,
+        "stored_rows": count,
+        "offset_mismatches": mismatches,
+        "order_inversions": inversions,
+        "offsets": offsets or "",
+        "last_error": result["error"] or "",
+    }
+
+
+def run_load(conn, connect, zones, writers, duration, batch=1):
+    """書き込み手を同時に実行し、一貫性を確認して書き込み手ごとの結果を返す
+
+    conn はテーブルの作成と確認に使うコネクション、connect は書き込み手ごとに
+    セッションタイムゾーンを指定してコネクションを開く関数。
+    """
+    create_table(conn)
+    assignments = assign_timezones(writers, zones)
+    barrier = threading.Barrier(writers)
+    try:
+        with ThreadPoolExecutor(max_workers=writers) as executor:
+            futures = [executor.submit(run_writer, connect, writer, session_timezone, duration, batch, barrier)
+                       for writer, session_timezone in enumerate(assignments, start=1)]
+            results = [future.result() for future in futures]
+        consistency = check_consistency(conn)
+    finally:
+        drop_table(conn)
+    return [summarize_writer(result, consistency) for result in results]
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""セッションタイムゾーン × 入力値の組み合わせ行列を遅延生成するモジュール
+
+行列全体をメモリ上に作らず、(セッションタイムゾーン, 入力値) の組を1件ずつ
+ストリームとして返す。入力値にはDSTの切り替わり（ギャップ・重複）の前後や、
+1970年以前・遠い未来の時刻、+05:45 のような分単位のオフセットを含める。
+"""
+from datetime import timedelta
+from itertools import groupby, islice
+
+import pytz
+
+# セッションタイムゾーンの既定リスト（"all" を指定するとpg_timezone_namesの全ゾーンを使う）
+DEFAULT_SESSION_TIMEZONES = [
+    "UTC",
+    "Asia/Tokyo",
+    "America/New_York",
+    "Europe/London",
+    "Australia/Lord_Howe",
+    "Asia/Kathmandu",
+    "Asia/Kolkata",
+    "America/St_Johns",
+]
+
+# DSTの切り替わり時刻を入力値として展開するタイムゾーンの既定リスト
+DEFAULT_INPUT_TIMEZONES = [
+    "America/New_York",
+    "Europe/London",
+    "Australia/Lord_Howe",
+    "America/St_Johns",
+    "Asia/Tokyo",
+]
+
+# 年代の境界となる固定の入力時刻
+EDGE_TIMESTAMPS = [
+    ("PostgreSQLの最小値", "4714-11-24 00:00:00 BC"),
+    ("西暦1年", "0001-01-01 00:00:00"),
+    ("1900年", "1900-01-01 00:00:00"),
+    ("1970年直前", "1969-12-31 23:59:59.999999"),
+    ("Unixエポック", "1970-01-01 00:00:00"),
+    ("32bit time_tの上限超過", "2038-01-19 03:14:08"),
+    ("2100年", "2100-02-28 12:00:00"),
+    ("西暦9999年末", "9999-12-31 23:59:59"),
+    ("PostgreSQLの最大値付近", "294276-12-31 23:59:59"),
+]
+
+# オフセットやセッションタイムゾーンによっては範囲外になる時刻。範囲外のエラーで
+# バッチ全体が1件ずつのパスに落ちないよう、バッチに含めず1件ずつ実行する
+PER_VALUE_EDGES = {"PostgreSQLの最小値", "PostgreSQLの最大値付近"}
+
+# 固定の入力時刻に付けるタイムゾーン表記
+OFFSET_SUFFIXES = [
+    ("タイムゾーン情報なし", ""),
+    ("UTC指定", " UTC"),
+    ("JST指定", " +09:00"),
+    ("+05:45指定", " +05:45"),
+    ("+05:30指定", " +05:30"),
+    ("-03:30指定", " -03:30"),
+    ("+14:00指定", " +14:00"),
+    ("-12:00指定", " -12:00"),
+]
+
+
+def parse_zone_list(spec):
+    """カンマ区切りのタイムゾーン指定をリストに変換する（"all" はそのまま返す）"""
+    if spec is None:
+        return None
+    if spec.strip().lower() == "all":
+        return "all"
+    return [zone.strip() for zone in spec.split(",") if zone.strip()]
+
+
+def parse_year_range(spec):
+    """"2020-2030" 形式の年の範囲を (開始年, 終了年) に変換する"""
+    start, _, end = spec.partition("-")
+    start_year = int(start)
+    end_year = int(end) if end else start_year
+    if start_year > end_year:
+        raise ValueError(f"年の範囲が不正です: {spec}")
+    return start_year, end_year
+
+
+def fetch_session_timezones(cur):
+    """pg_timezone_namesから全てのタイムゾーン名を取得する"""
+    cur.execute("SELECT name FROM pg_timezone_names ORDER BY name")
+    return [row[0] for row in cur.fetchall()]
+
+
+def resolve_timezones(cur, spec, default, catalog=None):
+    """タイムゾーンの指定を解決する（"all" はサーバーのカタログ、または取得済みの索引から取得）"""
+    zones = parse_zone_list(spec)
+    if zones == "all":
+        if catalog is not None:
+            return list(catalog.zone_names)
+        return fetch_session_timezones(cur)
+    return zones or list(default)
+
+
+def format_timestamp(dt):
+    """datetimeをPostgreSQLの入力形式の文字列にする（マイクロ秒は必要な場合のみ）"""
+    if dt.microsecond:
+        return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def iter_transitions(zone_name, start_year, end_year, catalog=None):
+    """タイムゾーンのUTCオフセットの切り替わりを (UTC時刻, 切替前オフセット, 切替後オフセット) で返す
+
+    catalog（tz_catalog の索引）があれば、pytzを引かずに索引の切り替わりを使う。
+    """
+    if catalog is not None:
+        yield from catalog.transitions(zone_name, start_year, end_year)
+        return
+    try:
+        tz = pytz.timezone(zone_name)
+    except pytz.UnknownTimeZoneError:
+        # サーバーのカタログにあってもpytzが知らないゾーンは切り替わりを展開しない
+        return
+    transition_times = getattr(tz, "_utc_transition_times", None)
+    transition_info = getattr(tz, "_transition_info", None)
+    if not transition_times or not transition_info:
+        # 固定オフセットのタイムゾーンには切り替わりがない
+        return
+
+    for i in range(1, len(transition_times)):
+        utc_time = transition_times[i]
+        if utc_time.year < start_year:
+            continue
+        if utc_time.year > end_year:
+            break
+        before = transition_info[i - 1][0]
+        after = transition_info[i][0]
+        if before != after:
+            yield utc_time, before, after
+
+
+def iter_transition_values(zone_name, start_year, end_year, catalog=None):
+    """1つのタイムゾーンについて、切り替わりの前後の時刻を入力値として返す"""
+    for utc_time, before, after in iter_transitions(zone_name, start_year, end_year, catalog):
+        local_before = utc_time + before  # 旧オフセットでの切り替わり時刻
+        local_after = utc_time + after    # 新オフセットでの切り替わり時刻
+        if after > before:
+            kind = "DSTギャップ"
+            boundary_start, boundary_end = local_before, local_after
+        else:
+            kind = "DST重複"
+            boundary_start, boundary_end = local_after, local_before
+        middle = boundary_start + (boundary_end - boundary_start) / 2
+
+        points = [
+            (f"{kind}直前", boundary_start - timedelta(seconds=1)),
+            (kind, middle),
+            (f"{kind}直後", boundary_end),
+        ]
+        for label, local_time in points:
+            local_str = format_timestamp(local_time)
+            yield {
+                "description": f"{zone_name} {label}",
+                "ts_str": local_str,
+                "tstz_str": local_str,
+            }
+            zoned_str = f"{local_str} {zone_name}"
+            yield {
+                "description": f"{zone_name} {label} (ゾーン名指定)",
+                "ts_str": zoned_str,
+                "tstz_str": zoned_str,
+            }
+
+        # 切り替わりの瞬間そのもの（UTCで指定）
+        utc_str = format_timestamp(utc_time) + " UTC"
+        yield {
+            "description": f"{zone_name} 切り替わり時刻 (UTC指定)",
+            "ts_str": utc_str,
+            "tstz_str": utc_str,
+        }
+
+
+def iter_edge_values():
+    """年代の境界となる時刻とオフセット表記の組み合わせを入力値として返す"""
+    for edge_desc, edge_str in EDGE_TIMESTAMPS:
+        for suffix_desc, suffix in OFFSET_SUFFIXES:
+            value_str = edge_str + suffix
+            value = {
+                "description": f"{edge_desc} {suffix_desc}",
+                "ts_str": value_str,
+                "tstz_str": value_str,
+            }
+            if edge_desc in PER_VALUE_EDGES:
+                value["per_value"] = True
+            yield value
+
+
+def iter_input_values(input_timezones, start_year, end_year, catalog=None):
+    """入力値を遅延生成する"""
+    yield from iter_edge_values()
+    for zone_name in input_timezones:
+        yield from iter_transition_values(zone_name, start_year, end_year, catalog)
+
+
+def iter_matrix(session_timezones, input_timezones=None, start_year=2020, end_year=2030, catalog=None):
+    """(セッションタイムゾーン, 入力値) の組を遅延生成する
+
+    入力値はセッションタイムゾーンごとに生成し直すため、行列全体をメモリに保持しない。
+    """
+    if input_timezones is None:
+        input_timezones = DEFAULT_INPUT_TIMEZONES
+    for session_timezone in session_timezones:
+        for value in iter_input_values(input_timezones, start_year, end_year, catalog):
+            yield session_timezone, value
+
+
+def iter_batches(stream, size):
+    """ストリームを最大 size 件ずつのリストに区切って返す"""
+    iterator = iter(stream)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_session_groups(batch):
+    """バッチをセッションタイムゾーンごとの (タイムゾーン, 入力値のリスト) に分ける"""
+    for session_timezone, group in groupby(batch, key=lambda case: case[0]):
+        yield session_timezone, [value for _, value in group]
+
+
+def split_per_value(values):
+    """入力値をバッチで実行するものと1件ずつ実行するものに分ける"""
+    batched = [value for value in values if not value.get("per_value")]
+    per_value = [value for value in values if value.get("per_value")]
+    return batched, per_value
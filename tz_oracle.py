@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""PostgreSQLのタイムスタンプ出力をPython側で予測するオラクル
+
+zoneinfoのTZifファイルから作ったUTCオフセットの遷移表とNumPyの配列演算で、
+`ts::TEXT`、`tstz::TEXT`、`tstz AT TIME ZONE X` などの結果を値ごとの
+ループなしに予測する。サーバーへ大量の時刻をまとめて送り、予測と異なる
+結果だけを差分として返す。
+
+時刻は Unix エポックからのマイクロ秒（int64）で扱う。timestamp（タイムゾーンなし）
+の値は、同じ数値を壁時計の時刻として解釈する。
+"""
+import struct
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+US_PER_SECOND = 1000000
+INT64_MIN = np.iinfo(np.int64).min
+
+# TZifファイルの明示的な遷移が終わった後、zoneinfoで遷移を補う年の上限
+EXTEND_TO_YEAR = 2100
+
+# 1回のクエリで送る時刻の件数
+DEFAULT_CHUNK_SIZE = 100000
+
+# 予測と比較するために、サーバーから全ての表現をテキストで取得するSQL
+# （'epoch' からの加算はセッションタイムゾーンに依存しない）
+DIFFERENTIAL_SQL = """
+    WITH input AS (
+        SELECT
+            t.ord,
+            'epoch'::timestamp + t.u * interval '1 microsecond' AS ts,
+            'epoch'::timestamptz + t.u * interval '1 microsecond' AS tstz
+        FROM unnest(%s::BIGINT[]) WITH ORDINALITY AS t(u, ord)
+    )
+    SELECT
+        ts::TEXT,
+        tstz::TEXT,
+        ts::timestamptz::TEXT,
+        {at_columns}
+    FROM input
+    ORDER BY ord
+"""
+
+# DIFFERENTIAL_SQL の列と対応する予測結果の名前
+BASE_COLUMNS = ["ts_text", "tstz_text", "ts_as_tstz_text"]
+
+
+def find_tzif_path(name):
+    """タイムゾーン名に対応するTZifファイルのパスを探す"""
+    import os
+    import zoneinfo
+
+    for directory in zoneinfo.TZPATH:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def read_tzif_bytes(name):
+    """タイムゾーン名に対応するTZifファイルの内容を読み込む（システムになければtzdataパッケージ）"""
+    path = find_tzif_path(name)
+    if path is not None:
+        with open(path, "rb") as f:
+            return f.read()
+
+    from importlib import resources
+
+    package, _, resource = ("tzdata.zoneinfo/" + name).rpartition("/")
+    return resources.files(package.replace("/", ".")).joinpath(resource).read_bytes()
+
+
+def parse_tzif(data):
+    """TZif（RFC 8536）を解析し、(遷移時刻の秒配列, 各区間のオフセット秒配列, POSIX TZ文字列) を返す
+
+    オフセット配列は遷移時刻より1つ長く、先頭は最初の遷移より前の区間を表す。
+    """
+    if data[:4] != b"TZif":
+        raise ValueError("TZif形式ではありません")
+    version = data[4:5]
+
+    def header(offset):
+        return struct.unpack(">6l", data[offset + 20:offset + 44])
+
+    isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = header(0)
+    time_size = 4
+    offset = 44
+    if version >= b"2":
+        # バージョン2以降は64bitの遷移時刻を持つ2つ目のデータブロックを使う
+        offset += (timecnt * 4 + timecnt + typecnt * 6 + charcnt
+                   + leapcnt * 8 + isstdcnt + isutcnt)
+        isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = header(offset)
+        time_size = 8
+        offset += 44
+
+    times = np.frombuffer(data, dtype=">i8" if time_size == 8 else ">i4",
+                          count=timecnt, offset=offset).astype(np.int64)
+    offset += timecnt * time_size
+    type_indices = np.frombuffer(data, dtype=np.uint8, count=timecnt, offset=offset)
+    offset += timecnt
+    utoffs = np.array([struct.unpack(">l", data[offset + i * 6:offset + i * 6 + 4])[0]
+                       for i in range(typecnt)], dtype=np.int64)
+    offset += typecnt * 6 + charcnt + leapcnt * (time_size + 4) + isstdcnt + isutcnt
+
+    footer = ""
+    if version >= b"2":
+        footer = data[offset:].strip(b"\n").decode("ascii")
+
+    offsets = np.concatenate([utoffs[:1], utoffs[type_indices]])
+    return times, offsets, footer
+
+
+def extend_transitions(name, times, offsets, to_year=EXTEND_TO_YEAR):
+    """TZifの明示的な遷移の後の遷移を、zoneinfoを日単位で調べて補う"""
+    from zoneinfo import ZoneInfo
+
+    tz = ZoneInfo(name)
+
+    def offset_at(seconds):
+        moment = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=int(seconds))
+        return int(moment.astimezone(tz).utcoffset().total_seconds())
+
+    start = int(times[-1]) + 1 if len(times) else 0
+    end = int((datetime(to_year + 1, 1, 1, tzinfo=timezone.utc)
+               - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds())
+    new_times = []
+    new_offsets = []
+    current = offset_at(start)
+    day = 86400
+    t = start
+    while t < end:
+        next_t = min(t + day, end)
+        next_offset = offset_at(next_t)
+        if next_offset != current:
+            # 1日の中で遷移した秒を二分探索で求める
+            low, high = t, next_t
+            while high - low > 1:
+                middle = (low + high) // 2
+                if offset_at(middle) == current:
+                    low = middle
+                else:
+                    high = middle
+            new_times.append(high)
+            new_offsets.append(next_offset)
+            current = next_offset
+        t = next_t
+
+    if not new_times:
+        return times, offsets
+    return (np.concatenate([times, np.array(new_times, dtype=np.int64)]),
+            np.concatenate([offsets, np.array(new_offsets, dtype=np.int64)]))
+
+
+class TransitionTable:
+    """1つのタイムゾーンのUTCオフセット遷移表
+
+    utc_starts[i] から始まる区間のUTCオフセットが offsets[i]（秒）である。
+    """
+
+    __slots__ = ("name", "utc_starts", "offsets", "local_starts")
+
+    def __init__(self, name, utc_starts, offsets):
+        self.name = name
+        self.utc_starts = np.asarray(utc_starts, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        # 各区間の開始を、その区間のオフセットで表した壁時計の時刻
+        self.local_starts = self.utc_starts + self.offsets * US_PER_SECOND
+        self.local_starts[0] = INT64_MIN
+
+    @classmethod
+    def from_zoneinfo(cls, name, extend_to_year=EXTEND_TO_YEAR):
+        """zoneinfoのTZifファイルから遷移表を作る"""
+        times, offsets, footer = parse_tzif(read_tzif_bytes(name))
+        if "," in footer:
+            # POSIX TZ文字列にDST規則がある場合は、最後の遷移以降の遷移を補う
+            times, offsets = extend_transitions(name, times, offsets, extend_to_year)
+        utc_starts = np.concatenate([[INT64_MIN], times * US_PER_SECOND])
+        return cls(name, utc_starts, offsets)
+
+    def offsets_at_utc(self, instants):
+        """UTCの時刻（マイクロ秒）に対するオフセット（秒）の配列を返す"""
+        index = np.searchsorted(self.utc_starts, instants, side="right") - 1
+        return self.offsets[np.maximum(index, 0)]
+
+    def utc_to_local(self, instants):
+        """UTCの時刻を、このタイムゾーンの壁時計の時刻と適用されたオフセットに変換する"""
+        offsets = self.offsets_at_utc(instants)
+        return instants + offsets * US_PER_SECOND, offsets
+
+    def local_to_utc(self, local):
+        """壁時計の時刻をUTCの時刻に変換する
+
+        PostgreSQLと同じく、DSTギャップ中の時刻は切り替わり前のオフセット、
+        DST重複中の時刻は切り替わり後のオフセットで解釈する。どちらの場合も、
+        壁時計での開始時刻がその時刻以前である最後の区間のオフセットになる。
+        """
+        index = np.searchsorted(self.local_starts, local, side="right") - 1
+        offsets = self.offsets[np.maximum(index, 0)]
+        return local - offsets * US_PER_SECOND
+
+    def in_gap(self, local):
+        """壁時計の時刻がDSTギャップ（存在しない時刻）に含まれるかを返す"""
+        utc = self.local_to_utc(local)
+        back, _ = self.utc_to_local(utc)
+        return back != local
+
+
+_table_cache = {}
+
+
+def get_table(name):
+    """タイムゾーン名の遷移表を返す（プロセス内でキャッシュ）"""
+    table = _table_cache.get(name)
+    if table is None:
+        table = TransitionTable.from_zoneinfo(name)
+        _table_cache[name] = table
+    return table
+
+
+def format_timestamp(local):
+    """壁時計の時刻（マイクロ秒）の配列を、PostgreSQLの timestamp::TEXT と同じ形式にする"""
+    text = np.datetime_as_string(np.asarray(local, dtype=np.int64).astype("datetime64[us]"), unit="us")
+    text = np.char.replace(text, "T", " ")
+    # 小数部の末尾の0を削り、全て0なら小数点も削る
+    return np.char.rstrip(np.char.rstrip(text, "0"), ".")
+
+
+def format_offset(seconds):
+    """UTCオフセット（秒）を PostgreSQL の表記（+09, +05:45, -04:56:02）にする"""
+    sign = "-" if seconds < 0 else "+"
+    seconds = abs(int(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if secs:
+        return f"{sign}{hours:02d}:{minutes:02d}:{secs:02d}"
+    if minutes:
+        return f"{sign}{hours:02d}:{minutes:02d}"
+    return f"{sign}{hours:02d}"
+
+
+def format_timestamptz(instants, table):
+    """UTCの時刻の配列を、そのタイムゾーンをセッションとした tstz::TEXT と同じ形式にする"""
+    local, offsets = table.utc_to_local(instants)
+    # オフセットの種類は少ないので、ユニークな値だけ文字列化して配列に展開する
+    unique, inverse = np.unique(offsets, return_inverse=True)
+    suffixes = np.array([format_offset(o) for o in unique])[inverse.reshape(-1)]
+    return np.char.add(format_timestamp(local), suffixes)
+
+
+def predict(instants, session_timezone, at_timezones=("UTC", "Asia/Tokyo")):
+    """DIFFERENTIAL_SQL の各列についてPostgreSQLの出力を予測する
+
+    instants はエポックからのマイクロ秒。timestamp の値としては同じ数値を壁時計の時刻とみなす。
+    """
+    instants = np.asarray(instants, dtype=np.int64)
+    session = get_table(session_timezone)
+    predicted = {
+        "ts_text": format_timestamp(instants),
+        "tstz_text": format_timestamptz(instants, session),
+        "ts_as_tstz_text": format_timestamptz(session.local_to_utc(instants), session),
+    }
+    for zone in at_timezones:
+        local, _ = get_table(zone).utc_to_local(instants)
+        predicted[f"at:{zone}"] = format_timestamp(local)
+    return predicted
+
+
+def generate_instants(count, seed=0, start_year=1900, end_year=2037, boundary_timezones=()):
+    """検証用の時刻（マイクロ秒）を生成する
+
+    一様乱数の時刻に加えて、指定したタイムゾーンの遷移の前後1マイクロ秒を含める。
+    """
+    rng = np.random.default_rng(seed)
+    low = int((datetime(start_year, 1, 1) - datetime(1970, 1, 1)).total_seconds()) * US_PER_SECOND
+    high = int((datetime(end_year + 1, 1, 1) - datetime(1970, 1, 1)).total_seconds()) * US_PER_SECOND
+    parts = [rng.integers(low, high, size=count, dtype=np.int64)]
+    for zone in boundary_timezones:
+        starts = get_table(zone).utc_starts[1:]
+        starts = starts[(starts >= low) & (starts < high)]
+        parts.append(np.concatenate([starts - 1, starts, starts + 1]))
+    return np.concatenate(parts)
+
+
+def format_array_literal(instants):
+    """int64の配列をPostgreSQLの配列リテラルにする"""
+    return "{" + ",".join(map(str, np.asarray(instants).tolist())) + "}"
+
+
+def fetch_server_results(cur, instants, at_timezones):
+    """時刻をまとめてサーバーへ送り、DIFFERENTIAL_SQL の各列を文字列の配列で返す"""
+    at_columns = ",\n        ".join(["(tstz AT TIME ZONE %s)::TEXT"] * len(at_timezones))
+    sql = DIFFERENTIAL_SQL.format(at_columns=at_columns)
+    cur.execute(sql, [format_array_literal(instants)] + list(at_timezones))
+    rows = cur.fetchall()
+    names = BASE_COLUMNS + [f"at:{zone}" for zone in at_timezones]
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: np.array(column, dtype=object) for name, column in zip(names, columns)}
+
+
+def compare(instants, predicted, actual):
+    """予測とサーバーの結果を列ごとに比較し、不一致だけを辞書のリストで返す"""
+    mismatches = []
+    for column, expected in predicted.items():
+        got = actual[column]
+        # 予測は固定長の文字列配列なので、サーバーの文字列を切り詰めないよう object で比べる
+        mask = got != expected.astype(object)
+        for i in np.flatnonzero(mask):
+            mismatches.append({
+                "instant_us": int(instants[i]),
+                "column": column,
+                "expected": str(expected[i]),
+                "actual": str(got[i]),
+            })
+    return mismatches
+
+
+def run_differential_check(cur, session_timezone, instants, at_timezones=("UTC", "Asia/Tokyo"),
+                           chunk_size=DEFAULT_CHUNK_SIZE):
+    """時刻をチャンクごとにサーバーへ送り、オラクルの予測との不一致を返す
+
+    セッションタイムゾーンは呼び出し側で session_timezone に設定しておくこと。
+    戻り値は (検証した件数, 不一致のリスト)。
+    """
+    instants = np.asarray(instants, dtype=np.int64)
+    mismatches = []
+    for start in range(0, len(instants), chunk_size):
+        chunk = instants[start:start + chunk_size]
+        predicted = predict(chunk, session_timezone, at_timezones)
+        actual = fetch_server_results(cur, chunk, at_timezones)
+        mismatches.extend(compare(chunk, predicted, actual))
+    return len(instants), mismatches
+
+
+def format_instant(instant_us):
+    """マイクロ秒の時刻を、不一致の表示用にUTCの文字列にする"""
+    return str(format_timestamp(np.array([instant_us]))[0]) + " UTC"
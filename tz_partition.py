@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""ts / tstz をキーにした範囲パーティションで、述語ごとのパーティションプルーニングを調べる
+
+timezone_test と同じ列を持ち、ts をキーにしたテーブルと tstz をキーにしたテーブルを
+月ごとのパーティションに分けて作り、現在の前後12か月に均等に並べた行を入れる。
+リテラル・now()・AT TIME ZONE・プリペアド文のパラメータなどの典型的な述語を
+EXPLAIN (ANALYZE, FORMAT JSON) で実行し、計画時に除外されたパーティション、
+実行開始時に除外されたパーティション（Subplans Removed）、実際に走査された
+パーティションの数と実行時間を返す。
+
+パーティションの境界はUTCで固定し（tstz は +00 を明示する）、コンテナや
+セッションのタイムゾーンに依存させない。テーブルは実行のたびに作り直す。
+"""
+import statistics
+from datetime import datetime, timezone
+
+from tz_scale import explain_query
+
+PARTITION_TABLE_PREFIX = "timezone_part"
+
+# キーの列: (列名, 型)
+KEY_COLUMNS = [("ts", "TIMESTAMP"), ("tstz", "TIMESTAMPTZ")]
+
+# 現在の月の前後に作る月パーティションの数
+MONTHS_BEFORE = 12
+MONTHS_AFTER = 12
+
+DEFAULT_PARTITION_TIMEZONES = ["UTC", "Asia/Tokyo", "America/New_York"]
+
+# パーティションを走査するノード（Append の子）
+SCAN_NODE_TYPES = ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+
+# 述語: (名前, WHERE 句)。{col} をキーの列に、{start} / {end} を先月の初めと今月の初め（UTC、オフセット無し）に置き換える
+PREDICATES = [
+    ("リテラル", "{col} >= '{start}' AND {col} < '{end}'"),
+    ("リテラル（+09指定）", "{col} >= '{start}+09' AND {col} < '{end}+09'"),
+    ("now()", "{col} >= now() - interval '7 days'"),
+    ("now()::TIMESTAMP", "{col} >= now()::TIMESTAMP - interval '7 days'"),
+    ("CURRENT_DATE", "{col} >= CURRENT_DATE - 7"),
+    ("AT TIME ZONE", "{col} AT TIME ZONE 'Asia/Tokyo' >= '{start}' AND {col} AT TIME ZONE 'Asia/Tokyo' < '{end}'"),
+    ("date_trunc", "date_trunc('month', {col}) = '{start}'"),
+]
+
+# プリペアド文（汎用プラン）で $1 / $2 にリテラルと同じ範囲を渡す述語
+PREPARED_PREDICATE = ("パラメータ（汎用プラン）", "{col} >= $1 AND {col} < $2")
+
+PREPARED_NAME = "timezone_part_query"
+
+
+def table_name(column):
+    return f"{PARTITION_TABLE_PREFIX}_{column}"
+
+
+def add_months(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def month_bounds(now=None):
+    """現在のUTCの月を中心にしたパーティションの境界 (年, 月) のリストを返す"""
+    now = now or datetime.now(timezone.utc)
+    return [add_months(now.year, now.month, delta) for delta in range(-MONTHS_BEFORE, MONTHS_AFTER + 2)]
+
+
+def bound_literal(year, month, column_type):
+    literal = f"{year:04d}-{month:02d}-01 00:00:00"
+    return f"{literal}+00" if column_type == "TIMESTAMPTZ" else literal
+
+
+def predicate_range(now=None):
+    """リテラルの述語で使う範囲（先月の初めと今月の初め）を返す"""
+    now = now or datetime.now(timezone.utc)
+    start = add_months(now.year, now.month, -1)
+    return (f"{start[0]:04d}-{start[1]:02d}-01 00:00:00", f"{now.year:04d}-{now.month:02d}-01 00:00:00")
+
+
+def create_tables(conn, rows):
+    """ts / tstz をキーにしたパーティションテーブルを作り直し、行を入れる
+
+    各テーブルの (列名, パーティション数) のリストを返す。
+    """
+    bounds = month_bounds()
+    first = bound_literal(*bounds[0], "TIMESTAMPTZ")
+    last = bound_literal(*bounds[-1], "TIMESTAMPTZ")
+    created = []
+    with conn.cursor() as cur:
+        for column, column_type in KEY_COLUMNS:
+            table = table_name(column)
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+            cur.execute(f"""
+                CREATE TABLE {table} (
+                    id BIGINT,
+                    description TEXT,
+                    ts TIMESTAMP,
+                    tstz TIMESTAMPTZ
+                ) PARTITION BY RANGE ({column})
+            """)
+            for (year, month), (next_year, next_month) in zip(bounds, bounds[1:]):
+                cur.execute(
+                    f"CREATE TABLE {table}_{year:04d}{month:02d} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{bound_literal(year, month, column_type)}') "
+                    f"TO ('{bound_literal(next_year, next_month, column_type)}')")
+            cur.execute(f"CREATE INDEX ON {table} ({column})")
+            # 境界の内側に均等に並べる（tstz はUTCの時刻、ts は同じ時刻のUTCでの壁時計の値）
+            cur.execute(f"""
+                INSERT INTO {table} (id, description, ts, tstz)
+                SELECT i, 'partition', t AT TIME ZONE 'UTC', t
+                FROM generate_series(0, %(rows)s - 1) AS i,
+                     LATERAL (SELECT %(first)s::TIMESTAMPTZ
+                                     + (%(last)s::TIMESTAMPTZ - %(first)s::TIMESTAMPTZ) * (i::DOUBLE PRECISION / %(rows)s)) AS s(t)
+            """, {"rows": rows, "first": first, "last": last})
+            created.append((column, len(bounds) - 1))
+        conn.commit()
+        autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            for column, _ in KEY_COLUMNS:
+                cur.execute(f"VACUUM ANALYZE {table_name(column)}")
+        finally:
+            conn.autocommit = autocommit
+    return created
+
+
+def drop_tables(conn):
+    with conn.cursor() as cur:
+        for column, _ in KEY_COLUMNS:
+            cur.execute(f"DROP TABLE IF EXISTS {table_name(column)}")
+    conn.commit()
+
+
+def count_partitions(node, table):
+    """実行計画から (計画に残ったパーティション数, 実行開始時に除外された数, 実際に走査した数) を数える"""
+    planned = removed = scanned = 0
+    if node.get("Subplans Removed"):
+        removed += node["Subplans Removed"]
+    if node["Node Type"] in SCAN_NODE_TYPES and node.get("Relation Name", "").startswith(f"{table}_"):
+        planned += 1
+        if node.get("Actual Loops", 0) > 0:
+            scanned += 1
+    for child in node.get("Plans", ()):
+        child_planned, child_removed, child_scanned = count_partitions(child, table)
+        planned += child_planned
+        removed += child_removed
+        scanned += child_scanned
+    return planned, removed, scanned
+
+
+def count_rows(node, table):
+    """実行計画のパーティションの走査ノードが返した行数を合計する
+
+    最上位は count(*) の Aggregate で常に1行になるため、走査ノードの行数を数える。
+    Actual Rows はループ1回あたりの平均なので、ループ数を掛けて戻す。
+    """
+    rows = 0
+    if node["Node Type"] in SCAN_NODE_TYPES and node.get("Relation Name", "").startswith(f"{table}_"):
+        rows += round(node.get("Actual Rows", 0) * node.get("Actual Loops", 0))
+    for child in node.get("Plans", ()):
+        rows += count_rows(child, table)
+    return rows
+
+
+def pruning_kind(partitions, planned, removed, scanned):
+    """プルーニングが起きた時点を文字列にする"""
+    kinds = []
+    if planned + removed < partitions:
+        kinds.append("計画時")
+    if removed:
+        kinds.append("実行開始時")
+    if scanned < planned:
+        kinds.append("実行中")
+    return "+".join(kinds) if kinds else "なし"
+
+
+def summarize_plans(samples, table, partitions):
+    """EXPLAIN の結果から述語1つ分の結果を作る"""
+    top = samples[-1]["Plan"]
+    planned, removed, scanned = count_partitions(top, table)
+    return {
+        "partitions": partitions,
+        "planned": planned,
+        "removed_at_startup": removed,
+        "scanned": scanned,
+        "pruning": pruning_kind(partitions, planned, removed, scanned),
+        "rows": count_rows(top, table),
+        "planning_ms": statistics.median(sample["Planning Time"] for sample in samples),
+        "execution_ms": statistics.median(sample["Execution Time"] for sample in samples),
+    }
+
+
+def run_predicates(conn, partition_counts, repeat=3):
+    """現在のセッションタイムゾーンで、キーの列と述語ごとの結果を返す
+
+    1回目はキャッシュを温めるために捨て、続く repeat 回の実行時間の中央値を使う。
+    """
+    start, end = predicate_range()
+    with conn.cursor() as cur:
+        for column, column_type in KEY_COLUMNS:
+            table = table_name(column)
+            partitions = partition_counts[column]
+            for predicate_name, template in PREDICATES:
+                sql = f"SELECT count(*) FROM {table} WHERE " + template.format(col=column, start=start, end=end)
+                explain_query(cur, sql)
+                samples = [explain_query(cur, sql) for _ in range(max(1, repeat))]
+                conn.rollback()
+                result = {"key_column": column, "predicate": predicate_name}
+                result.update(summarize_plans(samples, table, partitions))
+                yield result
+
+            # 汎用プランでは述語の値が計画時に分からないため、実行開始時のプルーニングになる
+            predicate_name, template = PREPARED_PREDICATE
+            cur.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            cur.execute(f"PREPARE {PREPARED_NAME} ({column_type}, {column_type}) AS "
+                        f"SELECT count(*) FROM {table} WHERE " + template.format(col=column))
+            try:
+                execute_sql = f"EXECUTE {PREPARED_NAME} ('{start}', '{end}')"
+                explain_query(cur, execute_sql)
+                samples = [explain_query(cur, execute_sql) for _ in range(max(1, repeat))]
+            finally:
+                # PREPARE はトランザクションに含まれないため、ロールバックした後で削除する
+                conn.rollback()
+                cur.execute(f"DEALLOCATE {PREPARED_NAME}")
+                conn.rollback()
+            result = {"key_column": column, "predicate": predicate_name}
+            result.update(summarize_plans(samples, table, partitions))
+            yield result
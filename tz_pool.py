@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""セッションタイムゾーンを設定済みのコネクションを貸し出すプール
+
+新しいコネクションは起動パラメータ `options='-c timezone=...'` でタイムゾーンを
+指定して開くため、SET・コミット・確認のための往復が発生しない。上限まで開いた後は、
+しばらく使っていないコネクションに `set_config` で設定し直して使い回す（設定済みの
+値を覚えておき、同じタイムゾーンなら何もしない）。サーバーの既定値（None）は
+`RESET` では起動パラメータの値に戻るだけなので、起動パラメータ無しで開いた
+コネクションだけを貸し出し、無ければ空いているコネクションを閉じて開き直す。実際の設定値はサーバーが
+ParameterStatus で通知する TimeZone から読むので、確認の問い合わせも不要になる。
+
+プールはスレッドセーフではないため、ワーカー（対象DB）ごとに1つ作る。
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+# プールが同時に保持するコネクションの既定の上限
+DEFAULT_POOL_SIZE = 4
+
+
+def startup_options(session_timezone):
+    """セッションタイムゾーンを指定する起動パラメータ（libpq の options）を作る"""
+    if not session_timezone:
+        return None
+    escaped = session_timezone.replace("\\", "\\\\").replace(" ", "\\ ")
+    return f"-c timezone={escaped}"
+
+
+class TimezonePool:
+    """セッションタイムゾーンごとにコネクションを使い回すプール
+
+    connect には `connect(options)` の形で呼べる関数を渡す（options は None または
+    libpq の起動パラメータ文字列）。
+    """
+
+    def __init__(self, connect, max_size=DEFAULT_POOL_SIZE):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        # 空いているコネクション: conn -> 設定済みのセッションタイムゾーン（使った順）
+        self._idle = OrderedDict()
+        self._in_use = {}
+        self.opened = 0
+        self.reused = 0
+        self.retargeted = 0
+
+    def __len__(self):
+        return len(self._idle) + len(self._in_use)
+
+    def acquire(self, session_timezone):
+        """session_timezone を設定済みのコネクションを借りる（None はサーバーの既定値）"""
+        for conn, timezone in self._idle.items():
+            if timezone == session_timezone:
+                del self._idle[conn]
+                self.reused += 1
+                break
+        else:
+            if len(self) < self.max_size or not self._idle:
+                conn = self._connect(startup_options(session_timezone))
+                self.opened += 1
+            elif session_timezone is None:
+                # RESET は起動パラメータで指定した値に戻すだけなので、サーバーの既定値には
+                # 起動パラメータ無しで開き直したコネクションを使う
+                idle_conn, _ = self._idle.popitem(last=False)
+                idle_conn.close()
+                conn = self._connect(startup_options(None))
+                self.opened += 1
+            else:
+                # 最も長く使っていないコネクションを設定し直す
+                conn, _ = self._idle.popitem(last=False)
+                try:
+                    self._set_timezone(conn, session_timezone)
+                except Exception:
+                    conn.close()
+                    raise
+                self.retargeted += 1
+        self._in_use[conn] = session_timezone
+        return conn
+
+    def release(self, conn):
+        """借りたコネクションを返す（終わっていないトランザクションはロールバックする）"""
+        session_timezone = self._in_use.pop(conn)
+        if conn.closed:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+            return
+        self._idle[conn] = session_timezone
+
+    @contextmanager
+    def connection(self, session_timezone):
+        """with 文でコネクションを借り、終わったら返す"""
+        conn = self.acquire(session_timezone)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """保持している全てのコネクションを閉じる"""
+        for conn in list(self._idle) + list(self._in_use):
+            if not conn.closed:
+                conn.close()
+        self._idle.clear()
+        self._in_use.clear()
+
+    @staticmethod
+    def _set_timezone(conn, session_timezone):
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('timezone', %s, false)", (session_timezone,))
+        conn.commit()
+
+
+def current_timezone(conn):
+    """サーバーが通知したセッションタイムゾーンを返す（問い合わせは発生しない）"""
+    return conn.get_parameter_status("TimeZone")
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""カーソルとコネクションを計測用のクラスに差し替えて、実行時間の内訳を記録する
+
+execute / executemany / copy_expert を1回の往復として数え、対象DBとラベル
+（テスト種別）ごとに、所要時間のヒストグラム・往復回数・コミット回数・
+送受信のバイト数を集計する。ラベルと対象DBはスレッドローカルに保持するため、
+--jobs でDBごとにワーカーを分けても集計が混ざらない。
+
+受信バイト数は取得した値のテキスト表現の長さから概算する（libpqは受信した
+バイト数を公開していないため）。送信バイト数はサーバーへ送ったSQLの長さである。
+
+explain_pattern を指定すると、一致した文ごとに初回だけ `EXPLAIN (ANALYZE, BUFFERS)` を
+セーブポイントの中で実行し、ロールバックして副作用を残さずに実行計画を保存する。
+"""
+import json
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+from tz_isolation import IsolatedConnection
+
+# ラベルを指定していない処理の集計先
+DEFAULT_LABEL = "その他"
+
+EXPLAIN_SAVEPOINT = "timezone_profile_explain"
+
+# EXPLAIN できる文の先頭
+EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|VALUES)\b", re.IGNORECASE)
+
+_local = threading.local()
+
+
+def current_target():
+    return getattr(_local, "target", None)
+
+
+def current_label():
+    labels = getattr(_local, "labels", None)
+    return labels[-1] if labels else DEFAULT_LABEL
+
+
+@contextmanager
+def target(name):
+    """このスレッドで計測する対象DBを設定する"""
+    previous = current_target()
+    _local.target = name
+    try:
+        yield
+    finally:
+        _local.target = previous
+
+
+@contextmanager
+def label(name):
+    """このスレッドで計測する処理のラベルを設定する（入れ子にした場合は内側が優先）"""
+    if not hasattr(_local, "labels"):
+        _local.labels = []
+    _local.labels.append(name)
+    try:
+        yield
+    finally:
+        _local.labels.pop()
+
+
+class LatencyStats:
+    """1つの (対象DB, ラベル) の集計
+
+    所要時間はマイクロ秒の2のべき乗ごとのバケットに数える（バケット k は 2^k 以上 2^(k+1) 未満）。
+    """
+
+    __slots__ = ("round_trips", "commits", "rollbacks", "total_seconds", "max_seconds", "commit_seconds",
+                 "bytes_sent", "bytes_received", "rows", "histogram")
+
+    def __init__(self):
+        self.round_trips = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.commit_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.rows = 0
+        self.histogram = {}
+
+    def add_query(self, seconds, bytes_sent):
+        self.round_trips += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes_sent += bytes_sent
+        bucket = int(math.log2(max(seconds * 1e6, 1.0)))
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def percentile_ms(self, q):
+        """ヒストグラムから q パーセンタイルのバケットの上限（ミリ秒）を返す"""
+        if not self.round_trips:
+            return 0.0
+        threshold = self.round_trips * q / 100.0
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= threshold:
+                return (2 ** (bucket + 1)) / 1000.0
+        return self.max_seconds * 1000.0
+
+    def summary(self):
+        return {
+            "round_trips": self.round_trips,
+            "commits": self.commits,
+            "rollbacks": self.rollbacks,
+            "total_ms": self.total_seconds * 1000.0,
+            "mean_ms": self.total_seconds * 1000.0 / self.round_trips if self.round_trips else 0.0,
+            "p50_ms": self.percentile_ms(50),
+            "p99_ms": self.percentile_ms(99),
+            "max_ms": self.max_seconds * 1000.0,
+            "commit_ms": self.commit_seconds * 1000.0,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "rows": self.rows,
+            "histogram_us": {f"{2 ** bucket}-{2 ** (bucket + 1)}": count
+                             for bucket, count in sorted(self.histogram.items())},
+        }
+
+
+class Profiler:
+    """全スレッドの集計を保持する（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.explain_pattern = None
+        self.plans = []
+        self._explained = set()
+
+    def configure(self, explain_pattern=None):
+        self.explain_pattern = re.compile(explain_pattern) if explain_pattern else None
+
+    def stats(self):
+        """このスレッドの (対象DB, ラベル) の集計を返す"""
+        key = (current_target(), current_label())
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = LatencyStats()
+        return stats
+
+    def items(self, target_name=None):
+        """(対象DB, ラベル, 集計の辞書) を返す"""
+        with self._lock:
+            keys = [key for key in self._stats if target_name is None or key[0] == target_name]
+            return [(key[0], key[1], self._stats[key].summary()) for key in keys]
+
+    def should_explain(self, query):
+        """初めて見る文が EXPLAIN の対象かを返す"""
+        if self.explain_pattern is None or not EXPLAINABLE.match(query):
+            return False
+        if not self.explain_pattern.search(query):
+            return False
+        key = (current_target(), current_label(), " ".join(query.split()))
+        with self._lock:
+            if key in self._explained:
+                return False
+            self._explained.add(key)
+        return True
+
+    def add_plan(self, query, plan):
+        with self._lock:
+            self.plans.append({"target": current_target(), "label": current_label(),
+                               "query": " ".join(query.split()), "plan": plan})
+
+    def write_json(self, path):
+        """集計と実行計画をJSONとして保存する"""
+        data = {
+            "stats": [{"target": target_name, "label": label_name, **summary}
+                      for target_name, label_name, summary in self.items()],
+            "plans": self.plans,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+profiler = Profiler()
+
+
+def value_size(row):
+    """取得した1行の値のテキスト表現の長さ（受信バイト数の概算）"""
+    return sum(len(value) if isinstance(value, str) else len(str(value)) for value in row if value is not None)
+
+
+class ProfilingCursor(psycopg2.extensions.cursor):
+    """実行ごとに所要時間・送受信量を集計するカーソル"""
+
+    def _timed(self, run, query):
+        stats = profiler.stats()
+        started = time.perf_counter()
+        try:
+            return run()
+        finally:
+            sent = len(self.query) if self.query is not None else len(str(query))
+            stats.add_query(time.perf_counter() - started, sent)
+
+    def execute(self, query, vars=None):
+        # execute_values などは組み立て済みのSQLを bytes で渡してくる
+        text = query.decode("utf-8", "replace") if isinstance(query, bytes) else query
+        if isinstance(text, str) and profiler.should_explain(text):
+            self._explain(query, vars)
+        return self._timed(lambda: super(ProfilingCursor, self).execute(query, vars), query)
+
+    def executemany(self, query, vars_list):
+        return self._timed(lambda: super(ProfilingCursor, self).executemany(query, vars_list), query)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(lambda: super(ProfilingCursor, self).copy_expert(sql, file, size), sql)
+
+    def _count_rows(self, rows):
+        stats = profiler.stats()
+        stats.rows += len(rows)
+        stats.bytes_received += sum(value_size(row) for row in rows)
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count_rows([row])
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        return self._count_rows(rows)
+
+    def fetchall(self):
+        return self._count_rows(super().fetchall())
+
+    def _explain(self, query, vars):
+        """セーブポイントの中で EXPLAIN (ANALYZE, BUFFERS) を実行し、結果を残さずに実行計画を保存する"""
+        if self.connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            return
+        run = super().execute
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+        run(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            run((prefix.encode("ascii") if isinstance(query, bytes) else prefix) + query, vars)
+            plan = "\n".join(row[0] for row in super().fetchall())
+        except psycopg2.Error:
+            plan = None
+        run(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        run(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        if plan is not None:
+            profiler.add_plan(query.decode("utf-8", "replace") if isinstance(query, bytes) else query, plan)
+
+
+class ProfilingConnection(IsolatedConnection):
+    """計測用のカーソルを作り、コミット・ロールバックの回数を数えるコネクション"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = ProfilingCursor
+
+    def commit(self):
+        stats = profiler.stats()
+        started = time.perf_counter()
+        super().commit()
+        stats.commits += 1
+        stats.commit_seconds += time.perf_counter() - started
+
+    def rollback(self):
+        profiler.stats().rollbacks += 1
+        super().rollback()
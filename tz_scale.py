@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""大量の行に対する ts / tstz の範囲検索・日ごとの集計と、インデックスの効き方を調べる
+
+generate_series で timezone_scale テーブルに指定した行数を作り、インデックスの組
+（なし・B-tree・BRIN・AT TIME ZONE の式インデックス）ごとに、代表的な範囲検索と
+日ごとの集計をセッションタイムゾーンを変えて実行する。各クエリは
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) で実行し、実行計画の形・使われたインデックス・
+実行時間の中央値を返す。
+
+timezone_test とは別のテーブルを使い、同じ行数で作ったテーブルは次回以降も再利用する
+（行数と作り方はテーブルのコメントで判定する）。
+"""
+import json
+import statistics
+import time
+
+SCALE_TABLE = "timezone_scale"
+
+# テーブルの作り方のバージョン（変えたら上げて作り直させる）
+SCALE_FORMAT = 1
+
+# セッションタイムゾーンの既定リスト
+DEFAULT_SCALE_TIMEZONES = ["UTC", "Asia/Tokyo", "America/New_York"]
+
+# 行を並べる期間（UTC）。行数によらず同じ期間に均等に並べる
+SCALE_START = "2020-01-01 00:00:00+00"
+SCALE_SPAN_SECONDS = 4 * 365 * 24 * 3600
+
+CREATE_SQL = f"""
+    CREATE TABLE {SCALE_TABLE} (
+        id BIGINT PRIMARY KEY,
+        ts TIMESTAMP NOT NULL,
+        tstz TIMESTAMPTZ NOT NULL
+    )
+"""
+
+# tstz はUTCの時刻を均等に並べ、ts には同じ時刻のUTCでの壁時計の値を入れる
+# （明示したオフセットとUTCへの変換だけを使い、コンテナやセッションのタイムゾーンに依存させない）
+FILL_SQL = f"""
+    INSERT INTO {SCALE_TABLE} (id, ts, tstz)
+    SELECT i, t AT TIME ZONE 'UTC', t
+    FROM generate_series(0, %(rows)s - 1) AS i,
+         LATERAL (SELECT %(start)s::TIMESTAMPTZ + i * (%(span)s::DOUBLE PRECISION / %(rows)s) * interval '1 second') AS s(t)
+"""
+
+# インデックスの組: (名前, [(インデックス名, 定義), ...])
+INDEX_SETS = [
+    ("なし", []),
+    ("btree", [
+        (f"{SCALE_TABLE}_ts_btree", f"CREATE INDEX {SCALE_TABLE}_ts_btree ON {SCALE_TABLE} (ts)"),
+        (f"{SCALE_TABLE}_tstz_btree", f"CREATE INDEX {SCALE_TABLE}_tstz_btree ON {SCALE_TABLE} (tstz)"),
+    ]),
+    ("brin", [
+        (f"{SCALE_TABLE}_ts_brin", f"CREATE INDEX {SCALE_TABLE}_ts_brin ON {SCALE_TABLE} USING brin (ts)"),
+        (f"{SCALE_TABLE}_tstz_brin", f"CREATE INDEX {SCALE_TABLE}_tstz_brin ON {SCALE_TABLE} USING brin (tstz)"),
+    ]),
+    # AT TIME ZONE に定数のゾーン名を渡した式は IMMUTABLE なのでインデックスにできる
+    # （ts::TIMESTAMPTZ や date_trunc('day', tstz) はセッションタイムゾーンに依存する STABLE な式なのでできない）
+    ("式", [
+        (f"{SCALE_TABLE}_tstz_jst",
+         f"CREATE INDEX {SCALE_TABLE}_tstz_jst ON {SCALE_TABLE} ((tstz AT TIME ZONE 'Asia/Tokyo'))"),
+    ]),
+]
+
+INDEX_SET_NAMES = [name for name, _ in INDEX_SETS]
+
+# クエリ: (名前, SQL)
+RANGE_START = "2021-03-01 00:00:00"
+RANGE_END = "2021-03-08 00:00:00"
+MONTH_END = "2021-04-01 00:00:00"
+QUERIES = [
+    ("ts 範囲",
+     f"SELECT count(*) FROM {SCALE_TABLE} WHERE ts >= '{RANGE_START}' AND ts < '{RANGE_END}'"),
+    # オフセットの無いリテラルはセッションタイムゾーンで解釈される（計画時に定数になる）
+    ("tstz 範囲（リテラル）",
+     f"SELECT count(*) FROM {SCALE_TABLE} WHERE tstz >= '{RANGE_START}' AND tstz < '{RANGE_END}'"),
+    ("tstz 範囲（+09指定）",
+     f"SELECT count(*) FROM {SCALE_TABLE} WHERE tstz >= '{RANGE_START}+09' AND tstz < '{RANGE_END}+09'"),
+    ("tstz AT TIME ZONE 範囲",
+     f"SELECT count(*) FROM {SCALE_TABLE} "
+     f"WHERE tstz AT TIME ZONE 'Asia/Tokyo' >= '{RANGE_START}' AND tstz AT TIME ZONE 'Asia/Tokyo' < '{RANGE_END}'"),
+    ("ts::TIMESTAMPTZ 範囲",
+     f"SELECT count(*) FROM {SCALE_TABLE} "
+     f"WHERE ts::TIMESTAMPTZ >= '{RANGE_START}+09' AND ts::TIMESTAMPTZ < '{RANGE_END}+09'"),
+    ("ts 日ごと集計",
+     f"SELECT date_trunc('day', ts) AS day, count(*) FROM {SCALE_TABLE} "
+     f"WHERE ts >= '{RANGE_START}' AND ts < '{MONTH_END}' GROUP BY day ORDER BY day"),
+    ("tstz 日ごと集計",
+     f"SELECT date_trunc('day', tstz) AS day, count(*) FROM {SCALE_TABLE} "
+     f"WHERE tstz >= '{RANGE_START}' AND tstz < '{MONTH_END}' GROUP BY day ORDER BY day"),
+    ("tstz AT TIME ZONE 日ごと集計",
+     f"SELECT date_trunc('day', tstz AT TIME ZONE 'Asia/Tokyo') AS day, count(*) FROM {SCALE_TABLE} "
+     f"WHERE tstz AT TIME ZONE 'Asia/Tokyo' >= '{RANGE_START}' "
+     f"AND tstz AT TIME ZONE 'Asia/Tokyo' < '{MONTH_END}' GROUP BY day ORDER BY day"),
+]
+
+
+def parse_index_sets(spec):
+    """カンマ区切りのインデックスの組の指定を検証してリストにする（None は全て）"""
+    if spec is None:
+        return list(INDEX_SET_NAMES)
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in INDEX_SET_NAMES]
+    if unknown:
+        raise ValueError(f"不明なインデックスの組です: {', '.join(unknown)}（{', '.join(INDEX_SET_NAMES)} から選択）")
+    return names
+
+
+def table_marker(rows):
+    """テーブルのコメントに入れる作り方の識別子"""
+    return f"{SCALE_TABLE} format={SCALE_FORMAT} rows={rows} start={SCALE_START} span={SCALE_SPAN_SECONDS}"
+
+
+def prepare_table(conn, rows):
+    """行数 rows のテーブルを用意し、(作成に掛かった秒数, テーブルのバイト数, 再利用したか) を返す"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (SCALE_TABLE,))
+        reused = cur.fetchone()[0] == table_marker(rows)
+        started = time.perf_counter()
+        if not reused:
+            cur.execute(f"DROP TABLE IF EXISTS {SCALE_TABLE}")
+            cur.execute(CREATE_SQL)
+            cur.execute(FILL_SQL, {"rows": rows, "start": SCALE_START, "span": SCALE_SPAN_SECONDS})
+            cur.execute(f"COMMENT ON TABLE {SCALE_TABLE} IS %s", (table_marker(rows),))
+        conn.commit()
+        if not reused:
+            # VACUUM はトランザクションの外で実行する（可視性マップを作り Index Only Scan を使えるようにする）
+            autocommit = conn.autocommit
+            conn.autocommit = True
+            try:
+                cur.execute(f"VACUUM ANALYZE {SCALE_TABLE}")
+            finally:
+                conn.autocommit = autocommit
+        elapsed = time.perf_counter() - started
+        cur.execute("SELECT pg_table_size(%s)", (SCALE_TABLE,))
+        size = cur.fetchone()[0]
+    conn.commit()
+    return elapsed, size, reused
+
+
+def drop_scale_indexes(cur):
+    """前のインデックスの組で作ったインデックスを全て削除する"""
+    for _, indexes in INDEX_SETS:
+        for index_name, _ in indexes:
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+def build_index_set(conn, index_set):
+    """インデックスの組を作り、インデックスごとに (名前, 作成に掛かった秒数, バイト数) を返す"""
+    built = []
+    with conn.cursor() as cur:
+        drop_scale_indexes(cur)
+        for index_name, definition in dict(INDEX_SETS)[index_set]:
+            started = time.perf_counter()
+            cur.execute(definition)
+            elapsed = time.perf_counter() - started
+            cur.execute("SELECT pg_relation_size(%s)", (index_name,))
+            built.append((index_name, elapsed, cur.fetchone()[0]))
+        # 式インデックスの統計を取る
+        cur.execute(f"ANALYZE {SCALE_TABLE}")
+    conn.commit()
+    return built
+
+
+def drop_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {SCALE_TABLE}")
+    conn.commit()
+
+
+def plan_shape(node):
+    """実行計画のノードを "Aggregate > Index Only Scan (インデックス名)" の形の文字列にする"""
+    name = node["Node Type"]
+    if node.get("Partial Mode", "Simple") != "Simple":
+        name = f"{node['Partial Mode']} {name}"
+    if node.get("Parallel Aware"):
+        name = f"Parallel {name}"
+    if node.get("Index Name"):
+        name += f" ({node['Index Name']})"
+    children = [plan_shape(child) for child in node.get("Plans", ())]
+    if not children:
+        return name
+    if len(children) == 1:
+        return f"{name} > {children[0]}"
+    return f"{name} > [{', '.join(children)}]"
+
+
+def plan_indexes(node):
+    """実行計画で使われたインデックス名を返す"""
+    names = [node["Index Name"]] if node.get("Index Name") else []
+    for child in node.get("Plans", ()):
+        names.extend(name for name in plan_indexes(child) if name not in names)
+    return names
+
+
+def explain_query(cur, sql):
+    """クエリを EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) で実行し、最上位の計画を返す"""
+    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+    plan = cur.fetchone()[0]
+    # psycopg2 は json 型を変換するが、text で返るドライバ設定にも対応する
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def run_queries(conn, repeat=3):
+    """現在のセッションタイムゾーンで全てのクエリを実行し、クエリごとの結果を返す
+
+    1回目はキャッシュを温めるために捨て、続く repeat 回の実行時間の中央値を使う。
+    """
+    with conn.cursor() as cur:
+        for query_name, sql in QUERIES:
+            explain_query(cur, sql)
+            samples = [explain_query(cur, sql) for _ in range(max(1, repeat))]
+            conn.rollback()
+            last = samples[-1]
+            top = last["Plan"]
+            yield {
+                "query": query_name,
+                "plan_shape": plan_shape(top),
+                "indexes": ", ".join(plan_indexes(top)),
+                "rows": top["Actual Rows"],
+                "planning_ms": statistics.median(sample["Planning Time"] for sample in samples),
+                "execution_ms": statistics.median(sample["Execution Time"] for sample in samples),
+                "shared_hit": top.get("Shared Hit Blocks", 0),
+                "shared_read": top.get("Shared Read Blocks", 0),
+            }
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""サーバー側のテストハーネス run_timezone_tests() を呼び出す
+
+init-scripts/02-server-harness.sql の関数に、全てのテストケースの入力値と
+セッションタイムゾーンを配列で渡し、1回の往復で全ての結果を受け取る。
+関数が無いDB（init-scripts 追加前に作ったコンテナなど）には、同じSQLファイルで作成する。
+"""
+import os
+
+INSTALL_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "init-scripts", "02-server-harness.sql")
+
+FUNCTION_SIGNATURE = ("run_timezone_tests(text[], integer[], text[], text[], text[], text[], "
+                      "timestamp without time zone[], timestamp with time zone[])")
+
+CALL_SQL = """
+    SELECT
+        case_index,
+        result_type,
+        input_index,
+        description,
+        ts,
+        ts_text,
+        tstz,
+        tstz_text,
+        tstz_utc,
+        tstz_jst,
+        now_text,
+        current_timestamp_text,
+        now_timestamp_text,
+        current_timestamp_timestamp_text,
+        error
+    FROM run_timezone_tests(
+        %s::TEXT[], %s::INTEGER[], %s::TEXT[], %s::TEXT[], %s::TEXT[],
+        %s::TEXT[], %s::TIMESTAMP[], %s::TIMESTAMPTZ[]
+    )
+"""
+
+
+def is_installed(cur):
+    """run_timezone_tests() が作成済みかを返す"""
+    cur.execute("SELECT to_regprocedure(%s) IS NOT NULL", (FUNCTION_SIGNATURE,))
+    return cur.fetchone()[0]
+
+
+def ensure_installed(conn):
+    """run_timezone_tests() が無ければ作成する（作成した場合は True を返す）"""
+    with conn.cursor() as cur:
+        if is_installed(cur):
+            conn.commit()
+            return False
+        with open(INSTALL_SCRIPT, encoding="utf-8") as f:
+            cur.execute(f.read())
+    conn.commit()
+    return True
+
+
+def build_arguments(test_cases, datetime_cases):
+    """テストケースと Python の datetime から関数の引数（配列）を作る"""
+    session_timezones = [test_case["session_timezone"] for test_case in test_cases]
+    input_cases, descriptions, ts_inputs, tstz_inputs = [], [], [], []
+    for case_index, test_case in enumerate(test_cases, start=1):
+        for value in test_case["values"]:
+            input_cases.append(case_index)
+            descriptions.append(value["description"])
+            ts_inputs.append(value["ts_str"])
+            tstz_inputs.append(value["tstz_str"])
+
+    # naive な値は TIMESTAMP[]、aware な値は TIMESTAMPTZ[] で送り、列への代入と同じ変換をサーバーで行う
+    datetime_descriptions = [dt_case["description"] for dt_case in datetime_cases]
+    datetime_naive = [dt_case["dt"] if dt_case["dt"].tzinfo is None else None for dt_case in datetime_cases]
+    datetime_aware = [dt_case["dt"] if dt_case["dt"].tzinfo is not None else None for dt_case in datetime_cases]
+
+    return (session_timezones, input_cases, descriptions, ts_inputs, tstz_inputs,
+            datetime_descriptions, datetime_naive, datetime_aware)
+
+
+def run_server_tests(cur, test_cases, datetime_cases):
+    """全てのテストケースを1回の呼び出しで実行し、結果の行をテストケースの順に返す
+
+    関数はセッションタイムゾーンをトランザクション内だけで切り替えるため、
+    呼び出し後はコミットまたはロールバックする。
+    """
+    cur.execute(CALL_SQL, build_arguments(test_cases, datetime_cases))
+    return cur.fetchall()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""テスト結果を型付きのレコードとして保持し、追記専用のファイルへ逐次書き出すモジュール
+
+レコードはテスト種別ごとのクラスで `__slots__` を使って保持し、結果1件ごとに
+キーを繰り返す辞書よりメモリを節約する。ファイルへは結果が届くたびに1行ずつ
+追記するため、実行が途中で失敗してもそこまでの結果が残り、後からファイルだけで
+レポートを作り直せる。拡張子が .csv ならCSV、それ以外はNDJSONで書き出す。
+CSVでは全ての値が文字列になるため、読み直す時にレコードクラスの field_types で
+数値や真偽値に戻す。
+"""
+import csv
+import json
+import sys
+import threading
+
+# 同じ値が何度も現れるため、intern して1つの文字列オブジェクトを共有するフィールド
+INTERNED_FIELDS = ("db_name", "container_timezone", "session_timezone")
+
+# test_type からレコードクラスを引くための登録表
+RECORD_TYPES = {}
+
+
+def register_record(cls):
+    """レコードクラスを test_type で登録するデコレータ"""
+    fields = []
+    for klass in reversed(cls.__mro__):
+        fields.extend(getattr(klass, "__slots__", ()))
+    cls.fields = tuple(fields)
+    RECORD_TYPES[cls.test_type] = cls
+    return cls
+
+
+class Record:
+    """テスト結果1件の基底クラス
+
+    既存のレポート処理がそのまま使えるよう、`record["field"]` と `record.get()` で
+    辞書と同じように参照できる。
+    """
+
+    __slots__ = ("db_name", "container_timezone", "session_timezone")
+    test_type = None
+    fields = ()
+    # str 以外のフィールドの型（CSVから読み直す時に変換する）
+    field_types = {}
+
+    def __init__(self, **values):
+        for name in self.fields:
+            value = values.get(name)
+            if name in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        if key == "test_type":
+            return self.test_type
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key == "test_type":
+            return self.test_type
+        if key not in self.fields:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def to_dict(self):
+        data = {"test_type": self.test_type}
+        for name in self.fields:
+            data[name] = getattr(self, name)
+        return data
+
+
+@register_record
+class EnvironmentRecord(Record):
+    __slots__ = ("parameter", "value")
+    test_type = "環境設定"
+
+
+@register_record
+class TimestampRecord(Record):
+    __slots__ = ("input_description", "input_ts", "input_tstz",
+                 "output_ts", "output_tstz", "tstz_at_utc", "tstz_at_jst")
+    test_type = "タイムスタンプ変換"
+
+
+@register_record
+class PythonDatetimeRecord(Record):
+    __slots__ = ("input_description", "input_dt", "input_dt_tzinfo",
+                 "output_ts", "output_tstz", "tstz_at_utc", "tstz_at_jst")
+    test_type = "Pythonデータタイプ変換"
+
+
+@register_record
+class SessionFunctionRecord(Record):
+    __slots__ = ("now", "current_timestamp", "now_timestamp", "current_timestamp_timestamp")
+    test_type = "セッション関数"
+
+
+@register_record
+class NowInsertionRecord(Record):
+    __slots__ = ("input_description", "output_ts", "output_tstz")
+    test_type = "now()挿入テスト"
+
+
+@register_record
+class ErrorRecord(Record):
+    __slots__ = ("input_description", "input_ts", "input_tstz", "error")
+    test_type = "エラー"
+
+
+@register_record
+class OracleSummaryRecord(Record):
+    __slots__ = ("checked_count", "mismatch_count", "read_mode", "seconds")
+    test_type = "オラクル検証"
+    field_types = {"checked_count": int, "mismatch_count": int, "seconds": float}
+
+
+@register_record
+class OracleMismatchRecord(Record):
+    __slots__ = ("input_instant", "column", "expected", "actual")
+    test_type = "オラクル差分"
+
+
+@register_record
+class CopyThroughputRecord(Record):
+    __slots__ = ("copy_format", "rows", "load_seconds", "load_rows_per_sec",
+                 "readback_seconds", "readback_rows_per_sec", "bytes_in", "bytes_out")
+    test_type = "COPYスループット"
+    field_types = {"rows": int, "load_seconds": float, "load_rows_per_sec": float,
+                   "readback_seconds": float, "readback_rows_per_sec": float, "bytes_in": int,
+                   "bytes_out": int}
+
+
+@register_record
+class BenchmarkRecord(Record):
+    __slots__ = ("operation", "column", "param_style", "rows", "samples",
+                 "min_ms", "median_ms", "p90_ms", "p99_ms", "max_ms")
+    test_type = "ベンチマーク"
+    field_types = {"rows": int, "samples": int, "min_ms": float, "median_ms": float, "p90_ms": float,
+                   "p99_ms": float, "max_ms": float}
+
+
+@register_record
+class CatalogRecord(Record):
+    __slots__ = ("server_version", "tzdata_version", "zone_count", "abbrev_count",
+                 "transition_zone_count", "probe_mismatches", "loaded_from")
+    test_type = "タイムゾーンカタログ"
+    field_types = {"server_version": int, "zone_count": int, "abbrev_count": int,
+                   "transition_zone_count": int}
+
+
+@register_record
+class ScaleSetupRecord(Record):
+    __slots__ = ("index_set", "object_name", "build_ms", "size_bytes", "reused")
+    test_type = "大規模データ準備"
+    field_types = {"build_ms": float, "size_bytes": int, "reused": bool}
+
+
+@register_record
+class ScaleQueryRecord(Record):
+    __slots__ = ("index_set", "query", "plan_shape", "indexes", "rows", "planning_ms", "execution_ms",
+                 "shared_hit", "shared_read")
+    test_type = "大規模クエリ"
+    field_types = {"rows": int, "planning_ms": float, "execution_ms": float, "shared_hit": int,
+                   "shared_read": int}
+
+
+@register_record
+class PartitionRecord(Record):
+    __slots__ = ("key_column", "predicate", "partitions", "planned", "removed_at_startup", "scanned",
+                 "pruning", "rows", "planning_ms", "execution_ms")
+    test_type = "パーティションプルーニング"
+    field_types = {"partitions": int, "planned": int, "removed_at_startup": int, "scanned": int,
+                   "rows": int, "planning_ms": float, "execution_ms": float}
+
+
+@register_record
+class LoadRecord(Record):
+    __slots__ = ("writer", "writer_timezone", "transactions", "rows", "errors", "rows_per_sec",
+                 "p50_ms", "p95_ms", "p99_ms", "max_ms", "stored_rows", "offset_mismatches",
+                 "order_inversions", "offsets", "last_error")
+    test_type = "負荷テスト"
+    field_types = {"writer": int, "transactions": int, "rows": int, "errors": int,
+                   "rows_per_sec": float, "p50_ms": float, "p95_ms": float, "p99_ms": float,
+                   "max_ms": float, "stored_rows": int, "offset_mismatches": int,
+                   "order_inversions": int}
+
+
+@register_record
+class FuzzRecord(Record):
+    __slots__ = ("seed", "workers", "checked", "excluded", "unverified", "failures", "failure_classes",
+                 "seconds", "cases_per_sec")
+    test_type = "ファジング"
+    field_types = {"seed": int, "workers": int, "checked": int, "excluded": int, "unverified": int,
+                   "failures": int, "failure_classes": int, "seconds": float, "cases_per_sec": float}
+
+
+@register_record
+class FuzzFailureRecord(Record):
+    __slots__ = ("invariant", "instant", "at_zone", "detail", "original")
+    test_type = "ファジング失敗"
+
+
+@register_record
+class ProfileRecord(Record):
+    __slots__ = ("label", "round_trips", "commits", "rollbacks", "total_ms", "mean_ms",
+                 "p50_ms", "p99_ms", "max_ms", "commit_ms", "bytes_sent", "bytes_received", "rows")
+    test_type = "プロファイル"
+    field_types = {"round_trips": int, "commits": int, "rollbacks": int, "total_ms": float,
+                   "mean_ms": float, "p50_ms": float, "p99_ms": float, "max_ms": float,
+                   "commit_ms": float, "bytes_sent": int, "bytes_received": int, "rows": int}
+
+
+@register_record
+class PlanRecord(Record):
+    __slots__ = ("label", "query", "plan")
+    test_type = "実行計画"
+
+
+def parse_bool(text):
+    return text == "True"
+
+
+def convert_csv_row(row):
+    """CSVの1行（値は文字列か None）を、レコードクラスのフィールドの型に戻す"""
+    cls = RECORD_TYPES.get(row.get("test_type"))
+    if cls is None:
+        return row
+    for name, field_type in cls.field_types.items():
+        value = row.get(name)
+        if value is not None:
+            row[name] = parse_bool(value) if field_type is bool else field_type(value)
+    return row
+
+
+def make_record(data):
+    """辞書から test_type に対応するレコードを作る"""
+    cls = RECORD_TYPES.get(data.get("test_type"))
+    if cls is None:
+        raise ValueError(f"未知のテスト種別です: {data.get('test_type')}")
+    return cls(**data)
+
+
+def all_fields():
+    """全てのレコードクラスのフィールドを重複なく並べる（CSVのヘッダ用）"""
+    names = ["test_type"]
+    for cls in RECORD_TYPES.values():
+        for name in cls.fields:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def is_csv_path(path):
+    return str(path).lower().endswith(".csv")
+
+
+def load_records(path):
+    """ファイルに書き出した結果を先頭から1件ずつレコードとして読み込む"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if is_csv_path(path):
+            for row in csv.DictReader(f):
+                # CSVでは未設定の値が空文字列になるので None に戻す
+                yield make_record(convert_csv_row({k: (v if v != "" else None) for k, v in row.items()}))
+        else:
+            for line in f:
+                if line.strip():
+                    yield make_record(json.loads(line))
+
+
+class ResultStore:
+    """テスト結果の保存先
+
+    append() はスレッドセーフで、ストリームを開いていればファイルへ1行ずつ追記する。
+    keep_in_memory=False の場合はメモリに保持せず、反復時にファイルから読み直す。
+    """
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self.path = None
+        self.keep_in_memory = True
+
+    def open_stream(self, path, keep_in_memory=True):
+        """結果を逐次書き出すファイルを開く（既存の内容は破棄する）"""
+        self.close()
+        self.path = path
+        self.keep_in_memory = keep_in_memory
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        if is_csv_path(path):
+            self._writer = csv.DictWriter(self._file, fieldnames=all_fields())
+            self._writer.writeheader()
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def append(self, record):
+        if isinstance(record, dict):
+            record = make_record(record)
+        with self._lock:
+            if self.keep_in_memory:
+                self._records.append(record)
+            if self._file is not None:
+                if self._writer is not None:
+                    self._writer.writerow(record.to_dict())
+                else:
+                    self._file.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+                # 異常終了しても届いた結果までは残るよう、1件ごとに書き出す
+                self._file.flush()
+
+    def load(self, path):
+        """ファイルに書き出した結果をメモリに読み込む"""
+        with self._lock:
+            self._records.extend(load_records(path))
+
+    def __iter__(self):
+        if self.keep_in_memory or self.path is None:
+            return iter(self._records)
+        if self._file is not None:
+            self._file.flush()
+        return load_records(self.path)
+
+    def __len__(self):
+        if self.keep_in_memory or self.path is None:
+            return len(self._records)
+        return sum(1 for _ in self)
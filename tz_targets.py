@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""テスト対象のDBを docker-compose.yml から見つけるか、ローカルに使い捨てのクラスタを作る
+
+docker-compose.yml のサービスからは、公開しているポート・環境変数の POSTGRES_USER /
+POSTGRES_PASSWORD / POSTGRES_DB・コンテナのタイムゾーン（TZ）を読み、DB_CONFIGS と
+同じ形の設定を作る。
+
+ローカルのクラスタは Docker を使わずに、コンテナのタイムゾーンごとに PostgreSQL を起動する。
+initdb と init-scripts の実行は一度だけ行ってテンプレートのデータディレクトリを作り
+（サーバーのバージョンと init-scripts の内容が同じなら次回以降も再利用する）、
+各クラスタはテンプレートを複製して postgresql.auto.conf にポートとタイムゾーンを書き、
+TZ 環境変数を付けて並行に起動する。クラスタは終了時に停止して削除する。
+PostgreSQL はrootでは起動できないため、一般ユーザーで実行する。
+"""
+import hashlib
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+DEFAULT_COMPOSE_PATH = "docker-compose.yml"
+
+# ローカルのクラスタの作業ディレクトリ（テンプレートを置く）
+DEFAULT_CLUSTER_DIR = ".timezone_clusters"
+
+# ローカルのクラスタに割り当てるポートの探索を始める番号
+DEFAULT_BASE_PORT = 55432
+
+INIT_SCRIPTS_DIR = "init-scripts"
+
+# コンテナのPostgreSQLが待ち受けるポート
+CONTAINER_PORT = 5432
+
+# ローカルのクラスタの接続設定（initdb の -U と trust 認証に合わせる）
+LOCAL_USER = "postgres"
+LOCAL_PASSWORD = "postgres"
+LOCAL_DATABASE = "timezone_test"
+
+# テンプレートの作り方のバージョン（変えたら上げて作り直させる）
+TEMPLATE_FORMAT = 1
+
+# 起動・停止を待つ秒数
+PG_CTL_TIMEOUT = 60
+
+
+def parse_environment(environment):
+    """compose の environment（辞書または "KEY=VALUE" のリスト）を辞書にする"""
+    if isinstance(environment, dict):
+        return {key: "" if value is None else str(value) for key, value in environment.items()}
+    parsed = {}
+    for item in environment or ():
+        key, _, value = str(item).partition("=")
+        parsed[key] = value
+    return parsed
+
+
+def published_port(ports, container_port=CONTAINER_PORT):
+    """compose の ports から、コンテナのポートに対応するホスト側のポートを返す（無ければ None）"""
+    for port in ports or ():
+        if isinstance(port, dict):
+            # 長い書式: {target: 5432, published: 5433}
+            if int(port.get("target", 0)) == container_port and port.get("published") is not None:
+                return int(port["published"])
+            continue
+        spec = str(port).split("/")[0]
+        parts = spec.rsplit(":", 2)
+        if len(parts) == 1:
+            continue
+        host_port, target = parts[-2], parts[-1]
+        if int(target) == container_port and host_port:
+            return int(host_port)
+    return None
+
+
+def load_compose_targets(path=DEFAULT_COMPOSE_PATH, host="localhost"):
+    """docker-compose.yml の PostgreSQL のサービスから接続設定のリストを作る
+
+    ホストへポートを公開していないサービスは接続できないため含めない。
+    """
+    import yaml
+
+    with open(path, encoding="utf-8") as f:
+        compose = yaml.safe_load(f) or {}
+    targets = []
+    for service_name, service in (compose.get("services") or {}).items():
+        image = str(service.get("image", ""))
+        environment = parse_environment(service.get("environment"))
+        if "postgres" not in image and "POSTGRES_DB" not in environment:
+            continue
+        port = published_port(service.get("ports"))
+        if port is None:
+            print(f"警告: {service_name} は {CONTAINER_PORT} 番ポートを公開していないため対象にしません")
+            continue
+        user = environment.get("POSTGRES_USER") or "postgres"
+        targets.append({
+            "name": service.get("container_name") or service_name,
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": environment.get("POSTGRES_PASSWORD", ""),
+            # 公式イメージは POSTGRES_DB が無ければユーザー名のDBを作る
+            "database": environment.get("POSTGRES_DB") or user,
+            "container_timezone": environment.get("TZ") or "UTC",
+        })
+    return targets
+
+
+def compose_timezones(path=DEFAULT_COMPOSE_PATH):
+    """docker-compose.yml の各サービスの (名前, タイムゾーン) を返す（ローカルのクラスタの元にする）"""
+    return [(target["name"], target["container_timezone"]) for target in load_compose_targets(path)]
+
+
+def local_name(zone):
+    """タイムゾーンからローカルのクラスタの名前を作る（例: Asia/Tokyo → local-asia-tokyo）"""
+    slug = "".join(c if c.isalnum() else "-" for c in zone.lower()).strip("-")
+    return f"local-{slug}"
+
+
+def parse_local_spec(spec, compose_path=DEFAULT_COMPOSE_PATH):
+    """--local-clusters の指定を (名前, タイムゾーン) のリストにする
+
+    "compose" は docker-compose.yml のサービスと同じ名前とタイムゾーン、
+    それ以外はカンマ区切りのタイムゾーン。
+    """
+    if spec.strip() == "compose":
+        return compose_timezones(compose_path)
+    zones = [zone.strip() for zone in spec.split(",") if zone.strip()]
+    return [(local_name(zone), zone) for zone in dict.fromkeys(zones)]
+
+
+def local_targets(clusters, ports):
+    """ローカルのクラスタの接続設定のリストを作る"""
+    return [{
+        "name": name,
+        "host": "localhost",
+        "port": port,
+        "user": LOCAL_USER,
+        "password": LOCAL_PASSWORD,
+        "database": LOCAL_DATABASE,
+        "container_timezone": zone,
+    } for (name, zone), port in zip(clusters, ports)]
+
+
+def find_free_ports(count, start=DEFAULT_BASE_PORT):
+    """localhost で使われていないポートを start から順に count 個探す"""
+    ports = []
+    port = start
+    while len(ports) < count:
+        if port > 65535:
+            raise RuntimeError(f"{start} 以降に空いているポートが {count} 個ありません")
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(("127.0.0.1", port))
+            except OSError:
+                pass
+            else:
+                ports.append(port)
+        port += 1
+    return ports
+
+
+def find_bin_dir(bin_dir=None):
+    """initdb と pg_ctl のあるディレクトリを返す（指定が無ければ PATH と pg_config から探す）"""
+    if bin_dir:
+        return bin_dir
+    initdb = shutil.which("initdb")
+    if initdb:
+        return os.path.dirname(initdb)
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        return subprocess.run([pg_config, "--bindir"], check=True, capture_output=True, text=True).stdout.strip()
+    raise RuntimeError("initdb が見つかりません（--pg-bin でPostgreSQLのbinディレクトリを指定してください）")
+
+
+def run_command(args, env=None):
+    """コマンドを実行し、失敗したら標準エラーの内容を含めて例外にする"""
+    result = subprocess.run(args, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(args[0])} が失敗しました: {(result.stderr or result.stdout).strip()}")
+    return result.stdout
+
+
+def write_auto_conf(data_dir, port, zone):
+    """クラスタ固有の設定を postgresql.auto.conf に書く（テンプレートの設定より優先される）"""
+    with open(os.path.join(data_dir, "postgresql.auto.conf"), "w", encoding="utf-8") as f:
+        f.write(f"port = {port}\n")
+        f.write("listen_addresses = 'localhost'\n")
+        # Unixドメインソケットは使わない（パスの長さの制限や他のクラスタとの衝突を避ける）
+        f.write("unix_socket_directories = ''\n")
+        f.write(f"timezone = '{zone}'\n")
+        f.write(f"log_timezone = '{zone}'\n")
+        f.write("fsync = off\n")
+        f.write("synchronous_commit = off\n")
+        f.write("full_page_writes = off\n")
+
+
+class LocalClusters:
+    """使い捨てのローカルのクラスタをテンプレートから作り、並行に起動・停止する"""
+
+    def __init__(self, clusters, bin_dir=None, cluster_dir=DEFAULT_CLUSTER_DIR,
+                 base_port=DEFAULT_BASE_PORT, init_scripts_dir=INIT_SCRIPTS_DIR):
+        # initdb などは起動する時に探す（--report-from ではクラスタを起動しない）
+        self.bin_dir = bin_dir
+        self.cluster_dir = os.path.abspath(cluster_dir)
+        self.init_scripts_dir = init_scripts_dir
+        self.targets = local_targets(clusters, find_free_ports(len(clusters), base_port))
+        self.run_dir = None
+        self.started = []
+
+    def tool(self, name):
+        return os.path.join(self.bin_dir, name)
+
+    def init_scripts(self):
+        if not os.path.isdir(self.init_scripts_dir):
+            return []
+        return sorted(os.path.join(self.init_scripts_dir, name)
+                      for name in os.listdir(self.init_scripts_dir) if name.endswith(".sql"))
+
+    def template_key(self):
+        """サーバーのバージョンと init-scripts の内容からテンプレートの識別子を作る"""
+        digest = hashlib.sha256(f"format={TEMPLATE_FORMAT}\n".encode("utf-8"))
+        digest.update(run_command([self.tool("postgres"), "--version"]).encode("utf-8"))
+        for path in self.init_scripts():
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:16]
+
+    def pg_ctl(self, data_dir, action, zone="UTC", mode="immediate", log_path=None):
+        """pg_ctl で起動・停止し、完了するまで待つ"""
+        args = [self.tool("pg_ctl"), action, "-D", data_dir, "-w", "-t", str(PG_CTL_TIMEOUT)]
+        if action == "start":
+            log_path = log_path or os.path.join(data_dir, "server.log")
+            args += ["-l", log_path]
+        else:
+            args += ["-m", mode]
+        try:
+            # コンテナの TZ と同じく、サーバーのプロセスの環境のタイムゾーンも合わせる
+            run_command(args, env=dict(os.environ, TZ=zone))
+        except RuntimeError as e:
+            if action != "start" or not os.path.exists(log_path):
+                raise
+            with open(log_path, encoding="utf-8", errors="replace") as f:
+                log_tail = "".join(f.readlines()[-5:]).strip()
+            raise RuntimeError(f"{e}\n{log_tail}") from None
+
+    def build_template(self, template_dir):
+        """initdb と init-scripts の実行を一度だけ行い、テンプレートのデータディレクトリを作る"""
+        building = tempfile.mkdtemp(prefix="template-", dir=self.cluster_dir)
+        data_dir = os.path.join(building, "data")
+        try:
+            run_command([self.tool("initdb"), "-D", data_dir, "-U", LOCAL_USER, "--auth=trust",
+                         "-E", "UTF8", "--locale=C", "--no-sync", "--no-instructions"],
+                        env=dict(os.environ, TZ="UTC"))
+            port = find_free_ports(1, DEFAULT_BASE_PORT)[0]
+            write_auto_conf(data_dir, port, "UTC")
+            self.pg_ctl(data_dir, "start", log_path=os.path.join(building, "server.log"))
+            try:
+                conn = psycopg2.connect(host="localhost", port=port, user=LOCAL_USER, dbname="postgres")
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"CREATE DATABASE {LOCAL_DATABASE}")
+                conn.close()
+                # 公式イメージの docker-entrypoint-initdb.d と同じく、対象のDBで順に実行する
+                conn = psycopg2.connect(host="localhost", port=port, user=LOCAL_USER, dbname=LOCAL_DATABASE)
+                with conn.cursor() as cur:
+                    for path in self.init_scripts():
+                        with open(path, encoding="utf-8") as f:
+                            cur.execute(f.read())
+                conn.commit()
+                conn.close()
+            finally:
+                # 複製しても一貫した状態になるよう、チェックポイントを取って正常に停止する
+                self.pg_ctl(data_dir, "stop", mode="fast")
+            os.remove(os.path.join(data_dir, "postgresql.auto.conf"))
+            os.rename(data_dir, template_dir)
+        finally:
+            shutil.rmtree(building, ignore_errors=True)
+
+    def prepare_template(self):
+        """テンプレートを用意してパスを返す（同じ識別子のものがあれば再利用する）"""
+        os.makedirs(self.cluster_dir, exist_ok=True)
+        template_dir = os.path.join(self.cluster_dir, f"template-{self.template_key()}")
+        if not os.path.isdir(template_dir):
+            print(f"テンプレートのクラスタを作成中: {template_dir}")
+            self.build_template(template_dir)
+        return template_dir
+
+    def start_cluster(self, template_dir, target):
+        """テンプレートを複製して1つのクラスタを起動する"""
+        data_dir = os.path.join(self.run_dir, target["name"])
+        shutil.copytree(template_dir, data_dir, symlinks=True)
+        write_auto_conf(data_dir, target["port"], target["container_timezone"])
+        self.pg_ctl(data_dir, "start", zone=target["container_timezone"])
+        return data_dir, target["container_timezone"]
+
+    def start(self):
+        """全てのクラスタを並行に起動し、接続設定のリストを返す"""
+        self.bin_dir = find_bin_dir(self.bin_dir)
+        template_dir = self.prepare_template()
+        self.run_dir = tempfile.mkdtemp(prefix="run-", dir=self.cluster_dir)
+        with ThreadPoolExecutor(max_workers=max(1, len(self.targets))) as executor:
+            futures = [executor.submit(self.start_cluster, template_dir, target) for target in self.targets]
+            errors = []
+            for future in futures:
+                try:
+                    self.started.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+        if errors:
+            self.stop()
+            raise errors[0]
+        return self.targets
+
+    def stop(self):
+        """起動したクラスタを並行に停止し、データディレクトリを削除する"""
+        def stop_cluster(started):
+            data_dir, zone = started
+            try:
+                self.pg_ctl(data_dir, "stop", zone=zone)
+            except Exception as e:
+                print(f"警告: {data_dir} の停止に失敗しました: {e}")
+
+        if self.started:
+            with ThreadPoolExecutor(max_workers=len(self.started)) as executor:
+                list(executor.map(stop_cluster, self.started))
+        self.started = []
+        if self.run_dir is not None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()